@@ -27,6 +27,7 @@ def create_executable():
         "--distpath", "dist",  # 指定输出目录
         "--workpath", "build", # 指定构建目录
         "--specpath", "build", # 指定 spec 文件目录
+        "--exclude-module", "matplotlib",  # 字体发现不再依赖 matplotlib，减小体积
 
         "photowatermark/main.py"  # 主入口文件
     ]
@@ -11,10 +11,11 @@ to images. Users can customize the font size, color, and position of the waterma
 
 import argparse
 import os
-from PIL import Image, ExifTags, ImageDraw
-from PIL.ImageFont import truetype
+from PIL import Image, ExifTags
 import datetime
 
+from photowatermark.models.pipeline import ExportPipeline
+
 # Supported image extensions
 IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.bmp', '.gif')
 
@@ -47,73 +48,26 @@ def get_capture_date(exif_data):
             pass
     return None
 
-def add_watermark(image_path, output_path, text, font_size=20, color=(255, 255, 255), position='bottom-right'):
+def add_watermark(image_path, output_path, text, font_size=20, color=(255, 255, 255), position='bottom-right',
+                  auto_orient=False):
     """Add a text watermark to an image."""
     try:
-        # Open the image
-        image = Image.open(image_path)
-        width, height = image.size
-        
-        # Preserve EXIF data if it exists
-        exif_data = image.info.get('exif')
-        
-        # Convert to RGBA for watermarking
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        # Create a transparent layer for the watermark
-        txt_layer = Image.new('RGBA', image.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(txt_layer)
-        
-        # Try to use a TrueType font; fallback to default if not available
-        try:
-            font = truetype("arial.ttf", font_size)
-        except:
-            font = truetype("DejaVuSans.ttf", font_size)
-            
-        # Calculate text size
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Determine position
-        margin = 10
-        if position == 'top-left':
-            x, y = margin, margin
-        elif position == 'top-center':
-            x, y = (width - text_width) // 2, margin
-        elif position == 'top-right':
-            x, y = width - text_width - margin, margin
-        elif position == 'center':
-            x, y = (width - text_width) // 2, (height - text_height) // 2
-        elif position == 'bottom-left':
-            x, y = margin, height - text_height - margin
-        elif position == 'bottom-center':
-            x, y = (width - text_width) // 2, height - text_height - margin
-        else:  # Default to bottom-right
-            x, y = width - text_width - margin, height - text_height - margin
-            
-        # Draw the text
-        draw.text((x, y), text, fill=color + (255,), font=font)
-        
-        # Composite the text layer onto the original image
-        watermarked = Image.alpha_composite(image, txt_layer)
-        
-        # Convert back to RGB if saving as JPEG
-        if output_path.lower().endswith('.jpg') or output_path.lower().endswith('.jpeg'):
-            watermarked = watermarked.convert('RGB')
-            
-        # Save the watermarked image with EXIF data
-        save_kwargs = {}
-        if exif_data:
-            save_kwargs['exif'] = exif_data
-            
-        watermarked.save(output_path, **save_kwargs)
+        # Same export pipeline as the GUI: keep the name and format, opaque text
+        pipeline = ExportPipeline({
+            'auto_orient': auto_orient,
+            'watermark_enabled': True,
+            'watermark_text': text,
+            'watermark_font_size': font_size,
+            'watermark_color': color,
+            'watermark_position': position,
+            'watermark_transparency': 100
+        })
+        pipeline.process(image_path, output_path)
         print(f"Watermarked image saved to {output_path}")
     except Exception as e:
         print(f"Error adding watermark to {image_path}: {e}")
 
-def process_image(image_path, font_size, color, position, output_dir=None):
+def process_image(image_path, font_size, color, position, output_dir=None, auto_orient=False):
     """Process a single image file."""
     # Get EXIF data
     exif_data = get_exif_data(image_path)
@@ -142,9 +96,9 @@ def process_image(image_path, font_size, color, position, output_dir=None):
     output_path = os.path.join(output_dir, filename)
     
     # Add watermark
-    add_watermark(image_path, output_path, watermark_text, font_size, color, position)
+    add_watermark(image_path, output_path, watermark_text, font_size, color, position, auto_orient)
 
-def process_directory(directory_path, font_size, color, position):
+def process_directory(directory_path, font_size, color, position, auto_orient=False):
     """Process all image files in a directory."""
     # Create the output directory for watermarked images
     output_dir = os.path.join(directory_path, f"{os.path.basename(directory_path)}_watermark")
@@ -165,7 +119,7 @@ def process_directory(directory_path, font_size, color, position):
     # Process each image file
     for image_file in image_files:
         image_path = os.path.join(directory_path, image_file)
-        process_image(image_path, font_size, color, position, output_dir)
+        process_image(image_path, font_size, color, position, output_dir, auto_orient)
 
 def main():
     """Main function to parse arguments and process images."""
@@ -179,6 +133,8 @@ def main():
         'center', 
         'bottom-left', 'bottom-center', 'bottom-right'
     ], default='bottom-right', help="Position of the watermark (default: bottom-right)")
+    parser.add_argument("--auto-orient", action="store_true",
+                        help="Rotate images upright according to their EXIF orientation")
     
     args = parser.parse_args()
     
@@ -198,10 +154,10 @@ def main():
         if not args.path.lower().endswith(IMAGE_EXTENSIONS):
             print(f"Error: File is not a supported image format")
             return
-        process_image(args.path, args.font_size, tuple(args.color), args.position)
+        process_image(args.path, args.font_size, tuple(args.color), args.position, auto_orient=args.auto_orient)
     elif os.path.isdir(args.path):
         # Process all images in the directory
-        process_directory(args.path, args.font_size, tuple(args.color), args.position)
+        process_directory(args.path, args.font_size, tuple(args.color), args.position, args.auto_orient)
     else:
         print(f"Error: Path is neither a file nor a directory")
 
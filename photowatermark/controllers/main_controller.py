@@ -3,12 +3,11 @@ Main controller for the PhotoWatermark-AI4SE application.
 This module handles the application logic and coordinates between the view and model.
 """
 import threading
-import os
 from tkinter import messagebox
-from PIL import Image
 
 from photowatermark.views.main_window import MainWindow
 from photowatermark.models.image_processor import ImageProcessor
+from photowatermark.models.pipeline import ExportPipeline
 from photowatermark.utils.dialogs import show_error_message
 
 
@@ -45,88 +44,9 @@ class MainController:
     def _perform_export(self, image_paths, output_dir, settings):
         """Perform the actual export operation in a background thread"""
         try:
-            success_count = 0
-            
-            for img_path in image_paths:
-                try:
-                    # Generate output filename based on settings
-                    output_path = self.image_processor.generate_output_filename(
-                        img_path,
-                        output_dir,
-                        settings.get('naming_rule', '保留原名'),
-                        settings.get('naming_value', ''),
-                        settings.get('format_rule', '原格式')
-                    )
-                    
-                    # Open the image first
-                    image = Image.open(img_path)
-                    
-                    # Apply watermark if enabled
-                    if settings.get('watermark_enabled', False):
-                        watermark_settings = {
-                            'text': settings.get('watermark_text', 'Sample Text'),
-                            'transparency': settings.get('watermark_transparency', 50),
-                            'position': settings.get('watermark_position', 'bottom-right'),
-                            'font_size': settings.get('watermark_font_size', 30),
-                            'font_name': settings.get('watermark_font_name', 'Arial'),
-                            'bold': settings.get('watermark_bold', False),
-                            'italic': settings.get('watermark_italic', False),
-                            'color': settings.get('watermark_color', (255, 255, 255))
-                        }
-                        
-                        # Add custom coordinates if in custom position mode
-                        if (settings.get('watermark_position') == "custom" and 
-                            'watermark_custom_x' in settings and 
-                            'watermark_custom_y' in settings):
-                            watermark_settings['custom_x'] = settings['watermark_custom_x']
-                            watermark_settings['custom_y'] = settings['watermark_custom_y']
-                        
-                        # Apply watermark to the image
-                        result = self.image_processor.add_watermark_to_image(image, watermark_settings)
-                        # Handle the case where add_watermark_to_image returns a tuple
-                        if isinstance(result, tuple):
-                            image = result[0]  # First element is the watermarked image
-                        else:
-                            image = result
-                    
-                    # Resize image if needed first
-                    # Get original dimensions from the image if not provided in settings
-                    original_width, original_height = image.size
-                    image = self.image_processor.resize_image(
-                        image,
-                        settings.get('resize_option', '原图尺寸'),
-                        settings.get('resize_value', ''),
-                        settings.get('original_width', original_width),
-                        settings.get('original_height', original_height)
-                    )
-                    
-                    # Process the image for export format (handles RGBA to RGB conversion for JPEG)
-                    _, ext = os.path.splitext(output_path)
-                    image = self.image_processor.process_image_for_export(
-                        image,
-                        ext,  # Use actual output extension
-                        settings.get('quality', 95)
-                    )
-                    
-                    # Save the processed image
-                    ext = ext.lower()
-                    
-                    if ext in ['.jpg', '.jpeg']:
-                        image.save(
-                            output_path,
-                            "JPEG",
-                            quality=settings.get('quality', 95),
-                            exif=image.info.get('exif', b'')
-                        )
-                    elif ext == '.png':
-                        image.save(output_path, "PNG", exif=image.info.get('exif', b''))
-                    else:
-                        image.save(output_path, exif=image.info.get('exif', b''))
-                    
-                    success_count += 1
-                    
-                except Exception as e:
-                    print(f"导出文件失败 {img_path}: {str(e)}")
+            # Snapshot the settings once; every image runs through the same pipeline
+            pipeline = ExportPipeline(settings, self.image_processor)
+            success_count = pipeline.run(image_paths, output_dir)
             
             # Call the callback in the main thread
             self.main_window.root.after(
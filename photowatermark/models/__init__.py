@@ -2,7 +2,18 @@
 PhotoWatermark-AI4SE models module
 """
 from .image_processor import ImageProcessor
+from .font_cache import FontCache
+from .sprite_cache import SpriteCache
+from .blend_engine import get_blend_engine, BLEND_ENGINES
+from .pipeline import ExportPipeline
+from .watermark_settings import WatermarkSettings
 
 __all__ = [
-    "ImageProcessor"
+    "ImageProcessor",
+    "FontCache",
+    "SpriteCache",
+    "get_blend_engine",
+    "BLEND_ENGINES",
+    "ExportPipeline",
+    "WatermarkSettings"
 ]
\ No newline at end of file
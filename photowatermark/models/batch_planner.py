@@ -0,0 +1,221 @@
+"""
+Batch planning for the PhotoWatermark-AI4SE application.
+
+Camera batches hold a few distinct resolutions and orientations. The planner
+reads only the image headers (``Image.open`` does not decode pixels), groups
+the images by (size, mode, orientation) and orders the export:
+
+* one worker: group by group, so every size variant of the watermark (font,
+  layout, sprite, rotated and tiled strips) is built once and stays in the
+  caches while its group is exported;
+* several workers: the largest estimated cost first (longest processing time
+  first), so a big image never starts last while the other workers idle.
+
+The plan, with its groups and estimated cost, can be inspected before the
+export starts. Costs are in megapixels decoded plus megapixels written.
+"""
+from collections import OrderedDict
+import heapq
+
+from PIL import Image
+
+from photowatermark.models.pipeline import (
+    EXIF_ORIENTATION, TRANSPOSED_ORIENTATIONS, STAGE_ORIENT, STAGE_RESIZE
+)
+
+# JPEG按2的幂缩小解码（Image.draft），最多缩小到1/8
+MAX_DRAFT_SCALE = 8
+
+
+class PlannedImage:
+    """
+    One image of a batch as read from its header.
+
+    ``size`` is the size after the EXIF orientation is applied, that is the
+    size the watermark is laid out for before resizing. ``error`` is set
+    (and the size is None) when the header could not be read; such images
+    are still exported last so that the failure is reported.
+    """
+
+    def __init__(self, index, path, output_path):
+        self.index = index  # 在导入顺序中的位置
+        self.path = path
+        self.output_path = output_path
+        self.size = None
+        self.mode = None
+        self.orientation = 1
+        self.format = None
+        self.output_size = None
+        self.cost = 0.0
+        self.error = None
+
+    @property
+    def key(self):
+        """分组键 (尺寸, 模式, 方向)，无法读取的图片为None"""
+        if self.size is None:
+            return None
+        return self.size, self.mode, self.orientation
+
+
+class BatchGroup:
+    """Images of a batch that share their size, mode and orientation."""
+
+    def __init__(self, key):
+        self.key = key
+        self.images = []
+
+    @property
+    def cost(self):
+        return sum(image.cost for image in self.images)
+
+    def describe(self):
+        """例如 "6000x4000 RGB: 8 张，384.0 百万像素" """
+        if self.key is None:
+            return f"无法读取: {len(self.images)} 张"
+        (width, height), mode, orientation = self.key
+        label = f"{width}x{height} {mode}"
+        if orientation != 1:
+            label += f" 方向{orientation}"
+        return f"{label}: {len(self.images)} 张，{self.cost:.1f} 百万像素"
+
+
+class BatchPlan:
+    """
+    Grouping and dispatch order of a batch.
+
+    ``tasks`` is the dispatch order. Each task is a tuple of images that run
+    one after the other on one worker: images that would be written to the
+    same output file share a task, in import order, so the last imported one
+    still wins and two workers never write the same file.
+    """
+
+    def __init__(self, images, groups, tasks, workers=1):
+        self.images = images
+        self.groups = groups
+        self.tasks = tasks
+        self.workers = workers
+
+    @property
+    def parallel(self):
+        return self.workers > 1
+
+    @property
+    def order(self):
+        """按调度顺序排列的图片"""
+        return [image for task in self.tasks for image in task]
+
+    @property
+    def total_cost(self):
+        return sum(image.cost for image in self.images)
+
+    @property
+    def estimated_makespan(self):
+        """
+        Estimated cost of the busiest worker when the tasks are handed out in
+        order to whichever worker is free first.
+        """
+        loads = [0.0] * max(1, min(self.workers, len(self.tasks)))
+        for task in self.tasks:
+            load = heapq.heappop(loads)
+            heapq.heappush(loads, load + sum(image.cost for image in task))
+        return max(loads)
+
+    def describe(self):
+        """返回可读的计划摘要（每组一行）"""
+        lines = [f"共 {len(self.images)} 张图片，{len(self.groups)} 组，估计 {self.total_cost:.1f} 百万像素"]
+        if self.parallel:
+            lines.append(f"{self.workers} 个线程并行，最大的图片先导出，"
+                         f"最忙的线程约 {self.estimated_makespan:.1f} 百万像素")
+        lines.extend(f"- {group.describe()}" for group in self.groups)
+        return "\n".join(lines)
+
+
+def _header_orientation(image):
+    """从文件头读取EXIF方向（PNG的eXIf块在图像数据之后时不读取，避免解码）"""
+    if image.format == 'PNG' and 'exif' not in image.info:
+        return 1
+    try:
+        return image.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return 1
+
+
+def _draft_scale(size, new_size):
+    """JPEG缩小解码的倍数（与 Image.draft 一样选最大的不小于目标尺寸的倍数）"""
+    scale = 1
+    while (scale < MAX_DRAFT_SCALE and size[0] // (scale * 2) >= new_size[0] and
+           size[1] // (scale * 2) >= new_size[1]):
+        scale *= 2
+    return scale
+
+
+def probe_image(pipeline, image):
+    """
+    Fill a PlannedImage from its file header and estimate its cost.
+
+    Args:
+        pipeline (ExportPipeline): Pipeline the image will be exported with
+        image (PlannedImage): Image to probe, updated in place
+    """
+    try:
+        with Image.open(image.path) as opened:
+            raw_size, image.mode, image.format = opened.size, opened.mode, opened.format
+            if STAGE_ORIENT in pipeline.stages:
+                image.orientation = _header_orientation(opened)
+    except Exception as e:
+        image.error = str(e)
+        return
+
+    transposed = image.orientation in TRANSPOSED_ORIENTATIONS
+    image.size = raw_size[::-1] if transposed else raw_size
+    new_size = None
+    if STAGE_RESIZE in pipeline.stages:
+        new_size = pipeline.image_processor.get_resize_size(
+            image.size, pipeline.resize_option, pipeline.resize_value)
+    image.output_size = new_size or image.size
+
+    decoded = raw_size[0] * raw_size[1]
+    if new_size and image.format == 'JPEG' and not transposed:
+        decoded /= _draft_scale(raw_size, new_size) ** 2
+    image.cost = (decoded + image.output_size[0] * image.output_size[1]) / 1e6
+
+
+def plan_batch(pipeline, input_paths, output_dir='', workers=1):
+    """
+    Read the image headers of a batch and plan its export.
+
+    Args:
+        pipeline (ExportPipeline): Pipeline the batch will be exported with
+        input_paths (list): Image paths in import order
+        output_dir (str): Output directory (only used to name the outputs)
+        workers (int): Number of export workers
+
+    Returns:
+        BatchPlan: The plan
+    """
+    workers = max(1, int(workers or 1))
+    images = [PlannedImage(index, path, pipeline.output_path(path, output_dir))
+              for index, path in enumerate(input_paths)]
+    groups = OrderedDict()
+    for image in images:
+        probe_image(pipeline, image)
+        if image.key not in groups:
+            groups[image.key] = BatchGroup(image.key)
+        groups[image.key].images.append(image)
+    # 无法读取的图片放在最后
+    if None in groups:
+        groups.move_to_end(None)
+    group_rank = {key: rank for rank, key in enumerate(groups)}
+
+    # 写入同一个输出文件的图片按导入顺序放在同一个任务中
+    tasks = OrderedDict()
+    for image in images:
+        tasks.setdefault(image.output_path, []).append(image)
+    tasks = [tuple(task) for task in tasks.values()]
+
+    if workers > 1:
+        failed = lambda task: task[0].key is None
+        tasks.sort(key=lambda task: (failed(task), -sum(image.cost for image in task), task[0].index))
+    else:
+        tasks.sort(key=lambda task: (group_rank[task[0].key], task[0].index))
+    return BatchPlan(images, list(groups.values()), tasks, workers)
@@ -0,0 +1,129 @@
+"""
+Loaded-font cache for the PhotoWatermark-AI4SE application.
+
+``ImageFont.truetype`` opens and parses the font file every time it is called,
+which is wasteful when the same font is used for every image of a batch or
+every frame of a preview drag.
+"""
+from collections import OrderedDict
+import threading
+
+try:
+    from PIL import ImageFont
+except ImportError:
+    ImageFont = None
+
+
+# 按顺序尝试的后备字体
+FALLBACK_FONT_FILES = ("arial.ttf", "DejaVuSans.ttf")
+
+DEFAULT_FONT_CACHE_SIZE = 64
+
+
+class FontCache:
+    """
+    Bounded LRU cache of loaded FreeType fonts keyed by
+    (path, size, face index, layout engine).
+
+    Fonts that fail to load are remembered, as is the outcome of the fallback
+    chain, so a missing font costs one failed lookup per process.
+    """
+
+    def __init__(self, max_size=DEFAULT_FONT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._fonts = OrderedDict()
+        self._failed = set()
+        self._fallback_file = None  # None: 未解析, False: 只能使用默认字体
+        self._lock = threading.Lock()
+
+    def get_font(self, font_path, font_size, index=0, layout_engine=None):
+        """
+        Return the loaded font, falling back to the fallback chain if the
+        font file cannot be loaded.
+        """
+        key = (font_path, font_size, index, layout_engine)
+        with self._lock:
+            font = self._lookup(key)
+            if font is not None:
+                return font
+
+            if (font_path, index, layout_engine) in self._failed:
+                font = None
+            else:
+                try:
+                    font = ImageFont.truetype(font_path, font_size, index=index, layout_engine=layout_engine)
+                except Exception:
+                    self._failed.add((font_path, index, layout_engine))
+                    font = None
+
+            if font is None:
+                font = self._load_fallback(font_size, layout_engine)
+            self._store(key, font)
+            return font
+
+    def get_fallback_font(self, font_size, layout_engine=None):
+        """返回后备字体（arial.ttf → DejaVuSans.ttf → Pillow默认字体）"""
+        key = (None, font_size, 0, layout_engine)
+        with self._lock:
+            font = self._lookup(key)
+            if font is None:
+                font = self._load_fallback(font_size, layout_engine)
+                self._store(key, font)
+            return font
+
+    def _lookup(self, key):
+        font = self._fonts.get(key)
+        if font is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._fonts.move_to_end(key)
+        return font
+
+    def _store(self, key, font):
+        self._fonts[key] = font
+        self._fonts.move_to_end(key)
+        while len(self._fonts) > self.max_size:
+            self._fonts.popitem(last=False)
+
+    def _load_fallback(self, font_size, layout_engine):
+        """沿后备链加载字体，并记住第一个可用的后备字体文件"""
+        if self._fallback_file is None:
+            for font_file in FALLBACK_FONT_FILES:
+                try:
+                    font = ImageFont.truetype(font_file, font_size, layout_engine=layout_engine)
+                except Exception:
+                    continue
+                self._fallback_file = font_file
+                return font
+            self._fallback_file = False
+
+        if self._fallback_file:
+            try:
+                return ImageFont.truetype(self._fallback_file, font_size, layout_engine=layout_engine)
+            except Exception:
+                pass
+        # Use default font if no TrueType fonts are available
+        return ImageFont.load_default()
+
+    def stats(self):
+        """返回缓存命中统计，便于确认缓存是否生效"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._fonts),
+                'max_size': self.max_size,
+                'failed': len(self._failed)
+            }
+
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._fonts.clear()
+            self._failed.clear()
+            self._fallback_file = None
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,185 @@
+"""
+Image analysis for the PhotoWatermark-AI4SE application.
+
+Statistics of the region a watermark covers, and how busy the candidate
+anchors of an automatic position are, are computed on a tiny proxy: a fixed
+grid of sampled pixels, so the cost does not depend on the size of the photo
+and stays far below a millisecond per image.
+"""
+import math
+
+from PIL import Image, ImageFilter, ImageStat
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    _NEAREST = Image.Resampling.NEAREST
+except AttributeError:
+    # 对于旧版本的PIL
+    _NEAREST = Image.NEAREST
+
+# 代理图长边的采样点数
+PROXY_SIZE = 48
+
+# 自动位置：整张图片代理图长边的采样点数
+POSITION_PROXY_SIZE = 128
+
+# 自动颜色：暗背景用浅色文字，亮背景用深色文字
+AUTO_COLOR_LIGHT = (255, 255, 255)
+AUTO_COLOR_DARK = (0, 0, 0)
+# 平均亮度高于这个值时使用深色文字
+AUTO_COLOR_THRESHOLD = 140
+# 亮度标准差超过这个值（背景杂乱）或平均亮度接近阈值（中间调）时加描边
+AUTO_COLOR_BUSY_STDDEV = 48
+AUTO_COLOR_MIDTONE_BAND = 24
+
+
+def clip_box(box, image_size):
+    """把区域裁剪到图片范围内，区域为空时返回None"""
+    left, top, right, bottom = box
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(image_size[0], right), min(image_size[1], bottom)
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+def region_proxy(image, box=None, proxy_size=PROXY_SIZE):
+    """
+    Sample a region of an image on a small grid.
+
+    Only the sampled pixels are read, so the proxy of a region of a
+    24-megapixel photo costs the same as that of a thumbnail.
+
+    Args:
+        image: Decoded image (any mode Pillow can convert to "L")
+        box (tuple): (left, top, right, bottom) region, or None for the whole image
+        proxy_size (int): Samples along the longer side of the region
+
+    Returns:
+        Image: "L" proxy of the region, or None if the region is empty
+    """
+    box = clip_box(box or (0, 0) + image.size, image.size)
+    if box is None:
+        return None
+    width, height = box[2] - box[0], box[3] - box[1]
+    ratio = min(1, proxy_size / max(width, height))
+    size = (max(1, int(round(width * ratio))), max(1, int(round(height * ratio))))
+
+    proxy = image.resize(size, _NEAREST, box=box)
+    if proxy.mode == 'L':
+        return proxy
+    if proxy.mode in ('RGB', 'RGBA', 'LA', 'P'):
+        return proxy.convert('L')
+    # CMYK、16位等模式先转换为RGB
+    return proxy.convert('RGB').convert('L')
+
+
+def luminance_stats(image, box=None):
+    """
+    Get the mean and standard deviation of the luminance of a region.
+
+    Returns:
+        tuple: (mean, standard deviation) in 0-255, or None if the region is empty
+    """
+    proxy = region_proxy(image, box)
+    if proxy is None:
+        return None
+    if np is not None:
+        values = np.asarray(proxy, dtype=np.float32)
+        return float(values.mean()), float(values.std())
+    stat = ImageStat.Stat(proxy)
+    return stat.mean[0], stat.stddev[0]
+
+
+def contrast_color(mean, stddev):
+    """
+    Pick the watermark colour for a background's luminance statistics.
+
+    Returns:
+        tuple: (RGB text colour, RGB contrasting colour for outlines and
+        effects, whether the text needs an outline to stay readable)
+    """
+    if mean > AUTO_COLOR_THRESHOLD:
+        color, contrast = AUTO_COLOR_DARK, AUTO_COLOR_LIGHT
+    else:
+        color, contrast = AUTO_COLOR_LIGHT, AUTO_COLOR_DARK
+    outline = stddev >= AUTO_COLOR_BUSY_STDDEV or abs(mean - AUTO_COLOR_THRESHOLD) <= AUTO_COLOR_MIDTONE_BAND
+    return color, contrast, outline
+
+
+def auto_watermark_color(image, box=None):
+    """
+    Pick a watermark colour that contrasts with the region it covers.
+
+    Returns:
+        tuple: As from ``contrast_color``
+    """
+    stats = luminance_stats(image, box)
+    if stats is None:
+        return AUTO_COLOR_LIGHT, AUTO_COLOR_DARK, False
+    return contrast_color(*stats)
+
+
+def edge_energy(proxy):
+    """
+    Get the gradient magnitude (|dx| + |dy|) of an "L" proxy.
+
+    Returns:
+        numpy.ndarray: float32 array with the proxy's shape
+    """
+    values = np.asarray(proxy, dtype=np.float32)
+    energy = np.zeros_like(values)
+    energy[:, 1:] += np.abs(np.diff(values, axis=1))
+    energy[1:, :] += np.abs(np.diff(values, axis=0))
+    return energy
+
+
+def _proxy_box(box, image_size, proxy_size):
+    """把图片上的区域换算为代理图上的区域（至少一个像素）"""
+    scale_x = proxy_size[0] / image_size[0]
+    scale_y = proxy_size[1] / image_size[1]
+    left = min(proxy_size[0] - 1, max(0, int(math.floor(box[0] * scale_x))))
+    top = min(proxy_size[1] - 1, max(0, int(math.floor(box[1] * scale_y))))
+    right = max(left + 1, min(proxy_size[0], int(math.ceil(box[2] * scale_x))))
+    bottom = max(top + 1, min(proxy_size[1], int(math.ceil(box[3] * scale_y))))
+    return left, top, right, bottom
+
+
+def busyness_scores(image, boxes, proxy_size=POSITION_PROXY_SIZE):
+    """
+    Score how busy each region of an image is.
+
+    The gradient magnitude is computed once over a proxy of the whole
+    image; each box then only averages its slice of the proxy.
+
+    Args:
+        image: Decoded image
+        boxes (list): (left, top, right, bottom) regions on the image
+        proxy_size (int): Samples along the image's longer side
+
+    Returns:
+        list: Mean edge energy (0-510) of each box
+    """
+    proxy = region_proxy(image, None, proxy_size)
+    if proxy is None:
+        return [0.0] * len(boxes)
+    proxy_boxes = [_proxy_box(box, image.size, proxy.size) for box in boxes]
+
+    if np is None:
+        edges = proxy.filter(ImageFilter.FIND_EDGES)
+        return [ImageStat.Stat(edges.crop(box)).mean[0] for box in proxy_boxes]
+
+    energy = edge_energy(proxy)
+    return [float(energy[top:bottom, left:right].mean()) for left, top, right, bottom in proxy_boxes]
+
+
+def calmest_box(image, boxes, proxy_size=POSITION_PROXY_SIZE):
+    """
+    Get the index of the least busy region; ties go to the earlier box.
+    """
+    scores = busyness_scores(image, boxes, proxy_size)
+    return min(range(len(scores)), key=lambda index: (scores[index], index))
@@ -7,13 +7,101 @@ try:
 except ImportError:
     ImageFont = None
 import os
+import threading
+from collections import OrderedDict
 from typing import List
-from photowatermark.utils.constants import THUMBNAIL_SIZE
+from photowatermark.utils.constants import (
+    THUMBNAIL_SIZE,
+    WATERMARK_TILE_POSITION,
+    DEFAULT_WATERMARK_TILE_SPACING,
+    DEFAULT_WATERMARK_TILE_ANGLE,
+    DEFAULT_WATERMARK_TILE_STAGGER,
+    WATERMARK_TYPE_IMAGE,
+    DEFAULT_WATERMARK_LOGO_SCALE,
+    WATERMARK_SIZE_RELATIVE,
+    WATERMARK_EFFECT_NONE,
+    WATERMARK_EFFECT_STROKE,
+    WATERMARK_COLOR_AUTO,
+    WATERMARK_AUTO_POSITION,
+    WATERMARK_AUTO_POSITION_CANDIDATES
+)
+from photowatermark.models.font_cache import FontCache
+from photowatermark.models.text_layout import LayoutCache, relative_font_size
+from photowatermark.models.sprite_cache import SpriteCache
+from photowatermark.models.text_effects import render_text_sprite, text_effect
+from photowatermark.models.image_analysis import auto_watermark_color, calmest_box
+from photowatermark.models.blend_engine import get_blend_engine, BLEND_ENGINE_PILLOW
+from photowatermark.models.watermark_stack import WatermarkStack
+from photowatermark.models.watermark_settings import WatermarkSettings, PreparedWatermarkCache
+from photowatermark.models.logo_cache import LogoCache, logo_target_size, scale_logo
+from photowatermark.models.tiling import (
+    rotate_sprite, rotated_placement, tile_period, strip_repeats, build_row_strip, strip_positions
+)
+
+# 不转换为RGBA、直接混合水印的图片模式
+NATIVE_COMPOSITE_MODES = ('RGBA', 'RGB', 'L', 'CMYK')
+# 支持保存CMYK图片的输出格式
+CMYK_FORMATS = ('.jpg', '.jpeg', '.tif', '.tiff')
+# 九宫格位置距图片边缘的距离（像素）
+WATERMARK_MARGIN = 10
+
+
+def scale_length(value, scale):
+    """按输出缩放比例换算像素长度"""
+    if scale == 1:
+        return value
+    return int(round(value * scale))
+
+
+def watermark_canvas_mode(image, fill=None):
+    """
+    Get the mode a watermark is blended in for an image.
+    
+    RGB, L, CMYK and RGBA images keep their own mode; palette images, other
+    modes and greyscale images with a coloured watermark are converted.
+    
+    Args:
+        image: Source image
+        fill (tuple): Watermark colour, or None for a coloured logo
+    """
+    mode = image.mode
+    if mode == 'P':
+        # 调色板图片无法直接混合颜色
+        return 'RGBA' if 'transparency' in image.info else 'RGB'
+    if mode == 'L' and not (fill and fill[0] == fill[1] == fill[2]):
+        # 彩色水印需要彩色图片
+        return 'RGB'
+    if mode not in NATIVE_COMPOSITE_MODES:
+        return 'RGBA'
+    return mode
 
 
 class ImageProcessor:
-    def __init__(self, thumbnail_size=None):
+    # 所有实例共享的已加载字体缓存（预览和批量导出都会用到）
+    font_cache = FontCache()
+    # 所有实例共享的文本排版缓存（同尺寸的图片只需测量一次文本）
+    layout_cache = LayoutCache()
+    # 所有实例共享的水印精灵图缓存（批量导出和实时预览共用）
+    sprite_cache = SpriteCache()
+    # 所有实例共享的Logo解码缓存
+    logo_cache = LogoCache()
+    # 所有实例共享的已准备水印缓存（按水印设置和混合引擎查找）
+    prepared_cache = PreparedWatermarkCache()
+
+    # 默认的水印混合引擎（"pillow" 或 "numpy"）
+    blend_engine = BLEND_ENGINE_PILLOW
+    # 字体索引尚未建立时是否等待扫描完成（实时预览不等待，先用后备字体）
+    wait_for_fonts = True
+
+    def __init__(self, thumbnail_size=None, blend_engine=None, wait_for_fonts=None):
         self.thumbnail_size = thumbnail_size or THUMBNAIL_SIZE
+        if blend_engine:
+            self.blend_engine = blend_engine
+        if wait_for_fonts is not None:
+            self.wait_for_fonts = wait_for_fonts
+        self._blend_engine = get_blend_engine(self.blend_engine)
+        # 无法缓存预处理结果的精灵图改用Pillow混合
+        self._pillow_engine = get_blend_engine(BLEND_ENGINE_PILLOW)
         self.thumbnail_images = []  # Store references to prevent garbage collection
 
     def create_thumbnail(self, image_path):
@@ -33,40 +121,59 @@ class ImageProcessor:
             placeholder = Image.new('RGB', self.thumbnail_size, (200, 200, 200))
             return ImageTk.PhotoImage(placeholder)
 
-    def resize_image(self, image, resize_option, resize_value, original_width=None, original_height=None):
-        """根据用户设置调整图片尺寸"""
+    def get_resize_size(self, size, resize_option, resize_value):
+        """
+        Get the output size for the resize settings.
+        
+        Args:
+            size (tuple): (width, height) of the source image
+            resize_option (str): One of RESIZE_OPTIONS
+            resize_value: Resize value from the export settings
+            
+        Returns:
+            tuple: (width, height), or None if the image keeps its size
+        """
         if resize_option == "原图尺寸" or not resize_value:
-            return image
+            return None
+        try:
+            value = int(resize_value)
+        except ValueError:
+            # 如果输入的值不是有效数字，保持原图尺寸
+            return None
+        
+        original_width, original_height = size
+        if resize_option == "按比例缩放":
+            # 按百分比缩放
+            new_size = (int(original_width * value / 100), int(original_height * value / 100))
+        elif resize_option == "指定宽度":
+            # 按指定宽度缩放，保持宽高比
+            new_size = (value, int(original_height * value / original_width))
+        elif resize_option == "指定高度":
+            # 按指定高度缩放，保持宽高比
+            new_size = (int(original_width * value / original_height), value)
         else:
-            try:
-                value = int(resize_value) if resize_value else 100
-                if not original_width or not original_height:
-                    original_width, original_height = image.size
-                
-                if resize_option == "按比例缩放":
-                    # 按百分比缩放
-                    new_width = int(original_width * value / 100)
-                    new_height = int(original_height * value / 100)
-                elif resize_option == "指定宽度":
-                    # 按指定宽度缩放，保持宽高比
-                    new_width = value
-                    new_height = int(original_height * value / original_width)
-                elif resize_option == "指定高度":
-                    # 按指定高度缩放，保持宽高比
-                    new_height = value
-                    new_width = int(original_width * value / original_height)
-                else:
-                    return image  # 默认返回原图
-                
-                # 兼容不同版本的Pillow
-                try:
-                    return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                except AttributeError:
-                    return image.resize((new_width, new_height), Image.LANCZOS)
-            except ValueError:
-                # 如果输入的值不是有效数字，返回原图
-                return image
+            return None
+        if new_size == tuple(size):
+            return None
+        return new_size
 
+    def resize_image(self, image, resize_option, resize_value, original_width=None, original_height=None):
+        """根据用户设置调整图片尺寸"""
+        if not original_width or not original_height:
+            original_width, original_height = image.size
+        new_size = self.get_resize_size((original_width, original_height), resize_option, resize_value)
+        if new_size is None:
+            if image.size == (original_width, original_height):
+                return image
+            # 图片以较小尺寸解码（draft），需要恢复原图尺寸
+            new_size = (original_width, original_height)
+        
+        # 兼容不同版本的Pillow
+        try:
+            return image.resize(new_size, Image.Resampling.LANCZOS)
+        except AttributeError:
+            return image.resize(new_size, Image.LANCZOS)
+    
     def generate_output_filename(self, input_path, output_dir, naming_rule, naming_value, format_rule):
         """根据用户设置生成输出文件名"""
         filename = os.path.basename(input_path)
@@ -90,123 +197,147 @@ class ImageProcessor:
         output_path = os.path.join(output_dir, f"{name}{ext}")
         return output_path
 
-    def process_image_for_export(self, image, output_format, quality=95):
-        """处理图片以准备导出"""
-        # 如果需要转换格式，确保图片模式正确
-        if output_format.lower() in ['.jpg', '.jpeg'] and image.mode in ('RGBA', 'LA', 'P'):
-            # JPEG不支持透明通道，转换为RGB
-            if image.mode == 'P':
-                image = image.convert("RGBA")
-            image = image.convert("RGB")
+    def _load_text_runs(self, text, face, font, font_size, bold=False, italic=False):
+        """根据字形覆盖索引，为所选字体缺少的字符加载回退字体"""
+        if not face or font is None:
+            return [(text, font)]
         
-        return image
-
-    def add_watermark_to_image(self, image, watermark_settings):
-        """为图片添加文本水印"""
-        # Convert to RGBA if not already (to support transparency)
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-            
-        # Create a transparent layer for the watermark
-        txt_layer = Image.new('RGBA', image.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(txt_layer)
+        from photowatermark.utils.fonts import split_text_by_coverage
+        runs = []
+        for segment, run_face in split_text_by_coverage(text, face, bold=bold, italic=italic):
+            if run_face is face:
+                run_font = font
+            else:
+                run_font = self.font_cache.get_font(run_face['path'], font_size, index=run_face['index'])
+            runs.append((segment, run_font))
+        return runs
+    
+    def get_text_sprite(self, layout, fill, effect=None):
+        """
+        返回渲染好的文字精灵图（包括文字效果），相同布局、颜色和效果只光栅化一次
         
-        # Get watermark settings
-        text = watermark_settings.get('text', 'Sample Text')
-        font_size = watermark_settings.get('font_size', 30)
-        color = watermark_settings.get('color', (255, 255, 255))
-        transparency = watermark_settings.get('transparency', 50)
-        position = watermark_settings.get('position', 'bottom-right')
-        font_name = watermark_settings.get('font_name', 'Arial')  # 默认字体
-        bold = watermark_settings.get('bold', False)
-        italic = watermark_settings.get('italic', False)
+        Args:
+            layout: TextLayout to render
+            fill (tuple): RGBA text colour
+            effect (tuple): (effect name, size, RGB colour) from ``text_effect``, or None
         
-        # Calculate transparency value (0-255)
-        alpha = int((transparency / 100) * 255)
+        Returns:
+            tuple: (sprite, (offset_x, offset_y), sprite cache key or None)
+        """
+        if layout.cache_key is None:
+            return render_text_sprite(layout, fill, effect) + (None,)
+        key = ('text', layout.cache_key, fill, effect)
+        return self.sprite_cache.get_sprite(key, lambda: render_text_sprite(layout, fill, effect)) + (key,)
+    
+    def get_logo_sprite(self, logo_path, image_size, scale=DEFAULT_WATERMARK_LOGO_SCALE, alpha=255):
+        """
+        返回按图片尺寸缩放好的Logo精灵图，每个尺寸档位只重采样一次
         
-        # Ensure alpha is within valid range
-        alpha = max(0, min(255, alpha))
+        Returns:
+            tuple: (sprite, sprite cache key), or (None, None) if the logo cannot be loaded
+        """
+        logo, signature = self.logo_cache.get_logo(logo_path)
+        if logo is None:
+            return None, None
+        return self._scaled_logo_sprite(logo_path, logo, signature, image_size, scale, alpha)
+    
+    def _scaled_logo_sprite(self, logo_path, logo, signature, image_size, scale, alpha):
+        """按图片尺寸缩放已解码的Logo（结果缓存在精灵图缓存中）"""
+        size = logo_target_size(logo.size, image_size, scale)
+        key = ('logo', logo_path, signature, size, alpha)
+        sprite, _ = self.sprite_cache.get_sprite(key, lambda: (scale_logo(logo, size, alpha), (0, 0)))
+        return sprite, key
+    
+    def _composite_sprite(self, image, sprite, position, sprite_key=None):
+        """
+        把水印精灵图混合到图片的对应区域（超出图片的部分被裁掉）。
         
-        # Create color with transparency
-        rgba_color = (*color, alpha)
+        Args:
+            image: RGBA, RGB, L or CMYK image, modified in place
+            sprite: RGBA sprite
+            position (tuple): Top-left corner of the sprite on the image
+            sprite_key: Sprite cache key, lets the engine cache its prepared sprite
+        """
+        engine = self._blend_engine
+        if not engine.caches_prepared:
+            return engine.blend(image, engine.prepare(sprite, image.mode), position)
+        if sprite_key is None or engine.prepared_nbytes(sprite, image.mode) > self.sprite_cache.max_bytes:
+            # 预处理结果无法缓存时每张图片都要重新转换整个精灵图，直接用Pillow混合更快
+            return self._pillow_engine.blend(image, sprite, position)
+        prepared, _ = self.sprite_cache.get_sprite(
+            (engine.name, image.mode, sprite_key),
+            lambda: (engine.prepare(sprite, image.mode), (0, 0))
+        )
+        return engine.blend(image, prepared, position)
+    
+    def get_rotated_sprite(self, sprite, sprite_key, angle):
+        """
+        返回旋转后的精灵图（抗锯齿旋转，按原精灵图的键和角度缓存）
         
-        # Handle font loading safely with font name support
-        font = None
-        actual_font_info = {'bold': False, 'italic': False, 'path': None}
-        if ImageFont:
-            try:
-                # Try to load the specified font by name with style support
-                from photowatermark.utils.fonts import get_stylized_font_path, _get_font_info
-                font_path = get_stylized_font_path(font_name, bold=bold, italic=italic)
-                actual_font_info['path'] = font_path
-                
-                # Check what style the actual font has
-                if font_path:
-                    font_info = _get_font_info(font_path)
-                    if font_info:
-                        # Update the actual font info
-                        actual_font_info['bold'] = font_info.get('is_bold', False)
-                        actual_font_info['italic'] = font_info.get('is_italic', False)
-                
-                if font_path and os.path.exists(font_path):
-                    font = ImageFont.truetype(font_path, font_size)
-                else:
-                    # Fallback to Arial if font not found
-                    font = ImageFont.truetype("arial.ttf", font_size)
-            except:
-                try:
-                    # Try Arial as fallback
-                    font = ImageFont.truetype("arial.ttf", font_size)
-                except:
-                    try:
-                        # Try DejaVuSans as another fallback
-                        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
-                    except:
-                        # Use default font if no TrueType fonts are available
-                        font = ImageFont.load_default()
-        else:
-            # If ImageFont is not available, use default
-            font = None
+        Returns:
+            tuple: (rotated sprite, sprite cache key or None)
+        """
+        if not angle % 360:
+            return sprite, sprite_key
+        if sprite_key is None:
+            return rotate_sprite(sprite, angle), None
+        key = ('rotated', sprite_key, angle)
+        rotated, _ = self.sprite_cache.get_sprite(key, lambda: (rotate_sprite(sprite, angle), (0, 0)))
+        return rotated, key
+    
+    def _composite_tiled(self, image, sprite, sprite_key=None, spacing=DEFAULT_WATERMARK_TILE_SPACING,
+                         angle=DEFAULT_WATERMARK_TILE_ANGLE, stagger=DEFAULT_WATERMARK_TILE_STAGGER):
+        """
+        Repeat the watermark across the whole image.
         
-        # If we want bold or italic but couldn't load a styled font, try to simulate with font properties
-        # This is a fallback approach for when we can't find a specific bold/italic font file
-        if (bold or italic) and font and hasattr(font, "font"):
-            try:
-                # For some versions of Pillow, we can modify font properties
-                if bold:
-                    # Note: This is a simplified approach. Real bold rendering requires a bold font file.
-                    pass  # We'll rely on loading the correct font file above
-                if italic:
-                    # Note: This is a simplified approach. Real italic rendering requires an italic font file.
-                    pass  # We'll rely on loading the correct font file above
-            except:
-                # If we can't modify font properties, we'll just use the font as-is
-                pass
+        The rotated tile and a row strip of tiles are built once (and cached
+        with the sprite), then the strip is blended row by row.
         
-        # Calculate text size
-        text_width = 0
-        text_height = 0
+        Args:
+            image: Image to blend into, modified in place
+            sprite: RGBA watermark sprite
+            sprite_key: Sprite cache key, or None if the sprite is not cached
+            spacing (int): Gap between neighbouring tiles in pixels
+            angle (float): Counter-clockwise rotation in degrees
+            stagger (int): Row offset as a percentage of the horizontal period
+        """
+        def cached(key, render):
+            if sprite_key is None:
+                return render()
+            return self.sprite_cache.get_sprite(key, render)
         
-        if font and ImageFont:
-            try:
-                # For Pillow >= 10.0.0
-                bbox = draw.textbbox((0, 0), text, font=font)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-            except AttributeError:
-                # For older versions of Pillow
-                try:
-                    text_width, text_height = draw.textsize(text, font=font)
-                except:
-                    # Fallback to a default size
-                    text_width, text_height = font_size * len(text) // 2, font_size
-        else:
-            # If no font is available, estimate text size
-            text_width, text_height = font_size * len(text) // 2, font_size
+        tile, _ = self.get_rotated_sprite(sprite, sprite_key, angle)
+        period = tile_period(tile.size, spacing)
+        repeats = strip_repeats(image.size[0], period[0])
+        strip_key = ('tile-strip', sprite_key, angle, period[0], repeats)
+        strip, _ = cached(strip_key, lambda: (build_row_strip(tile, period[0], repeats), (0, 0)))
         
-        # Determine position
-        width, height = image.size
-        margin = 10
+        if sprite_key is None:
+            strip_key = None
+        for position in strip_positions(image.size, tile.size, period, strip.size[0], stagger):
+            self._composite_sprite(image, strip, position, strip_key)
+        return image
+    
+    def _calculate_position(self, image_size, box_size, watermark_settings, scale=None):
+        """
+        Get the top-left corner of a watermark box for the nine-grid or
+        custom position in the settings.
+        
+        Args:
+            image_size (tuple): (width, height) of the image
+            box_size (tuple): (width, height) of the watermark
+            watermark_settings (dict): Watermark settings
+            scale (float): Output scale, or None to read it from the settings
+            
+        Returns:
+            tuple: (x, y)
+        """
+        position = watermark_settings.get('position', 'bottom-right')
+        width, height = image_size
+        box_width, box_height = box_size
+        if scale is None:
+            scale = watermark_settings.get('scale', 1)
+        margin = scale_length(WATERMARK_MARGIN, scale)
         
         # Check if using custom coordinates (relative position as percentage)
         if position == 'custom' and 'custom_x' in watermark_settings and 'custom_y' in watermark_settings:
@@ -218,35 +349,482 @@ class ImageProcessor:
             abs_x = int((rel_x / 100) * width)
             abs_y = int((rel_y / 100) * height)
             
-            # Adjust for text size to keep the text within bounds
-            abs_x = max(0, min(abs_x, width - text_width))
-            abs_y = max(0, min(abs_y, height - text_height))
+            # Adjust for watermark size to keep the watermark within bounds
+            abs_x = max(0, min(abs_x, width - box_width))
+            abs_y = max(0, min(abs_y, height - box_height))
             
             x, y = abs_x, abs_y
         elif position == 'top-left':
             x, y = margin, margin
         elif position == 'top-center':
-            x, y = (width - text_width) // 2, margin
+            x, y = (width - box_width) // 2, margin
         elif position == 'top-right':
-            x, y = width - text_width - margin, margin
+            x, y = width - box_width - margin, margin
         elif position == 'middle-left':
-            x, y = margin, (height - text_height) // 2
+            x, y = margin, (height - box_height) // 2
         elif position == 'center':
-            x, y = (width - text_width) // 2, (height - text_height) // 2
+            x, y = (width - box_width) // 2, (height - box_height) // 2
         elif position == 'middle-right':
-            x, y = width - text_width - margin, (height - text_height) // 2
+            x, y = width - box_width - margin, (height - box_height) // 2
         elif position == 'bottom-left':
-            x, y = margin, height - text_height - margin
+            x, y = margin, height - box_height - margin
         elif position == 'bottom-center':
-            x, y = (width - text_width) // 2, height - text_height - margin
+            x, y = (width - box_width) // 2, height - box_height - margin
         else:  # Default to bottom-right
-            x, y = width - text_width - margin, height - text_height - margin
+            x, y = width - box_width - margin, height - box_height - margin
+        return x, y
+    
+    def _prepare_canvas(self, image, fill, in_place=False):
+        """
+        Get the image the watermark is blended into.
         
-        # Draw the text
-        draw.text((x, y), text, fill=rgba_color, font=font)
+        The image is converted only when ``watermark_canvas_mode`` asks for
+        another mode.
         
-        # Composite the text layer onto the original image
-        watermarked = Image.alpha_composite(image, txt_layer)
+        Args:
+            image: Source image
+            fill (tuple): RGBA watermark colour, or None for a coloured logo
+            in_place (bool): The caller owns ``image`` and it may be modified
+            
+        Returns:
+            Image: The image to draw on
+        """
+        mode = watermark_canvas_mode(image, fill)
+        if mode != image.mode:
+            return image.convert(mode)
+        if in_place:
+            return image
+        # The watermark is blended in place, so never modify the caller's image
+        return image.copy()
+    
+    def prepare_watermark(self, watermark_settings):
+        """
+        Resolve watermark settings once for applying them to many images.
+
+        Settings with ``layers`` (bottom first) describe a stack: the layers
+        are drawn under the watermark of the settings themselves. Prepared
+        watermarks are shared through ``prepared_cache``, so equal settings
+        are resolved only once for the preview and every export.
+
+        Args:
+            watermark_settings: WatermarkSettings or a watermark settings dict
+
+        Returns:
+            PreparedWatermark or WatermarkStack: The prepared watermark
+
+        Raises:
+            ValueError: If the settings are invalid
+        """
+        settings = WatermarkSettings.coerce(watermark_settings)
+        if settings.layers:
+            return WatermarkStack(self, list(settings.layers) + [settings.replace(layers=())])
+
+        def prepare():
+            prepared = PreparedWatermark(self, settings)
+            return prepared, prepared.cacheable
+        # 准备好的水印使用这个处理器的混合引擎
+        return self.prepared_cache.get_prepared((settings, self.blend_engine), prepare, PreparedWatermark.is_current)
+
+    def add_watermark_to_image(self, image, watermark_settings, in_place=False):
+        """
+        为图片添加文本水印或Logo水印
+
+        Args:
+            image: Source image
+            watermark_settings (dict): Watermark settings
+            in_place (bool): Blend into ``image`` itself when its mode allows,
+                for callers that do not need the original any more
+
+        Returns:
+            tuple: (watermarked image, actual font info)
+        """
+        return self.prepare_watermark(watermark_settings).apply(image, in_place=in_place)
+
+    def add_watermark_batch(self, images, watermark_settings, in_place=False):
+        """
+        Watermark many images with the same settings.
+
+        The font, text layout and sprite are prepared once (once per size
+        variant when the watermark depends on the image size) and results are
+        produced lazily, so a caller can stream any number of images while
+        only the current one is held in memory.
+
+        Args:
+            images (iterable): PIL images or image file paths
+            watermark_settings (dict): Watermark settings shared by all images
+            in_place (bool): Blend into the given images themselves when their
+                mode allows; images opened from paths are always blended in place
+
+        Yields:
+            tuple: (watermarked image, actual font info) for each input
+        """
+        prepared = self.prepare_watermark(watermark_settings)
+        for image in images:
+            if isinstance(image, (str, os.PathLike)):
+                with Image.open(image) as opened:
+                    opened.load()
+                    result = prepared.apply(opened, in_place=True)
+            else:
+                result = prepared.apply(image, in_place=in_place)
+            yield result
+
+
+class PreparedWatermark:
+    """
+    Watermark settings resolved once and applied to any number of images.
+
+    The settings are read, the font face is looked up and a logo is decoded
+    when the watermark is prepared. The font, text layout and sprite depend
+    on the image only through the font size and the wrap width, so they are
+    kept per such size variant and shared by every image that needs it.
+    """
+
+    # 保留的尺寸变体数量（相对字号、缩放比例和换行宽度可能随图片变化）
+    MAX_VARIANTS = 16
+
+    def __init__(self, processor, watermark_settings):
+        self.processor = processor
+        # 默认值和检查都在 WatermarkSettings 中
+        self.settings = watermark_settings = WatermarkSettings.coerce(watermark_settings)
+
+        # Get watermark settings
+        self.text = watermark_settings.text
+        self.font_size = watermark_settings.font_size
+        color = watermark_settings.color
+        transparency = watermark_settings.transparency
+        self.position = watermark_settings.position
+        self.font_name = watermark_settings.font_name
+        self.bold = watermark_settings.bold
+        self.italic = watermark_settings.italic
+        self.align = watermark_settings.align
+        self.line_spacing = watermark_settings.line_spacing
+        self.max_width_ratio = watermark_settings.max_width_ratio  # 最大宽度占图片宽度的比例
+        self.tile_spacing = watermark_settings.tile_spacing
+        self.tile_angle = watermark_settings.tile_angle
+        self.tile_stagger = watermark_settings.tile_stagger
+        # 单个水印的旋转角度（平铺模式使用平铺角度）
+        self.rotation = watermark_settings.rotation
+        self.rotates = bool(self.rotation % 360) and self.position != WATERMARK_TILE_POSITION
+        self.is_relative = watermark_settings.size_mode == WATERMARK_SIZE_RELATIVE
+        self.relative_size = watermark_settings.relative_size
+        self.is_logo = watermark_settings.type == WATERMARK_TYPE_IMAGE
+        self.logo_path = watermark_settings.logo_path
+        self.logo_scale = watermark_settings.logo_scale
+        self.effect = watermark_settings.effect
+        self.effect_size = watermark_settings.effect_size
+        self.effect_color = watermark_settings.effect_color
+        # 图片在添加水印前被缩放时，像素尺寸按相同比例缩放，与预览效果一致
+        self.scale = watermark_settings.scale
+
+        # Calculate transparency value (0-255), within the valid range
+        self.alpha = max(0, min(255, int((transparency / 100) * 255)))
+        # Create color with transparency
+        self.fill = (*color, self.alpha)
+        # 自动颜色：每张图片按水印区域的亮度选择文字颜色（Logo保持自身颜色）
+        # 自动位置：每张图片在候选的九宫格位置中选择最平坦的一个
+        self._auto_candidates = None
+        if self.position == WATERMARK_AUTO_POSITION:
+            self._auto_candidates = [watermark_settings.replace(position=candidate)
+                                     for candidate in WATERMARK_AUTO_POSITION_CANDIDATES]
+        self.auto_color = not self.is_logo and watermark_settings.color_mode == WATERMARK_COLOR_AUTO
+
+        self.actual_font_info = {'bold': False, 'italic': False, 'path': None, 'index': 0}
+        self._face = None  # 实际加载的字体（用于字形覆盖检查）
+        self._logo = self._logo_signature = None
+        self._variants = OrderedDict()
+        # 缓存的水印可能同时被预览和后台导出使用
+        self._variants_lock = threading.Lock()
+        if self.is_logo:
+            self._logo, self._logo_signature = processor.logo_cache.get_logo(self.logo_path)
+        else:
+            self._resolve_face()
+
+    @property
+    def cacheable(self):
+        """
+        Whether the prepared watermark may be shared through the prepared cache.
+
+        A logo that could not be loaded, or a font that was not found while
+        the font index was still loading, is looked up again next time.
+        """
+        if self.is_logo:
+            return self._logo is not None
+        if self._face is not None or not ImageFont:
+            return True
+        try:
+            from photowatermark.utils.fonts import system_fonts_ready
+            return system_fonts_ready()
+        except Exception:
+            return False
+
+    def is_current(self):
+        """缓存的Logo水印在Logo文件被替换后需要重新准备"""
+        if not self.is_logo:
+            return True
+        _, signature = self.processor.logo_cache.get_logo(self.logo_path)
+        return signature == self._logo_signature
+
+    def _resolve_face(self):
+        """根据字体名称和样式查找字体文件（与字号无关，只查找一次）"""
+        if not ImageFont:
+            return
+        try:
+            # Resolve the styled face from the precomputed family style table
+            from photowatermark.utils.fonts import get_stylized_font_face, system_fonts_ready
+            if not self.processor.wait_for_fonts and not system_fonts_ready():
+                # 不等待字体扫描：使用后备字体，且不进入已准备水印缓存
+                return
+            face = get_stylized_font_face(self.font_name, bold=self.bold, italic=self.italic)
+        except Exception:
+            return
+        if face:
+            # Record what style the actual font has
+            self.actual_font_info['path'] = face['path']
+            self.actual_font_info['index'] = face['index']
+            self.actual_font_info['bold'] = face['is_bold']
+            self.actual_font_info['italic'] = face['is_italic']
+            if face['path'] and os.path.exists(face['path']):
+                self._face = face
+
+    def _load_font(self, font_size):
+        """
+        Load the resolved face at ``font_size``.
+
+        Returns:
+            tuple: (font, face used for glyph coverage or None)
+        """
+        if not ImageFont:
+            # If ImageFont is not available, use default
+            return None, None
+        font_cache = self.processor.font_cache
+        if self._face is not None:
+            try:
+                return font_cache.get_font(self._face['path'], font_size, index=self._face['index']), self._face
+            except Exception:
+                pass
+        # Fallback chain: arial.ttf -> DejaVuSans.ttf -> default font
+        return font_cache.get_fallback_font(font_size), None
+
+    def _text_variant(self, image_size, scale, style=None):
+        """
+        Get the font, layout and sprite for an image size and output scale.
+
+        Args:
+            image_size (tuple): (width, height) of the image
+            scale (float): Output scale
+            style (tuple): (RGBA fill, effect) chosen by the automatic colour,
+                or None for the colour and effect in the settings
+
+        Returns:
+            tuple: (font, layout or None, (text width, text height), sprite,
+            (offset_x, offset_y), sprite cache key)
+        """
+        font_size = max(1, scale_length(self.font_size, scale))
+        if self.is_relative:
+            # Size the text relative to the image's short edge (rounded to a size bucket)
+            font_size = relative_font_size(image_size, self.relative_size)
+        line_spacing = scale_length(self.line_spacing, scale)
+        max_width = int(image_size[0] * self.max_width_ratio) if self.max_width_ratio else None
+        if style is None:
+            style = (self.fill, text_effect(self.effect, scale_length(self.effect_size, scale), self.effect_color))
+        fill, effect = style
+
+        key = (font_size, line_spacing, max_width, effect, fill)
+        with self._variants_lock:
+            variant = self._variants.get(key)
+            if variant is not None:
+                self._variants.move_to_end(key)
+                return variant
+
+        variant = self._render_variant(font_size, line_spacing, max_width, effect, fill)
+        with self._variants_lock:
+            self._variants[key] = variant
+            while len(self._variants) > self.MAX_VARIANTS:
+                self._variants.popitem(last=False)
+        return variant
+
+    def _render_variant(self, font_size, line_spacing, max_width, effect=None, fill=None):
+        """加载字体、排版并渲染精灵图（文字效果一并渲染进精灵图）"""
+        if fill is None:
+            fill = self.fill
+        font, text_face = self._load_font(font_size)
+
+        # Break the text into lines and measure it (cached by text, font, size and max width)
+        layout = None
+        if font and ImageFont:
+            try:
+                layout = self.processor.layout_cache.get_layout(
+                    self.text, font,
+                    # Pick fallback fonts for characters the selected font has no glyph for
+                    lambda line: self.processor._load_text_runs(
+                        line, text_face, font, font_size, self.bold, self.italic),
+                    max_width=max_width,
+                    spacing=line_spacing,
+                    align=self.align,
+                    style=(self.bold, self.italic)
+                )
+            except Exception:
+                layout = None
+
+        if layout is None:
+            # Without a layout, estimate the text size
+            return font, None, (font_size * len(self.text) // 2, font_size), None, (0, 0), None
+
+        # Render the text into a bbox-sized sprite (cached by its visual settings)
+        sprite, offset, sprite_key = self.processor.get_text_sprite(layout, fill, effect)
+        box_size = (layout.width, layout.height)
+        if self.rotates:
+            sprite, sprite_key, box_size, offset = self._rotate(sprite, sprite_key, box_size, offset)
+        return font, layout, box_size, sprite, offset, sprite_key
+    
+    def _rotate(self, sprite, sprite_key, box_size, offset):
+        """
+        Rotate a sprite once and get the rotated watermark box, so that the
+        nine-grid positions hold for the rotated watermark.
         
+        Returns:
+            tuple: (rotated sprite, sprite cache key, rotated box size,
+            sprite offset in the rotated box)
+        """
+        rotated, rotated_key = self.processor.get_rotated_sprite(sprite, sprite_key, self.rotation)
+        box_size, offset = rotated_placement(box_size, sprite.size, offset, self.rotation, rotated.size)
+        return rotated, rotated_key, box_size, offset
+
+    @property
+    def canvas_fill(self):
+        """决定画布模式的水印颜色（Logo为None，按彩色处理）"""
+        if self.is_logo:
+            return None
+        if self.auto_color:
+            # 自动颜色只使用黑白，灰度图片无需转换
+            return (255, 255, 255, self.alpha)
+        return self.fill
+
+    def _auto_style(self, image, box, scale):
+        """
+        Choose the text colour and effect for the region a watermark covers.
+
+        The text turns light or dark against the region's luminance; the
+        effect takes the contrasting colour, and a busy or mid-tone region
+        gets an outline when no effect is set.
+
+        Returns:
+            tuple: (RGBA fill, effect) for ``_text_variant``
+        """
+        color, contrast, outline = auto_watermark_color(image, box)
+        effect_name = self.effect
+        effect_size = scale_length(self.effect_size, scale)
+        if outline and effect_name == WATERMARK_EFFECT_NONE:
+            effect_name, effect_size = WATERMARK_EFFECT_STROKE, max(1, effect_size)
+        return (*color, self.alpha), text_effect(effect_name, effect_size, contrast)
+
+    def _position(self, image, box_size, scale):
+        """
+        Get the top-left corner of the watermark box on an image.
+
+        With the automatic position, the nine-grid anchor whose box has the
+        least edge energy on a small proxy of the image wins.
+
+        Returns:
+            tuple: (x, y)
+        """
+        if self._auto_candidates is None:
+            return self.processor._calculate_position(image.size, box_size, self.settings, scale)
+        corners = [self.processor._calculate_position(image.size, box_size, candidate, scale)
+                   for candidate in self._auto_candidates]
+        boxes = [(x, y, x + box_size[0], y + box_size[1]) for x, y in corners]
+        return corners[calmest_box(image, boxes)]
+
+    def place(self, image, scale=None):
+        """
+        Get the sprite of this watermark and where it goes on an image.
+
+        Args:
+            image: Canvas the watermark is blended into (only read)
+            scale (float): Output scale of this image, or None for the
+                ``scale`` in the settings
+
+        Returns:
+            tuple: (sprite, top-left corner or None to tile the sprite over
+            the whole image, sprite cache key or None), or None when there
+            is nothing to draw
+        """
+        if scale is None:
+            scale = self.scale
+
+        image_size = image.size
+        if self.is_logo:
+            # Logo watermark: the logo's own alpha combines with the transparency setting
+            if self._logo is None:
+                return None
+            sprite, sprite_key = self.processor._scaled_logo_sprite(
+                self.logo_path, self._logo, self._logo_signature, image_size, self.logo_scale, self.alpha)
+            if self.position == WATERMARK_TILE_POSITION:
+                return sprite, None, sprite_key
+            box_size, (offset_x, offset_y) = sprite.size, (0, 0)
+            if self.rotates:
+                sprite, sprite_key, box_size, (offset_x, offset_y) = self._rotate(
+                    sprite, sprite_key, box_size, (offset_x, offset_y))
+            x, y = self._position(image, box_size, scale)
+            return sprite, (x + offset_x, y + offset_y), sprite_key
+
+        font, layout, box_size, sprite, (offset_x, offset_y), sprite_key = self._text_variant(image_size, scale)
+
+        # Determine position
+        x, y = self._position(image, box_size, scale)
+
+        if self.auto_color and layout is not None:
+            # 按水印覆盖区域（平铺时为整张图片）选择颜色，位置与颜色无关
+            box = None if self.position == WATERMARK_TILE_POSITION else (x, y, x + box_size[0], y + box_size[1])
+            style = self._auto_style(image, box, scale)
+            font, layout, box_size, sprite, (offset_x, offset_y), sprite_key = self._text_variant(
+                image_size, scale, style)
+
+        if layout is None:
+            # Without a layout the text box is unknown, fall back to a full-size layer
+            txt_layer = Image.new('RGBA', image_size, (255, 255, 255, 0))
+            ImageDraw.Draw(txt_layer).text((x, y), self.text, fill=self.fill, font=font)
+            return txt_layer, (0, 0), None
+        if self.position == WATERMARK_TILE_POSITION:
+            # Repeat the watermark over the whole image
+            return sprite, None, sprite_key
+        return sprite, (x + offset_x, y + offset_y), sprite_key
+
+    def blend(self, image, placement, scale=None):
+        """
+        Blend a placement from ``place`` into a prepared canvas.
+
+        Returns:
+            Image: The watermarked canvas
+        """
+        if placement is None:
+            return image
+        if scale is None:
+            scale = self.scale
+        sprite, position, sprite_key = placement
+        if position is None:
+            return self.processor._composite_tiled(
+                image, sprite, sprite_key, scale_length(self.tile_spacing, scale),
+                self.tile_angle, self.tile_stagger)
+        # Blend only the affected region
+        return self.processor._composite_sprite(image, sprite, position, sprite_key)
+
+    def apply(self, image, in_place=False, scale=None):
+        """
+        Watermark one image.
+
+        Args:
+            image: Source image
+            in_place (bool): Blend into ``image`` itself when its mode allows
+            scale (float): Output scale of this image, or None for the
+                ``scale`` in the settings
+
+        Returns:
+            tuple: (watermarked image, actual font info)
+        """
+        # Blend in the image's own mode where possible, avoiding a full-frame RGBA copy
+        image = self.processor._prepare_canvas(image, self.canvas_fill, in_place)
+        watermarked = self.blend(image, self.place(image, scale), scale)
+
         # Return both the watermarked image and the actual font info
-        return watermarked, actual_font_info
\ No newline at end of file
+        return watermarked, dict(self.actual_font_info)
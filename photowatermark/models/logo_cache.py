@@ -0,0 +1,135 @@
+"""
+Logo (image watermark) cache for the PhotoWatermark-AI4SE application.
+
+A logo is decoded once per file version. Scaled copies are made once per
+target size bucket and kept in the shared sprite cache, so a batch of
+similar-sized photos resamples the logo only once.
+"""
+from collections import OrderedDict
+import os
+import threading
+
+from PIL import Image
+
+DEFAULT_LOGO_CACHE_SIZE = 8
+
+# 缩放后的Logo宽度按这个步长取整，相近尺寸的图片共用一个缩放结果
+LOGO_SIZE_STEP = 8
+
+try:
+    _LANCZOS = Image.Resampling.LANCZOS
+except AttributeError:
+    # 对于旧版本的PIL
+    _LANCZOS = Image.LANCZOS
+
+
+def _file_signature(path):
+    """文件的 (修改时间, 大小)，文件被替换后重新解码"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def logo_target_size(logo_size, image_size, scale):
+    """
+    Get the bucketed size of a logo scaled relative to the target image.
+
+    Args:
+        logo_size (tuple): (width, height) of the decoded logo
+        image_size (tuple): (width, height) of the target image
+        scale (float): Logo width as a percentage of the image width
+
+    Returns:
+        tuple: (width, height) of the scaled logo
+    """
+    logo_width, logo_height = logo_size
+    target_width = image_size[0] * scale / 100
+    if target_width >= LOGO_SIZE_STEP:
+        target_width = round(target_width / LOGO_SIZE_STEP) * LOGO_SIZE_STEP
+    width = max(1, int(round(target_width)))
+    height = max(1, int(round(logo_height * width / logo_width)))
+    return width, height
+
+
+def scale_logo(logo, size, alpha=255):
+    """
+    Resample a logo and combine its own alpha with the watermark opacity.
+
+    Args:
+        logo: Decoded RGBA logo
+        size (tuple): Target (width, height)
+        alpha (int): Watermark opacity (0-255)
+
+    Returns:
+        Image: RGBA sprite
+    """
+    sprite = logo if logo.size == size else logo.resize(size, _LANCZOS)
+    if alpha < 255:
+        if sprite is logo:
+            sprite = logo.copy()
+        sprite.putalpha(sprite.getchannel('A').point([value * alpha // 255 for value in range(256)]))
+    return sprite
+
+
+class LogoCache:
+    """
+    Bounded LRU cache of decoded logos keyed by path and file signature.
+
+    Logos that fail to load are remembered, so a missing or broken file is
+    reported once rather than for every image of a batch.
+    """
+
+    def __init__(self, max_size=DEFAULT_LOGO_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._logos = OrderedDict()  # path -> (signature, RGBA image or None)
+        self._lock = threading.Lock()
+
+    def get_logo(self, path):
+        """
+        Get a decoded logo.
+
+        Returns:
+            tuple: (RGBA image, file signature), or (None, None) if the
+            logo cannot be loaded
+        """
+        signature = _file_signature(path) if path else None
+        if signature is None:
+            return None, None
+
+        with self._lock:
+            entry = self._logos.get(path)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                self._logos.move_to_end(path)
+                return entry[1], (signature if entry[1] is not None else None)
+            self.misses += 1
+
+        try:
+            with Image.open(path) as opened:
+                logo = opened.convert('RGBA')
+        except Exception as e:
+            print(f"无法加载Logo图片 {path}: {str(e)}")
+            logo = None
+
+        with self._lock:
+            self._logos[path] = (signature, logo)
+            self._logos.move_to_end(path)
+            while len(self._logos) > self.max_size:
+                self._logos.popitem(last=False)
+        return logo, (signature if logo is not None else None)
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._logos), 'max_size': self.max_size}
+
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._logos.clear()
+            self.hits = 0
+            self.misses = 0
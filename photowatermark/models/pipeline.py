@@ -0,0 +1,333 @@
+"""
+Export pipeline for the PhotoWatermark-AI4SE application.
+
+Every export (the GUI, the controller and the command line tool) runs through
+:class:`ExportPipeline`. The pipeline is built once from a snapshot of the
+export settings and takes each image through the stages
+
+    decode -> orient -> resize -> watermark -> mode-convert -> invisible-watermark
+    -> encode -> write
+
+Stages are fused where that saves work:
+
+* stages that cannot change the image for the given settings are dropped
+  when the pipeline is built (no resize, no watermark, no orientation);
+* JPEG files that are downscaled at least twofold are decoded at a reduced
+  scale (``Image.draft``), so decoding and resizing share one pass;
+* the watermark is drawn after the resize, at output resolution;
+* the conversion the watermark needs and the one the output format needs are
+  merged into a single conversion whenever no transparency is lost between
+  them, and palette images are converted before resizing so that they are
+  resampled smoothly;
+* the invisible watermark is embedded last, in place, into the pixels that
+  are encoded;
+* encoding writes straight to the output file.
+
+Before a batch runs, the batch planner (:mod:`photowatermark.models.batch_planner`)
+reads the image headers, groups the images by size and orders them; with
+``export_workers`` above 1 the images are exported by a thread pool, largest
+first.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from PIL import Image, ImageOps
+
+from photowatermark.models.image_processor import ImageProcessor, CMYK_FORMATS, watermark_canvas_mode
+from photowatermark.models.invisible_watermark import (
+    InvisibleWatermark, invisible_watermark_available, encode_payload, strength_for_quality,
+    DEFAULT_INVISIBLE_KEY, DEFAULT_INVISIBLE_STRENGTH, MIN_INVISIBLE_QUALITY
+)
+from photowatermark.models.watermark_settings import WatermarkSettings
+from photowatermark.utils.constants import (
+    RESIZE_OPTIONS,
+    DEFAULT_QUALITY,
+    DEFAULT_EXPORT_WORKERS
+)
+
+STAGE_DECODE = "decode"
+STAGE_ORIENT = "orient"
+STAGE_RESIZE = "resize"
+STAGE_WATERMARK = "watermark"
+STAGE_CONVERT = "mode-convert"
+STAGE_INVISIBLE = "invisible-watermark"
+STAGE_ENCODE = "encode"
+STAGE_WRITE = "write"
+PIPELINE_STAGES = (STAGE_DECODE, STAGE_ORIENT, STAGE_RESIZE, STAGE_WATERMARK, STAGE_CONVERT, STAGE_INVISIBLE,
+                   STAGE_ENCODE, STAGE_WRITE)
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+# JPEG能保存的图片模式
+JPEG_MODES = ('RGB', 'L', 'CMYK')
+# 缩放时只能用最近邻采样的模式，先转换再缩放
+UNFILTERED_MODES = ('P', '1')
+# EXIF中的方向标签
+EXIF_ORIENTATION = 0x0112
+# 方向值5-8表示图片需要旋转90度（宽高互换）
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def watermark_settings_from_export(settings):
+    """
+    Convert export settings (``watermark_*`` keys) into the watermark settings
+    used by ``ImageProcessor.add_watermark_to_image``.
+
+    Returns:
+        WatermarkSettings: Watermark settings, or None if the watermark is disabled
+
+    Raises:
+        ValueError: If a watermark setting is invalid
+    """
+    if not settings.get('watermark_enabled', False):
+        return None
+    return WatermarkSettings.from_export(settings)
+
+
+def output_mode(mode, ext):
+    """输出格式能保存的图片模式（只在格式不支持当前模式时改变）"""
+    if ext in JPEG_EXTENSIONS:
+        # JPEG不支持透明通道和调色板
+        return mode if mode in JPEG_MODES else 'RGB'
+    if mode == 'CMYK' and ext not in CMYK_FORMATS:
+        # PNG等格式不支持CMYK
+        return 'RGB'
+    return mode
+
+
+def _has_alpha(mode):
+    """模式是否带透明通道"""
+    return mode.endswith(('A', 'a'))
+
+
+class ExportPipeline:
+    """
+    Watermark and save images with one snapshot of the export settings.
+
+    The settings are copied when the pipeline is built, so the caller may
+    keep changing its own dict (or the GUI) while a batch runs.
+    """
+
+    def __init__(self, settings, image_processor=None):
+        """
+        Args:
+            settings (dict): Export settings (naming, format, quality, resize
+                and ``watermark_*`` keys; ``auto_orient`` applies the EXIF
+                orientation before processing, ``export_workers`` sets the
+                number of export threads)
+            image_processor (ImageProcessor): Processor to use, or None for a new one
+        """
+        self.settings = dict(settings)
+        self.image_processor = image_processor or ImageProcessor()
+        self.watermark_settings = watermark_settings_from_export(self.settings)
+        self.resize_option = self.settings.get('resize_option', '原图尺寸')
+        self.resize_value = self.settings.get('resize_value', '')
+        self.quality = self.settings.get('quality', DEFAULT_QUALITY)
+        self.auto_orient = bool(self.settings.get('auto_orient', False))
+        self.workers = max(1, int(self.settings.get('export_workers') or DEFAULT_EXPORT_WORKERS))
+        self._invisible, self.invisible_payload = self._prepare_invisible()
+
+        self.stages = self._plan_stages()
+        # 字体、排版和精灵图为整批图片只准备一次
+        self._watermark = None
+        self._watermark_fill = None
+        if self.watermark_settings is not None:
+            self._watermark = self.image_processor.prepare_watermark(self.watermark_settings)
+            # 水印颜色决定灰度图片是否需要转换为彩色（Logo、彩色文字或图层中有彩色时）
+            self._watermark_fill = self._watermark.canvas_fill
+
+    def _prepare_invisible(self):
+        """
+        Build the invisible watermark engine from the ``invisible_watermark_*`` settings.
+
+        The strength follows the JPEG quality, so the mark can still be read
+        from the exported JPEG files; PNG exports use the default strength.
+        Below MIN_INVISIBLE_QUALITY the mark could not be read back and is
+        not embedded.
+
+        Returns:
+            tuple: (InvisibleWatermark or None, payload)
+        """
+        payload = self.settings.get('invisible_watermark_text', '')
+        if not self.settings.get('invisible_watermark_enabled', False) or not payload:
+            return None, payload
+        if not invisible_watermark_available():
+            print("隐形水印需要安装 numpy，已跳过")
+            return None, payload
+        try:
+            encode_payload(payload)
+        except ValueError as e:
+            print(f"隐形水印内容无效，已跳过: {str(e)}")
+            return None, payload
+        strength = self.settings.get('invisible_watermark_strength')
+        if strength is None:
+            strength = DEFAULT_INVISIBLE_STRENGTH
+            if self.settings.get('format_rule', '原格式') != 'PNG':
+                strength = strength_for_quality(self.quality)
+                if strength is None:
+                    print(f"JPEG质量低于 {MIN_INVISIBLE_QUALITY} 时隐形水印无法检测，已跳过")
+                    return None, payload
+        engine = InvisibleWatermark(
+            self.settings.get('invisible_watermark_key', DEFAULT_INVISIBLE_KEY),
+            strength
+        )
+        return engine, payload
+
+    def _plan_stages(self):
+        """去掉对当前设置不起作用的阶段"""
+        stages = [STAGE_DECODE]
+        if self.auto_orient:
+            stages.append(STAGE_ORIENT)
+        if self._resizes():
+            stages.append(STAGE_RESIZE)
+        if self.watermark_settings is not None:
+            stages.append(STAGE_WATERMARK)
+        stages.append(STAGE_CONVERT)
+        if self._invisible is not None:
+            stages.append(STAGE_INVISIBLE)
+        stages.extend((STAGE_ENCODE, STAGE_WRITE))
+        return tuple(stages)
+
+    def _resizes(self):
+        """缩放设置是否可能改变图片尺寸（按原尺寸、无效值和100%缩放都不改变）"""
+        if self.resize_option not in RESIZE_OPTIONS[1:] or not self.resize_value:
+            return False
+        try:
+            value = int(self.resize_value)
+        except ValueError:
+            return False
+        return not (self.resize_option == "按比例缩放" and value == 100)
+
+    def describe(self):
+        """返回可读的阶段列表，例如 "decode -> resize -> watermark -> ..." """
+        return " -> ".join(self.stages)
+
+    def output_path(self, input_path, output_dir):
+        """根据命名规则和输出格式生成输出文件路径"""
+        return self.image_processor.generate_output_filename(
+            input_path,
+            output_dir,
+            self.settings.get('naming_rule', '保留原名'),
+            self.settings.get('naming_value', ''),
+            self.settings.get('format_rule', '原格式')
+        )
+
+    def process(self, input_path, output_path):
+        """
+        Run one image through the pipeline and write it to ``output_path``.
+
+        Raises:
+            Exception: Whatever decoding, processing or saving raised
+        """
+        ext = os.path.splitext(output_path)[1].lower()
+        # decode
+        with Image.open(input_path) as image:
+            exif = image.info.get('exif')
+            orientation = 1
+            if STAGE_ORIENT in self.stages:
+                orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            source_size = image.size[::-1] if orientation in TRANSPOSED_ORIENTATIONS else image.size
+
+            # A JPEG that shrinks at least twofold is decoded at a reduced scale
+            new_size = None
+            if STAGE_RESIZE in self.stages:
+                new_size = self.image_processor.get_resize_size(source_size, self.resize_option, self.resize_value)
+            if new_size and image.format == 'JPEG' and orientation not in TRANSPOSED_ORIENTATIONS:
+                image.draft(image.mode, new_size)
+
+            # orient
+            if orientation != 1:
+                image = ImageOps.exif_transpose(image)
+                exif = image.info.get('exif', exif)
+
+            # mode-convert: one conversion serves both the watermark and the output format
+            working_mode = image.mode
+            if self.watermark_settings is not None:
+                working_mode = watermark_canvas_mode(image, self._watermark_fill)
+            final_mode = output_mode(working_mode, ext)
+            if not _has_alpha(working_mode) or _has_alpha(final_mode):
+                working_mode = final_mode
+            if working_mode != image.mode and image.mode in UNFILTERED_MODES:
+                image = image.convert(working_mode)
+
+            # resize (from the original size, even if the JPEG was decoded smaller)
+            if new_size:
+                image = self.image_processor.resize_image(
+                    image, self.resize_option, self.resize_value, *source_size)
+            if working_mode != image.mode:
+                image = image.convert(working_mode)
+
+            # watermark (at output resolution, pixel sizes scaled with the image)
+            if self._watermark is not None:
+                image, _ = self._watermark.apply(image, in_place=True, scale=image.size[0] / source_size[0])
+
+            # 只有需要保留透明度混合水印时才会第二次转换
+            if output_mode(image.mode, ext) != image.mode:
+                image = image.convert(output_mode(image.mode, ext))
+
+            # invisible-watermark (on the pixels that are encoded)
+            if self._invisible is not None:
+                image = self._invisible.embed(image, self.invisible_payload, in_place=True)
+
+            # encode + write
+            self._save(image, output_path, ext, exif)
+
+    def _save(self, image, output_path, ext, exif):
+        """按输出格式编码并直接写入文件"""
+        exif = exif or b''
+        if ext in JPEG_EXTENSIONS:
+            # 对于JPEG格式，使用用户设置的质量
+            image.save(output_path, "JPEG", quality=self.quality, exif=exif)
+        elif ext == '.png':
+            image.save(output_path, "PNG", exif=exif)
+        else:
+            # 对于其他格式，按原样保存
+            image.save(output_path, exif=exif)
+
+    def plan(self, input_paths, output_dir=''):
+        """
+        Plan the export of a batch without exporting anything.
+
+        Only the image headers are read, so the plan can be shown before the
+        export starts and then passed to ``run``.
+
+        Returns:
+            BatchPlan: Groups, estimated cost and dispatch order
+        """
+        from photowatermark.models.batch_planner import plan_batch
+        return plan_batch(self, input_paths, output_dir, self.workers)
+
+    def _export(self, input_path, output_dir):
+        """导出一张图片，失败时报告并返回False"""
+        try:
+            self.process(input_path, self.output_path(input_path, output_dir))
+            return True
+        except Exception as e:
+            print(f"导出文件失败 {input_path}: {str(e)}")
+            return False
+
+    def run(self, input_paths, output_dir, plan=None):
+        """
+        Export images into ``output_dir``.
+
+        Images are exported in the planned order: group by group, or with
+        several workers largest first. A failing image is reported and
+        skipped; the rest of the batch continues.
+
+        Args:
+            input_paths (list): Image paths
+            output_dir (str): Output directory
+            plan (BatchPlan): Plan of the same paths from ``plan``, or None
+                to plan the batch now
+
+        Returns:
+            int: Number of images exported successfully
+        """
+        if plan is None:
+            plan = self.plan(input_paths, output_dir)
+        # 一个任务中的图片（写入同一个文件）依次导出
+        export_task = lambda task: sum(self._export(image.path, output_dir) for image in task)
+        if not plan.parallel:
+            return sum(export_task(task) for task in plan.tasks)
+        # 任务按计划的顺序提交，空闲的线程依次取下一个任务
+        with ThreadPoolExecutor(max_workers=plan.workers) as executor:
+            return sum(executor.map(export_task, plan.tasks))
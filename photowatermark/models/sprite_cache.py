@@ -0,0 +1,88 @@
+"""
+Rendered-watermark sprite cache for the PhotoWatermark-AI4SE application.
+
+Every image of a batch gets the same text, font, size, colour and opacity,
+so the rasterized watermark sprite can be reused and only blended per image.
+The live preview shares the cache, so dragging the watermark around does not
+rasterize the text again.
+"""
+from collections import OrderedDict
+import threading
+
+
+DEFAULT_SPRITE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class SpriteCache:
+    """
+    LRU cache of rendered RGBA sprites bounded by their total pixel memory.
+
+    Sprites are keyed by the full visual settings that affect their pixels
+    and must be treated as read-only by callers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SPRITE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self._sprites = OrderedDict()  # key -> (sprite, offset, nbytes)
+        self._lock = threading.Lock()
+
+    def get_sprite(self, key, render):
+        """
+        Return the cached sprite for ``key``, calling ``render()`` on a miss.
+
+        Args:
+            key: Hashable description of everything that affects the pixels
+            render (callable): Returns (sprite, (offset_x, offset_y)); the
+                sprite is a PIL image or an object with ``size`` and ``nbytes``
+
+        Returns:
+            tuple: (sprite, (offset_x, offset_y))
+        """
+        with self._lock:
+            entry = self._sprites.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._sprites.move_to_end(key)
+                return entry[0], entry[1]
+            self.misses += 1
+
+        sprite, offset = render()
+        nbytes = getattr(sprite, 'nbytes', None)  # 预处理后的精灵图自带大小
+        if nbytes is None:
+            nbytes = sprite.size[0] * sprite.size[1] * len(sprite.getbands())
+        if nbytes > self.max_bytes:
+            # 太大的精灵图不缓存
+            return sprite, offset
+
+        with self._lock:
+            previous = self._sprites.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[2]
+            self._sprites[key] = (sprite, offset, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, evicted_bytes) = self._sprites.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+        return sprite, offset
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._sprites),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._sprites.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,331 @@
+"""
+Text layout for the PhotoWatermark-AI4SE application.
+
+Breaks watermark text into lines (explicit line breaks plus optional wrapping
+to a maximum width), measures it and draws it. Layouts are cached so that a
+batch of same-size images measures the text only once.
+"""
+from collections import OrderedDict
+import math
+import re
+import threading
+
+from PIL import Image, ImageDraw
+
+from photowatermark.utils.constants import DEFAULT_WATERMARK_LINE_SPACING as DEFAULT_LINE_SPACING
+
+DEFAULT_LAYOUT_CACHE_SIZE = 128
+
+# 相对字号取整到的几何档位（相邻档位相差约6%，肉眼难以分辨）
+FONT_SIZE_BUCKET_RATIO = 1.06
+MIN_FONT_SIZE = 6
+
+# 换行时的断点：空白、单个CJK字符或其他连续字符
+_CJK_RANGES = r'\u2e80-\u9fff\uf900-\ufaff\uff00-\uffef'
+_WRAP_TOKEN_RE = re.compile(r'\s+|[' + _CJK_RANGES + r']|[^\s' + _CJK_RANGES + r']+')
+
+# 文字精灵图四周留出的透明边距，防止亚像素位置的字形被裁掉
+SPRITE_PADDING = 1
+
+# 只用于测量文本的绘图对象（RGBA图层的字体模式为 "L"）
+_measure_draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+def _runs_length(runs):
+    """文本片段的总前进宽度"""
+    return sum(run_font.getlength(segment) for segment, run_font in runs)
+
+
+class TextLayout:
+    """
+    Measured lines of watermark text.
+
+    ``width`` and ``height`` are the size of the text block. A single line
+    rendered with a single font keeps the exact measurement and drawing of
+    ``draw.textbbox``/``draw.text``.
+    """
+
+    def __init__(self, text, lines, width, height, ascent=0, line_height=0,
+                 spacing=DEFAULT_LINE_SPACING, align="left", font=None):
+        self.text = text
+        self.lines = lines  # [(runs, advance width), ...]
+        self.width = width
+        self.height = height
+        self.ascent = ascent
+        self.line_height = line_height
+        self.spacing = spacing
+        self.align = align
+        self.font = font
+        self.cache_key = None
+        self._ink_bbox = None
+
+    @property
+    def is_simple(self):
+        """单行且只用一种字体"""
+        return len(self.lines) == 1 and len(self.lines[0][0]) == 1
+
+    def _line_origins(self):
+        """依次返回每一行的 (片段, 行首x, 基线y)，坐标相对文本块原点"""
+        for line_number, (runs, line_width) in enumerate(self.lines):
+            if self.align == "center":
+                pen = (self.width - line_width) / 2
+            elif self.align == "right":
+                pen = self.width - line_width
+            else:
+                pen = 0
+            yield runs, pen, self.ascent + line_number * (self.line_height + self.spacing)
+
+    def draw(self, draw, xy, fill, stroke_width=0):
+        """在 xy（文本块左上角）绘制文本，stroke_width 为字形向外加粗的像素数"""
+        x, y = xy
+        stroke = {'stroke_width': stroke_width} if stroke_width else {}
+        if self.is_simple:
+            draw.text((x, y), self.text, fill=fill, font=self.font, **stroke)
+            return
+
+        for runs, pen, baseline in self._line_origins():
+            for segment, run_font in runs:
+                draw.text((x + pen, y + baseline), segment, fill=fill, font=run_font, anchor='ls', **stroke)
+                pen += run_font.getlength(segment)
+
+    def ink_bbox(self):
+        """
+        Get the integer box covering every pixel the text draws, relative to
+        the text block origin.
+
+        Returns:
+            tuple: (left, top, right, bottom)
+        """
+        if self._ink_bbox is None:
+            if self.is_simple:
+                left, top, right, bottom = _measure_draw.textbbox((0, 0), self.text, font=self.font)
+            else:
+                left = top = math.inf
+                right = bottom = -math.inf
+                for runs, pen, baseline in self._line_origins():
+                    for segment, run_font in runs:
+                        l, t, r, b = run_font.getbbox(segment, anchor='ls')
+                        left = min(left, pen + l)
+                        top = min(top, baseline + t)
+                        right = max(right, pen + r)
+                        bottom = max(bottom, baseline + b)
+                        pen += run_font.getlength(segment)
+                if left == math.inf:
+                    left = top = right = bottom = 0
+            self._ink_bbox = (
+                math.floor(left) - SPRITE_PADDING,
+                math.floor(top) - SPRITE_PADDING,
+                math.ceil(right) + SPRITE_PADDING,
+                math.ceil(bottom) + SPRITE_PADDING
+            )
+        return self._ink_bbox
+
+    def render(self, fill):
+        """
+        Render the text into a sprite just large enough to hold it.
+
+        The sprite does not depend on where the text is placed: drawing it
+        with its top-left corner at ``(x + offset_x, y + offset_y)`` gives the
+        same pixels as drawing the text at ``(x, y)`` on a full-size layer.
+
+        Returns:
+            tuple: (RGBA sprite, (offset_x, offset_y))
+        """
+        left, top, right, bottom = self.ink_bbox()
+        sprite = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (255, 255, 255, 0))
+        self.draw(ImageDraw.Draw(sprite), (-left, -top), fill)
+        return sprite, (left, top)
+
+
+def _split_overlong(line, max_width, measure, lines):
+    """把宽度超出限制的片段按字符拆开，返回剩余部分"""
+    while len(line) > 1 and measure(line) > max_width:
+        split = len(line) - 1
+        while split > 1 and measure(line[:split]) > max_width:
+            split -= 1
+        lines.append(line[:split])
+        line = line[split:]
+    return line
+
+
+def wrap_text(text, max_width, measure):
+    """
+    Greedily wrap a paragraph so that each line fits in ``max_width``.
+
+    Args:
+        text (str): A single paragraph (no line breaks)
+        max_width (float): Maximum line width in pixels
+        measure (callable): Returns the width of a string in pixels
+
+    Returns:
+        list: Wrapped lines
+    """
+    lines = []
+    line = ''
+    for token in _WRAP_TOKEN_RE.findall(text):
+        if line.strip() and measure(line + token) > max_width:
+            lines.append(line.rstrip())
+            line = '' if token.isspace() else token
+        else:
+            line += token
+        line = _split_overlong(line, max_width, measure, lines)
+    lines.append(line.rstrip())
+    return lines
+
+
+def layout_text(text, font, load_runs, max_width=None, spacing=DEFAULT_LINE_SPACING, align="left"):
+    """
+    Break text into lines and measure them.
+
+    Args:
+        text (str): Watermark text, may contain line breaks
+        font: Primary loaded font
+        load_runs (callable): Splits a string into (segment, font) runs
+        max_width (int): Wrap lines longer than this many pixels, or None
+        spacing (int): Extra pixels between lines
+        align (str): One of WATERMARK_ALIGNMENTS
+
+    Returns:
+        TextLayout: The measured layout
+    """
+    paragraphs = text.split('\n')
+    if max_width and hasattr(font, 'getlength'):
+        lines = []
+        measure = lambda line: _runs_length(load_runs(line))
+        for paragraph in paragraphs:
+            lines.extend(wrap_text(paragraph, max_width, measure))
+    else:
+        lines = paragraphs
+
+    if len(lines) == 1:
+        runs = load_runs(lines[0])
+        if len(runs) == 1:
+            width, height = _measure_simple(lines[0], font)
+            return TextLayout(lines[0], [(runs, width)], width, height, spacing=spacing, align=align, font=font)
+
+    # 多行或多字体：以主字体的上沿为原点，沿基线排版
+    ascent, descent = font.getmetrics()
+    line_height = ascent + descent
+    laid_out = []
+    if len(lines) == 1:
+        runs = load_runs(lines[0])
+        width, height = _measure_runs(runs)
+        laid_out.append((runs, width))
+    else:
+        for line in lines:
+            runs = load_runs(line)
+            laid_out.append((runs, _runs_length(runs)))
+        width = int(max(line_width for _, line_width in laid_out))
+        height = len(lines) * line_height + (len(lines) - 1) * spacing
+    return TextLayout(text, laid_out, width, height, ascent, line_height, spacing, align, font)
+
+
+def _measure_simple(text, font):
+    """单行单字体的测量方式，与原先 draw.textbbox 的结果一致"""
+    if font is None:
+        return 0, 0
+    try:
+        # For Pillow >= 10.0.0
+        bbox = _measure_draw.textbbox((0, 0), text, font=font)
+        return bbox[2] - bbox[0], bbox[3] - bbox[1]
+    except AttributeError:
+        # For older versions of Pillow
+        return _measure_draw.textsize(text, font=font)
+
+
+def _measure_runs(runs):
+    """测量由多种字体组成的单行文本"""
+    left = top = bottom = None
+    pen = 0
+    right = 0
+    for segment, run_font in runs:
+        l, t, r, b = run_font.getbbox(segment, anchor='ls')
+        if left is None:
+            left = pen + l
+        top = t if top is None else min(top, t)
+        bottom = b if bottom is None else max(bottom, b)
+        right = pen + r
+        pen += run_font.getlength(segment)
+    return int(right - left), int(bottom - top)
+
+
+def quantize_font_size(size):
+    """
+    Round a font size to the nearest size bucket.
+    
+    Buckets grow geometrically, so a batch of different resolutions only
+    needs a handful of fonts, layouts and sprites.
+    """
+    if size <= MIN_FONT_SIZE:
+        return MIN_FONT_SIZE
+    step = round(math.log(size) / math.log(FONT_SIZE_BUCKET_RATIO))
+    return max(MIN_FONT_SIZE, int(round(FONT_SIZE_BUCKET_RATIO ** step)))
+
+
+def relative_font_size(image_size, percent):
+    """
+    Get the bucketed font size for a percentage of the image's short edge.
+    
+    Args:
+        image_size (tuple): (width, height) of the image
+        percent (float): Font size as a percentage of the short edge
+        
+    Returns:
+        int: Font size in pixels
+    """
+    return quantize_font_size(min(image_size) * percent / 100)
+
+
+def font_cache_key(font):
+    """字体在布局缓存键中的标识"""
+    path = getattr(font, 'path', None)
+    if path is None:
+        return ('<font>', id(font))
+    return (path, getattr(font, 'index', 0), getattr(font, 'size', None), getattr(font, 'layout_engine', None))
+
+
+class LayoutCache:
+    """
+    Bounded LRU cache of text layouts keyed by (text, font, size, max width,
+    spacing, alignment).
+    """
+
+    def __init__(self, max_size=DEFAULT_LAYOUT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_layout(self, text, font, load_runs, max_width=None, spacing=DEFAULT_LINE_SPACING, align="left",
+                   style=None):
+        """返回缓存的布局，未命中时排版并缓存"""
+        key = (text, font_cache_key(font), max_width, spacing, align, style)
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self.hits += 1
+                self._layouts.move_to_end(key)
+                return layout
+            self.misses += 1
+
+        layout = layout_text(text, font, load_runs, max_width=max_width, spacing=spacing, align=align)
+        # 渲染缓存（如精灵图缓存）可以用这个键识别布局
+        layout.cache_key = key
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > self.max_size:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._layouts), 'max_size': self.max_size}
+
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._layouts.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,133 @@
+"""
+Tiled (repeating) watermarks for the PhotoWatermark-AI4SE application.
+
+The rotated watermark tile is rendered once, repeated into a row strip a few
+periods wide, and the strip is blended row by row across the image. Nothing
+is ever as large as the image itself: the strip width is capped, so memory
+stays bounded even for very large images.
+"""
+import math
+
+from PIL import Image
+
+from photowatermark.utils.constants import DEFAULT_WATERMARK_TILE_STAGGER as DEFAULT_TILE_STAGGER
+
+# 行条带的最大宽度（像素），更宽的图片会在同一行重复混合条带
+TILE_STRIP_MAX_WIDTH = 4096
+
+try:
+    _BICUBIC = Image.Resampling.BICUBIC
+except AttributeError:
+    # 对于旧版本的PIL
+    _BICUBIC = Image.BICUBIC
+
+
+def rotate_sprite(sprite, angle):
+    """
+    Rotate a sprite counter-clockwise about its centre, growing it so that
+    nothing is cut off.
+    """
+    if not angle % 360:
+        return sprite
+    return sprite.rotate(angle, resample=_BICUBIC, expand=True)
+
+
+def rotated_placement(box_size, sprite_size, offset, angle, rotated_sprite_size):
+    """
+    Get the bounding box of a rotated watermark and where its rotated sprite
+    goes inside that box.
+
+    The watermark box (text block or logo) is rotated about its centre, like
+    the sprite is by :func:`rotate_sprite`, so the nine-grid positions can be
+    computed from the rotated box.
+
+    Args:
+        box_size (tuple): (width, height) of the unrotated watermark box
+        sprite_size (tuple): (width, height) of the unrotated sprite
+        offset (tuple): Sprite top-left relative to the unrotated box
+        angle (float): Counter-clockwise rotation in degrees
+        rotated_sprite_size (tuple): Size of the sprite after rotate_sprite
+
+    Returns:
+        tuple: ((width, height) of the rotated box, rotated sprite top-left
+        relative to the rotated box)
+    """
+    radians = math.radians(angle)
+    cos, sin = math.cos(radians), math.sin(radians)
+    width, height = box_size
+    box_width = abs(width * cos) + abs(height * sin)
+    box_height = abs(width * sin) + abs(height * cos)
+
+    # 精灵图中心相对水印框中心的位移，随图片一起旋转（y轴向下）
+    dx = offset[0] + sprite_size[0] / 2 - width / 2
+    dy = offset[1] + sprite_size[1] / 2 - height / 2
+    rotated_dx = dx * cos + dy * sin
+    rotated_dy = -dx * sin + dy * cos
+
+    # rotate(expand=True) 保持精灵图中心不变
+    rotated_offset = (
+        int(round(box_width / 2 + rotated_dx - rotated_sprite_size[0] / 2)),
+        int(round(box_height / 2 + rotated_dy - rotated_sprite_size[1] / 2))
+    )
+    return (int(round(box_width)), int(round(box_height))), rotated_offset
+
+
+def tile_period(tile_size, spacing):
+    """相邻水印左上角之间的水平和垂直距离"""
+    return max(1, tile_size[0] + spacing), max(1, tile_size[1] + spacing)
+
+
+def strip_repeats(image_width, period_x):
+    """
+    Number of tiles in a row strip.
+
+    A strip must reach past the right edge of the image from a start up to
+    one period left of it, but is capped at TILE_STRIP_MAX_WIDTH.
+    """
+    needed = math.ceil((image_width + period_x) / period_x)
+    capped = max(1, TILE_STRIP_MAX_WIDTH // period_x)
+    return min(needed, capped)
+
+
+def build_row_strip(tile, period_x, repeats):
+    """把同一个水印按水平周期重复，生成一行条带"""
+    strip = Image.new('RGBA', (period_x * repeats, tile.size[1]), (255, 255, 255, 0))
+    for index in range(repeats):
+        strip.paste(tile, (index * period_x, 0))
+    return strip
+
+
+def strip_positions(image_size, tile_size, period, strip_width, stagger=DEFAULT_TILE_STAGGER):
+    """
+    Get where the row strips go so that one tile sits in the centre of the
+    image and every other row is shifted by ``stagger`` percent of a period.
+
+    Args:
+        image_size (tuple): (width, height) of the image
+        tile_size (tuple): (width, height) of one tile
+        period (tuple): Horizontal and vertical tile period
+        strip_width (int): Width of a row strip, a multiple of the period
+        stagger (int): Row offset as a percentage of the horizontal period
+
+    Returns:
+        list: (x, y) top-left corners for the strip
+    """
+    width, height = image_size
+    tile_width, tile_height = tile_size
+    period_x, period_y = period
+    center_x = (width - tile_width) // 2
+    center_y = (height - tile_height) // 2
+
+    positions = []
+    first_row = -math.ceil((center_y + tile_height) / period_y)
+    last_row = math.ceil((height - center_y) / period_y)
+    for row in range(first_row, last_row + 1):
+        y = center_y + row * period_y
+        if y >= height or y + tile_height <= 0:
+            continue
+        anchor_x = center_x + int(round(row * stagger / 100 * period_x))
+        x = anchor_x % period_x - period_x
+        while x < width:
+            positions.append((x, y))
+            x += strip_width
+    return positions
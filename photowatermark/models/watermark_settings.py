@@ -0,0 +1,455 @@
+"""
+Watermark settings for the PhotoWatermark-AI4SE application.
+
+:class:`WatermarkSettings` is the one place where watermark settings are
+read, validated and given their defaults. An instance is immutable and
+hashable, so the prepared-watermark cache (and any other cache) can key on
+it directly; ``digest()`` is a hash that stays the same across runs, for
+keys that are written to disk.
+
+Settings are built from the ``watermark_*`` keys used by the export
+settings, the saved templates and ``app_state.json`` (``from_export``), or
+from the plain watermark dicts used by ``ImageProcessor`` (``from_dict``).
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+
+from photowatermark.utils.constants import (
+    WATERMARK_POSITIONS,
+    WATERMARK_TILE_POSITION,
+    WATERMARK_AUTO_POSITION,
+    WATERMARK_ALIGNMENTS,
+    WATERMARK_TYPES,
+    WATERMARK_SIZE_ABSOLUTE,
+    WATERMARK_SIZE_RELATIVE,
+    WATERMARK_EFFECTS,
+    WATERMARK_COLOR_MODES,
+    DEFAULT_WATERMARK_SIZE,
+    DEFAULT_WATERMARK_COLOR,
+    DEFAULT_WATERMARK_TRANSPARENCY,
+    DEFAULT_WATERMARK_POSITION,
+    DEFAULT_WATERMARK_ALIGN,
+    DEFAULT_WATERMARK_LINE_SPACING,
+    DEFAULT_WATERMARK_MAX_WIDTH,
+    DEFAULT_WATERMARK_TILE_SPACING,
+    DEFAULT_WATERMARK_TILE_ANGLE,
+    DEFAULT_WATERMARK_TILE_STAGGER,
+    DEFAULT_WATERMARK_TYPE,
+    DEFAULT_WATERMARK_LOGO_SCALE,
+    DEFAULT_WATERMARK_SIZE_MODE,
+    DEFAULT_WATERMARK_RELATIVE_SIZE,
+    DEFAULT_WATERMARK_EFFECT,
+    DEFAULT_WATERMARK_EFFECT_SIZE,
+    DEFAULT_WATERMARK_EFFECT_COLOR,
+    DEFAULT_WATERMARK_ROTATION,
+    DEFAULT_WATERMARK_COLOR_MODE
+)
+
+# 自定义位置（custom_x/custom_y 为图片宽高的百分比）
+WATERMARK_CUSTOM_POSITION = 'custom'
+VALID_POSITIONS = tuple(WATERMARK_POSITIONS) + (WATERMARK_CUSTOM_POSITION, WATERMARK_TILE_POSITION,
+                                                WATERMARK_AUTO_POSITION)
+
+DEFAULT_WATERMARK_TEXT = 'Sample Text'
+DEFAULT_WATERMARK_FONT_NAME = 'Arial'
+
+DEFAULT_PREPARED_CACHE_SIZE = 16
+
+# 字段名、默认值（按字段顺序计算哈希）
+_FIELDS = (
+    ('text', DEFAULT_WATERMARK_TEXT),
+    ('transparency', DEFAULT_WATERMARK_TRANSPARENCY),
+    ('position', DEFAULT_WATERMARK_POSITION),
+    ('custom_x', None),
+    ('custom_y', None),
+    ('font_size', DEFAULT_WATERMARK_SIZE),
+    ('size_mode', DEFAULT_WATERMARK_SIZE_MODE),
+    ('relative_size', DEFAULT_WATERMARK_RELATIVE_SIZE),
+    ('font_name', DEFAULT_WATERMARK_FONT_NAME),
+    ('bold', False),
+    ('italic', False),
+    ('align', DEFAULT_WATERMARK_ALIGN),
+    ('line_spacing', DEFAULT_WATERMARK_LINE_SPACING),
+    ('max_width_ratio', None),
+    ('tile_spacing', DEFAULT_WATERMARK_TILE_SPACING),
+    ('tile_angle', DEFAULT_WATERMARK_TILE_ANGLE),
+    ('tile_stagger', DEFAULT_WATERMARK_TILE_STAGGER),
+    ('rotation', DEFAULT_WATERMARK_ROTATION),
+    ('type', DEFAULT_WATERMARK_TYPE),
+    ('logo_path', ''),
+    ('logo_scale', DEFAULT_WATERMARK_LOGO_SCALE),
+    ('effect', DEFAULT_WATERMARK_EFFECT),
+    ('effect_size', DEFAULT_WATERMARK_EFFECT_SIZE),
+    ('effect_color', DEFAULT_WATERMARK_EFFECT_COLOR),
+    ('color', DEFAULT_WATERMARK_COLOR),
+    ('color_mode', DEFAULT_WATERMARK_COLOR_MODE),
+    ('scale', 1),
+    ('layers', ())
+)
+FIELD_NAMES = tuple(name for name, _ in _FIELDS)
+_DEFAULTS = dict(_FIELDS)
+
+# 导出设置、模板和 app_state.json 中的键 -> 字段
+_EXPORT_KEYS = {
+    'watermark_text': 'text',
+    'watermark_transparency': 'transparency',
+    'watermark_position': 'position',
+    'watermark_font_size': 'font_size',
+    'watermark_size_mode': 'size_mode',
+    'watermark_relative_size': 'relative_size',
+    'watermark_font_name': 'font_name',
+    'watermark_bold': 'bold',
+    'watermark_italic': 'italic',
+    'watermark_align': 'align',
+    'watermark_line_spacing': 'line_spacing',
+    'watermark_tile_spacing': 'tile_spacing',
+    'watermark_tile_angle': 'tile_angle',
+    'watermark_tile_stagger': 'tile_stagger',
+    'watermark_rotation': 'rotation',
+    'watermark_type': 'type',
+    'watermark_logo_path': 'logo_path',
+    'watermark_logo_scale': 'logo_scale',
+    'watermark_effect': 'effect',
+    'watermark_effect_size': 'effect_size',
+    'watermark_effect_color': 'effect_color',
+    'watermark_color': 'color',
+    'watermark_color_mode': 'color_mode'
+}
+# 自定义坐标：导出设置用 watermark_custom_*，模板和 app_state.json 用 custom_watermark_*
+_CUSTOM_KEYS = (('watermark_custom_x', 'watermark_custom_y'), ('custom_watermark_x', 'custom_watermark_y'))
+
+
+def _number(name, value, minimum=None, maximum=None, integer=False):
+    """检查数值字段并统一类型（整数字段为int，其余为float）"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"水印设置 {name} 必须是数字: {value!r}")
+    if value != value or value in (float('inf'), float('-inf')):
+        raise ValueError(f"水印设置 {name} 必须是有限的数字: {value!r}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"水印设置 {name} 不能小于 {minimum}: {value!r}")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"水印设置 {name} 不能大于 {maximum}: {value!r}")
+    if integer:
+        return int(round(value))
+    # 整数值的浮点数和整数相等，统一为float后哈希和摘要都一致
+    return float(value)
+
+
+def _choice(name, value, choices):
+    """检查取值是否为可选项之一"""
+    if value not in choices:
+        raise ValueError(f"水印设置 {name} 无效: {value!r}，可选 {', '.join(map(str, choices))}")
+    return value
+
+
+def _color(name, value):
+    """检查RGB颜色（JSON中保存为列表）"""
+    try:
+        color = tuple(int(channel) for channel in value)
+    except (TypeError, ValueError):
+        raise ValueError(f"水印设置 {name} 必须是RGB颜色: {value!r}")
+    if len(color) != 3 or not all(0 <= channel <= 255 for channel in color):
+        raise ValueError(f"水印设置 {name} 必须是三个0-255的整数: {value!r}")
+    return color
+
+
+class WatermarkSettings:
+    """
+    Immutable, validated settings of one watermark.
+
+    Two instances with the same values are equal and hash the same, so they
+    can key any cache. ``layers`` holds the settings of the layers drawn
+    under this watermark, bottom first.
+
+    For code written against the old settings dicts, ``get``, ``in``,
+    ``[]`` and ``keys`` (so also ``dict(settings)``) read the fields; a field
+    set to None (no custom coordinates, no wrap width) is reported as missing.
+    """
+
+    __slots__ = FIELD_NAMES + ('_hash',)
+
+    def __init__(self, **fields):
+        """
+        Args:
+            **fields: Any of ``FIELD_NAMES``; missing fields take their defaults
+
+        Raises:
+            ValueError: If a field is unknown or has an invalid value
+        """
+        unknown = set(fields) - set(FIELD_NAMES)
+        if unknown:
+            raise ValueError(f"未知的水印设置: {', '.join(sorted(unknown))}")
+        values = dict(_DEFAULTS, **fields)
+
+        set_field = lambda name, value: object.__setattr__(self, name, value)
+        set_field('text', str(values['text']))
+        set_field('transparency', _number('transparency', values['transparency'], 0, 100))
+        set_field('position', _choice('position', values['position'], VALID_POSITIONS))
+        for name in ('custom_x', 'custom_y'):
+            value = values[name]
+            set_field(name, None if value is None else _number(name, value))
+        set_field('font_size', _number('font_size', values['font_size'], 1, integer=True))
+        set_field('size_mode', _choice('size_mode', values['size_mode'],
+                                       (WATERMARK_SIZE_ABSOLUTE, WATERMARK_SIZE_RELATIVE)))
+        set_field('relative_size', _number('relative_size', values['relative_size'], 0))
+        set_field('font_name', str(values['font_name']))
+        set_field('bold', bool(values['bold']))
+        set_field('italic', bool(values['italic']))
+        set_field('align', _choice('align', values['align'], WATERMARK_ALIGNMENTS))
+        set_field('line_spacing', _number('line_spacing', values['line_spacing'], integer=True))
+        # 0 和 None 都表示不自动换行
+        max_width_ratio = values['max_width_ratio']
+        if max_width_ratio:
+            max_width_ratio = _number('max_width_ratio', max_width_ratio, 0)
+        set_field('max_width_ratio', max_width_ratio or None)
+        set_field('tile_spacing', _number('tile_spacing', values['tile_spacing'], 0, integer=True))
+        set_field('tile_angle', _number('tile_angle', values['tile_angle']))
+        set_field('tile_stagger', _number('tile_stagger', values['tile_stagger'], 0, 100, integer=True))
+        set_field('rotation', _number('rotation', values['rotation']))
+        set_field('type', _choice('type', values['type'], WATERMARK_TYPES))
+        set_field('logo_path', str(values['logo_path'] or ''))
+        set_field('logo_scale', _number('logo_scale', values['logo_scale'], 0))
+        set_field('effect', _choice('effect', values['effect'], WATERMARK_EFFECTS))
+        set_field('effect_size', _number('effect_size', values['effect_size'], 0, integer=True))
+        set_field('effect_color', _color('effect_color', values['effect_color']))
+        set_field('color', _color('color', values['color']))
+        set_field('color_mode', _choice('color_mode', values['color_mode'], WATERMARK_COLOR_MODES))
+        set_field('scale', _number('scale', values['scale'], 0))
+        set_field('layers', tuple(WatermarkSettings.coerce(layer).replace(layers=())
+                                  for layer in values['layers'] or ()))
+        set_field('_hash', hash(self._values()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("WatermarkSettings is immutable, use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("WatermarkSettings is immutable")
+
+    def __reduce__(self):
+        # __slots__ 且不可修改：按字段重新构造（进程池和 copy 都会用到）
+        return _from_fields, (self.to_dict(),)
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in FIELD_NAMES)
+
+    def __eq__(self, other):
+        if not isinstance(other, WatermarkSettings):
+            return NotImplemented
+        return self._hash == other._hash and self._values() == other._values()
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        changed = ', '.join(f"{name}={getattr(self, name)!r}" for name in FIELD_NAMES
+                            if getattr(self, name) != _DEFAULTS[name])
+        return f"WatermarkSettings({changed})"
+
+    # 只读的字典接口（兼容按字典读取设置的代码）
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in FIELD_NAMES else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in FIELD_NAMES and getattr(self, key) is not None
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self):
+        return [name for name in FIELD_NAMES if getattr(self, name) is not None]
+
+    def replace(self, **changes):
+        """返回修改了部分字段的新设置"""
+        fields = {name: getattr(self, name) for name in FIELD_NAMES}
+        fields.update(changes)
+        return WatermarkSettings(**fields)
+
+    def to_dict(self):
+        """
+        Get the settings as a plain watermark settings dict.
+
+        Returns:
+            dict: Every field, with layers as a list of dicts
+        """
+        fields = {name: getattr(self, name) for name in FIELD_NAMES}
+        fields['layers'] = [layer.to_dict() for layer in self.layers]
+        return fields
+
+    def digest(self):
+        """
+        Get a hash of the settings that is the same in every run.
+
+        ``hash()`` of strings changes between processes, so keys written to
+        disk (for example to skip unchanged files of an incremental export)
+        use this instead.
+
+        Returns:
+            str: Hex SHA-1 of the canonical JSON form
+        """
+        canonical = json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def coerce(cls, settings):
+        """把设置字典（或已有的设置对象）转换为 WatermarkSettings"""
+        if isinstance(settings, cls):
+            return settings
+        return cls.from_dict(settings)
+
+    @classmethod
+    def from_dict(cls, settings):
+        """
+        Build settings from a watermark settings dict (``ImageProcessor`` keys).
+
+        Unknown keys are ignored, so dicts carrying extra entries still work.
+
+        Raises:
+            ValueError: If a value is invalid
+        """
+        return cls(**{name: value for name, value in settings.items() if name in _DEFAULTS})
+
+    @classmethod
+    def from_export(cls, settings):
+        """
+        Build settings from ``watermark_*`` keys.
+
+        Export settings, saved templates and ``app_state.json`` all use these
+        keys; ``watermark_max_width`` is a percentage of the image width and
+        ``watermark_layers`` a list of layers with the same keys. Whether the
+        watermark is enabled is not part of the settings.
+
+        Raises:
+            ValueError: If a value is invalid
+        """
+        fields = {field: settings[key] for key, field in _EXPORT_KEYS.items()
+                  if key in settings and settings[key] is not None}
+        fields['max_width_ratio'] = (settings.get('watermark_max_width') or DEFAULT_WATERMARK_MAX_WIDTH) / 100
+
+        # 只有自定义位置才使用坐标
+        if fields.get('position') == WATERMARK_CUSTOM_POSITION:
+            for key_x, key_y in _CUSTOM_KEYS:
+                if settings.get(key_x) is not None and settings.get(key_y) is not None:
+                    fields['custom_x'], fields['custom_y'] = settings[key_x], settings[key_y]
+                    break
+
+        fields['layers'] = layer_settings_from_export(settings.get('watermark_layers'))
+        return cls(**fields)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Read the watermark settings from a saved template or ``app_state.json``.
+
+        Returns:
+            WatermarkSettings: The settings, whether or not the watermark is enabled
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If it is not valid JSON or holds invalid settings
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"不是水印配置文件: {path}")
+        return cls.from_export(data)
+
+
+def _from_fields(fields):
+    """反序列化时按字段构造设置"""
+    return WatermarkSettings(**fields)
+
+
+def layer_settings_from_export(layers):
+    """
+    Convert the ``watermark_layers`` list of a template into settings.
+
+    Each layer uses the same ``watermark_*`` keys as the export settings and
+    is enabled unless it sets ``watermark_enabled`` to false. Layers are
+    listed bottom first; a layer cannot have layers of its own.
+
+    Returns:
+        tuple: WatermarkSettings of the enabled layers
+    """
+    converted = []
+    for layer in layers or []:
+        if not isinstance(layer, dict) or not layer.get('watermark_enabled', True):
+            continue
+        converted.append(WatermarkSettings.from_export(dict(layer, watermark_layers=None)))
+    return tuple(converted)
+
+
+class PreparedWatermarkCache:
+    """
+    Bounded LRU cache of prepared watermarks keyed by WatermarkSettings.
+
+    The preview prepares the watermark on every redraw and each export
+    prepares it once; with equal settings they share the prepared font,
+    layouts and size variants.
+    """
+
+    def __init__(self, max_size=DEFAULT_PREPARED_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._prepared = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_prepared(self, key, prepare, is_current=None):
+        """
+        Return the prepared watermark for ``key``, calling ``prepare()`` on a miss.
+
+        Args:
+            key: WatermarkSettings, or a tuple holding them and whatever else
+                the prepared watermark depends on
+            prepare (callable): Returns (prepared watermark, whether it may be cached)
+            is_current (callable): Called with a cached entry; returning False
+                prepares it again (for example after the logo file changed)
+        """
+        with self._lock:
+            cached = self._prepared.get(key)
+
+        # 检查缓存项是否仍然有效（Logo水印会读取文件状态），不持有锁以免阻塞其他线程
+        if cached is not None and (is_current is None or is_current(cached)):
+            with self._lock:
+                self.hits += 1
+                if self._prepared.get(key) is cached:
+                    self._prepared.move_to_end(key)
+            return cached
+
+        with self._lock:
+            self.misses += 1
+        prepared, cacheable = prepare()
+        with self._lock:
+            current = self._prepared.get(key)
+            if current is not None and current is not cached:
+                # 其他线程已经放入了新准备的水印，共用那一份
+                self._prepared.move_to_end(key)
+                return current
+            if cacheable:
+                self._prepared[key] = prepared
+                self._prepared.move_to_end(key)
+                while len(self._prepared) > self.max_size:
+                    self._prepared.popitem(last=False)
+            elif current is not None:
+                self._prepared.pop(key)
+        return prepared
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._prepared), 'max_size': self.max_size}
+
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._prepared.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,198 @@
+"""
+Layered watermarks for the PhotoWatermark-AI4SE application.
+
+A stack draws several watermarks on one image, for example a subtle tiled
+text, a logo and a signature. Overlapping placed layers are flattened into
+one combined sprite covering their union box, so the affected region is
+blended once instead of once per layer. The combined sprite is kept in the
+shared sprite cache, which makes it a one-off cost per image size. Tiled
+layers cover the whole image and keep their own row-strip pass.
+"""
+from PIL import Image
+
+
+def union_box(placements, image_size):
+    """
+    Get the box covering every placed sprite, clipped to the image.
+
+    Args:
+        placements (list): (sprite, (x, y), sprite key) tuples
+        image_size (tuple): (width, height) of the image
+
+    Returns:
+        tuple: (left, top, right, bottom), or None if nothing is on the image
+    """
+    left = max(0, min(x for _, (x, _y), _ in placements))
+    top = max(0, min(y for _, (_x, y), _ in placements))
+    right = min(image_size[0], max(x + sprite.size[0] for sprite, (x, _y), _ in placements))
+    bottom = min(image_size[1], max(y + sprite.size[1] for sprite, (_x, y), _ in placements))
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+def flatten_placements(placements, box):
+    """
+    Composite placed sprites, bottom first, into one sprite covering ``box``.
+
+    Blending the result gives the same pixels as blending the sprites one
+    after the other, because "over" compositing is associative.
+
+    Returns:
+        Image: RGBA sprite of the size of ``box``
+    """
+    left, top, right, bottom = box
+    combined = Image.new('RGBA', (right - left, bottom - top), (255, 255, 255, 0))
+    for sprite, (x, y), _ in placements:
+        dest_x, dest_y = x - left, y - top
+        # 超出合并区域的部分被裁掉（alpha_composite 不接受负的目标坐标）
+        combined.alpha_composite(sprite, dest=(max(0, dest_x), max(0, dest_y)),
+                                 source=(max(0, -dest_x), max(0, -dest_y)))
+    return combined
+
+
+def _sprite_box(placement):
+    """精灵图在图片上占据的区域"""
+    sprite, (x, y), _ = placement
+    return x, y, x + sprite.size[0], y + sprite.size[1]
+
+
+def _boxes_overlap(box, other):
+    return box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]
+
+
+def overlapping_clusters(group):
+    """
+    Split placed layers into clusters of overlapping sprites.
+
+    Layers that do not overlap can be blended in any order, so only
+    overlapping ones are worth flattening: flattening a corner logo together
+    with a centred text would blend the whole empty area between them.
+
+    Args:
+        group (list): (layer, placement) pairs, bottom first
+
+    Returns:
+        list: Clusters of (layer, placement) pairs, each kept bottom first
+    """
+    clusters = []  # [(union box, [(index, (layer, placement)), ...]), ...]
+    for index, item in enumerate(group):
+        box = _sprite_box(item[1])
+        members = [(index, item)]
+        remaining = []
+        for cluster_box, cluster_members in clusters:
+            if _boxes_overlap(box, cluster_box):
+                # 新图层连接了这个簇，合并为一个簇
+                members.extend(cluster_members)
+                box = (min(box[0], cluster_box[0]), min(box[1], cluster_box[1]),
+                       max(box[2], cluster_box[2]), max(box[3], cluster_box[3]))
+            else:
+                remaining.append((cluster_box, cluster_members))
+        remaining.append((box, members))
+        clusters = remaining
+    return [[item for _, item in sorted(members, key=lambda member: member[0])] for _, members in clusters]
+
+
+class WatermarkStack:
+    """
+    Several prepared watermarks applied to an image as one.
+
+    Layers are listed bottom first. The interface matches
+    ``PreparedWatermark``, so exports and previews use a stack like a single
+    watermark.
+    """
+
+    def __init__(self, processor, layer_settings):
+        self.processor = processor
+        self.layers = [processor.prepare_watermark(settings) for settings in layer_settings]
+        # 未指定输出缩放比例时，使用最上层（主水印）的设置
+        self.scale = self.layers[-1].scale if self.layers else 1
+
+    @property
+    def actual_font_info(self):
+        """最上层（主水印）实际使用的字体"""
+        if not self.layers:
+            return {'bold': False, 'italic': False, 'path': None, 'index': 0}
+        return self.layers[-1].actual_font_info
+
+    @property
+    def canvas_fill(self):
+        """
+        决定画布模式的水印颜色：任何一层是Logo或彩色文字时按彩色处理
+        """
+        fills = [layer.canvas_fill for layer in self.layers]
+        if not fills or None in fills:
+            return None
+        for fill in fills:
+            if not fill[0] == fill[1] == fill[2]:
+                return fill
+        return fills[0]
+
+    def passes(self, image, scale=None):
+        """
+        Group the layers into blending passes for an image.
+
+        Returns:
+            list: (layer, placement) pairs in blending order, where a
+            placement is as returned by ``PreparedWatermark.place``
+        """
+        if scale is None:
+            scale = self.scale
+        image_size = image.size
+        passes = []
+        group = []
+        for layer in self.layers:
+            placement = layer.place(image, scale)
+            if placement is None:
+                continue
+            if placement[1] is None:
+                # Tiled layers cover the whole image and keep their own pass
+                self._flush(group, image_size, passes)
+                group = []
+                passes.append((layer, placement))
+            else:
+                group.append((layer, placement))
+        self._flush(group, image_size, passes)
+        return passes
+
+    def _flush(self, group, image_size, passes):
+        """把一组相邻的定位图层中互相重叠的图层合并为一个精灵图"""
+        for cluster in overlapping_clusters(group):
+            if len(cluster) == 1:
+                passes.append(cluster[0])
+                continue
+            placements = [placement for _, placement in cluster]
+            box = union_box(placements, image_size)
+            if box is None:
+                continue
+
+            sprite_keys = tuple(sprite_key for _, _, sprite_key in placements)
+            render = lambda: (flatten_placements(placements, box), (0, 0))
+            if None in sprite_keys:
+                combined, _ = render()
+                key = None
+            else:
+                # 合并结果取决于每一层的精灵图和位置（即图片尺寸）
+                key = ('stack', tuple((sprite_key, position) for _, position, sprite_key in placements), box)
+                combined, _ = self.processor.sprite_cache.get_sprite(key, render)
+            passes.append((cluster[0][0], (combined, box[:2], key)))
+
+    def apply(self, image, in_place=False, scale=None):
+        """
+        Watermark one image with every layer.
+
+        Args:
+            image: Source image
+            in_place (bool): Blend into ``image`` itself when its mode allows
+            scale (float): Output scale of this image, or None for the
+                ``scale`` in the top layer's settings
+
+        Returns:
+            tuple: (watermarked image, actual font info of the top layer)
+        """
+        if scale is None:
+            scale = self.scale
+        image = self.processor._prepare_canvas(image, self.canvas_fill, in_place)
+        for layer, placement in self.passes(image, scale):
+            image = layer.blend(image, placement, scale)
+        return image, dict(self.actual_font_info)
@@ -30,4 +30,58 @@ NAMING_OPTIONS = ["保留原名", "添加前缀", "添加后缀"]
 FORMAT_OPTIONS = ["原格式", "JPEG", "PNG"]
 
 # 导出尺寸选项
-RESIZE_OPTIONS = ["原图尺寸", "按比例缩放", "指定宽度", "指定高度"]
\ No newline at end of file
+RESIZE_OPTIONS = ["原图尺寸", "按比例缩放", "指定宽度", "指定高度"]
+
+# 多行水印默认值
+WATERMARK_ALIGNMENTS = ["left", "center", "right"]
+DEFAULT_WATERMARK_ALIGN = 'left'
+DEFAULT_WATERMARK_LINE_SPACING = 4
+DEFAULT_WATERMARK_MAX_WIDTH = 0  # 最大宽度占图片宽度的百分比，0 表示不自动换行
+
+# 平铺水印
+WATERMARK_TILE_POSITION = 'tile'
+DEFAULT_WATERMARK_TILE_SPACING = 80  # 相邻水印之间的间距（像素）
+DEFAULT_WATERMARK_TILE_ANGLE = 30  # 旋转角度（度，逆时针）
+DEFAULT_WATERMARK_TILE_STAGGER = 50  # 相邻两行错开的距离占水平周期的百分比
+
+# 水印类型
+WATERMARK_TYPE_TEXT = 'text'
+WATERMARK_TYPE_IMAGE = 'image'
+WATERMARK_TYPES = [WATERMARK_TYPE_TEXT, WATERMARK_TYPE_IMAGE]
+DEFAULT_WATERMARK_TYPE = WATERMARK_TYPE_TEXT
+DEFAULT_WATERMARK_LOGO_SCALE = 20  # Logo宽度占图片宽度的百分比
+
+# 水印字号模式：固定像素或图片短边的百分比
+WATERMARK_SIZE_ABSOLUTE = 'absolute'
+WATERMARK_SIZE_RELATIVE = 'relative'
+DEFAULT_WATERMARK_SIZE_MODE = WATERMARK_SIZE_ABSOLUTE
+DEFAULT_WATERMARK_RELATIVE_SIZE = 3.0  # 字号占图片短边的百分比
+
+# 文字效果（渲染在水印精灵图中，每种设置只渲染一次）
+WATERMARK_EFFECT_NONE = 'none'
+WATERMARK_EFFECT_SHADOW = 'shadow'
+WATERMARK_EFFECT_STROKE = 'stroke'
+WATERMARK_EFFECT_GLOW = 'glow'
+WATERMARK_EFFECTS = [WATERMARK_EFFECT_NONE, WATERMARK_EFFECT_SHADOW, WATERMARK_EFFECT_STROKE, WATERMARK_EFFECT_GLOW]
+DEFAULT_WATERMARK_EFFECT = WATERMARK_EFFECT_NONE
+DEFAULT_WATERMARK_EFFECT_SIZE = 3  # 描边宽度、阴影偏移或发光半径（像素）
+DEFAULT_WATERMARK_EFFECT_COLOR = (0, 0, 0)
+
+# 单个水印的旋转角度（度，逆时针），平铺水印使用平铺角度
+DEFAULT_WATERMARK_ROTATION = 0
+
+# 水印颜色模式：固定颜色，或按放置区域的亮度自动选择浅色/深色（必要时加描边）
+WATERMARK_COLOR_FIXED = 'fixed'
+WATERMARK_COLOR_AUTO = 'auto'
+WATERMARK_COLOR_MODES = [WATERMARK_COLOR_FIXED, WATERMARK_COLOR_AUTO]
+DEFAULT_WATERMARK_COLOR_MODE = WATERMARK_COLOR_FIXED
+
+# 自动位置：按每张图片选择最平坦（边缘最少）的九宫格位置，得分相同时按下面的顺序优先
+WATERMARK_AUTO_POSITION = 'auto'
+WATERMARK_AUTO_POSITION_CANDIDATES = [
+    "bottom-right", "bottom-left", "top-right", "top-left",
+    "bottom-center", "top-center", "middle-right", "middle-left", "center"
+]
+
+# 导出线程数：1 为按尺寸分组依次导出，大于1时并行导出（最大的图片先导出）
+DEFAULT_EXPORT_WORKERS = 1
\ No newline at end of file
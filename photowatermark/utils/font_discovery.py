@@ -0,0 +1,194 @@
+"""
+Native font file discovery for the PhotoWatermark-AI4SE application.
+
+Walks the standard platform font directories (plus the directories configured
+for fontconfig on Linux) with ``os.scandir``, so that listing fonts does not
+need matplotlib.
+"""
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+
+# 支持的字体文件扩展名
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+
+# fontconfig 主配置文件
+FONTCONFIG_FILES = ('/etc/fonts/fonts.conf', '/usr/local/etc/fonts/fonts.conf')
+
+
+def _xdg_data_home():
+    return os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser("~"), ".local", "share")
+
+
+def get_platform_font_directories():
+    """
+    Get the standard font directories of the current platform.
+
+    Returns:
+        list: Directory paths (not all of them necessarily exist)
+    """
+    home = os.path.expanduser("~")
+    if sys.platform == 'win32':
+        windir = os.environ.get('WINDIR', r'C:\Windows')
+        directories = [os.path.join(windir, 'Fonts')]
+        local_app_data = os.environ.get('LOCALAPPDATA')
+        if local_app_data:
+            directories.append(os.path.join(local_app_data, 'Microsoft', 'Windows', 'Fonts'))
+        return directories
+    if sys.platform == 'darwin':
+        return [
+            '/System/Library/Fonts',
+            '/Library/Fonts',
+            '/Network/Library/Fonts',
+            os.path.join(home, 'Library', 'Fonts')
+        ]
+    return [
+        '/usr/share/fonts',
+        '/usr/local/share/fonts',
+        '/usr/X11R6/lib/X11/fonts',
+        os.path.join(home, '.fonts'),
+        os.path.join(_xdg_data_home(), 'fonts')
+    ]
+
+
+def _resolve_config_path(text, prefix, config_dir):
+    """按照fontconfig的规则解析 <dir>/<include> 中的路径"""
+    text = text.strip()
+    if prefix == 'xdg':
+        return os.path.join(_xdg_data_home(), text)
+    if text.startswith('~'):
+        return os.path.expanduser(text)
+    if prefix == 'relative' or not os.path.isabs(text):
+        return os.path.join(config_dir, text)
+    return text
+
+
+def _read_fontconfig_file(config_path, directories, visited):
+    """读取一个fontconfig配置文件，收集 <dir> 并跟随 <include>"""
+    real_path = os.path.realpath(config_path)
+    if real_path in visited:
+        return
+    visited.add(real_path)
+
+    if os.path.isdir(config_path):
+        try:
+            names = sorted(os.listdir(config_path))
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.conf'):
+                _read_fontconfig_file(os.path.join(config_path, name), directories, visited)
+        return
+
+    try:
+        root = ET.parse(config_path).getroot()
+    except (OSError, ET.ParseError):
+        return
+
+    config_dir = os.path.dirname(config_path)
+    for element in root:
+        if not element.text:
+            continue
+        if element.tag == 'dir':
+            directories.append(_resolve_config_path(element.text, element.get('prefix'), config_dir))
+        elif element.tag == 'include':
+            include_path = _resolve_config_path(element.text, element.get('prefix'), config_dir)
+            _read_fontconfig_file(include_path, directories, visited)
+
+
+def get_fontconfig_directories():
+    """
+    Get the font directories configured for fontconfig (Linux and other
+    fontconfig-based systems).
+
+    Returns:
+        list: Directory paths in configuration order
+    """
+    directories = []
+    visited = set()
+    for config_path in FONTCONFIG_FILES:
+        if os.path.exists(config_path):
+            _read_fontconfig_file(config_path, directories, visited)
+    return directories
+
+
+def get_font_directories():
+    """
+    Get every directory that should be scanned for fonts, without duplicates.
+
+    Returns:
+        list: Existing directory paths
+    """
+    directories = get_platform_font_directories()
+    if sys.platform not in ('win32', 'darwin'):
+        directories += get_fontconfig_directories()
+
+    result = []
+    seen = set()
+    for directory in directories:
+        real_path = os.path.realpath(directory)
+        if real_path not in seen and os.path.isdir(real_path):
+            seen.add(real_path)
+            result.append(directory)
+    return result
+
+
+def _scan_directory(directory, found, visited):
+    """递归扫描目录中的字体文件"""
+    real_path = os.path.realpath(directory)
+    if real_path in visited:
+        return
+    visited.add(real_path)
+
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                _scan_directory(entry.path, found, visited)
+            elif entry.name.lower().endswith(FONT_EXTENSIONS) and entry.is_file():
+                found.setdefault(os.path.realpath(entry.path), entry.path)
+        except OSError:
+            continue
+
+
+def _find_font_files_matplotlib():
+    """使用matplotlib（如果已安装）查找字体文件"""
+    try:
+        import matplotlib.font_manager as fm
+    except ImportError:
+        return []
+    try:
+        return list(fm.findSystemFonts())
+    except Exception:
+        return []
+
+
+def find_font_files(directories=None):
+    """
+    Find all font files in the system font directories.
+
+    Args:
+        directories (list): Directories to scan, defaults to
+            :func:`get_font_directories`
+
+    Returns:
+        list: Font file paths
+    """
+    if directories is None:
+        directories = get_font_directories()
+
+    found = {}
+    visited = set()
+    for directory in directories:
+        _scan_directory(directory, found, visited)
+
+    font_files = list(found.values())
+    if not font_files:
+        # 原生扫描找不到字体时，退回到可选的matplotlib
+        font_files = _find_font_files_matplotlib()
+    return font_files
@@ -0,0 +1,516 @@
+"""
+Persistent system font index for the PhotoWatermark-AI4SE application.
+
+Parsing the name table of every installed font is by far the slowest part of
+font lookup, so the result is stored under ``~/.photowatermark/`` and only the
+files whose mtime or size changed are parsed again.
+"""
+from bisect import bisect_right
+import json
+import os
+import threading
+
+from fontTools.ttLib import TTFont, TTCollection
+
+from photowatermark.utils.font_discovery import find_font_files
+
+
+# 索引文件格式版本，结构变化时递增以丢弃旧缓存
+FONT_INDEX_VERSION = 2
+
+DEFAULT_FONT_INDEX_FILE = os.path.join(os.path.expanduser("~"), ".photowatermark", "font_index.json")
+
+# Windows平台的语言ID
+LANG_ENGLISH_US = 0x0409
+LANG_CHINESE_SIMPLIFIED = 0x0804
+
+# 字体集合文件扩展名（一个文件包含多个字体）
+COLLECTION_EXTENSIONS = ('.ttc', '.otc')
+
+# 样式变体名称
+STYLE_REGULAR = 'regular'
+STYLE_BOLD = 'bold'
+STYLE_ITALIC = 'italic'
+STYLE_BOLD_ITALIC = 'bold_italic'
+
+# 请求的样式不存在时，可以接受的替代变体（按优先级）
+STYLE_FALLBACKS = {
+    STYLE_REGULAR: (STYLE_REGULAR,),
+    STYLE_BOLD: (STYLE_BOLD, STYLE_BOLD_ITALIC),
+    STYLE_ITALIC: (STYLE_ITALIC, STYLE_BOLD_ITALIC),
+    STYLE_BOLD_ITALIC: (STYLE_BOLD_ITALIC,)
+}
+
+
+def style_key(bold=False, italic=False):
+    """把粗体/斜体标志转换为样式变体名称"""
+    if bold and italic:
+        return STYLE_BOLD_ITALIC
+    if bold:
+        return STYLE_BOLD
+    if italic:
+        return STYLE_ITALIC
+    return STYLE_REGULAR
+
+
+def _record_text(record):
+    """安全地解码name表记录"""
+    try:
+        return record.toUnicode()
+    except Exception:
+        return None
+
+
+def _coverage_ranges(tt):
+    """
+    Compress the cmap of a font into sorted [first, last] codepoint ranges.
+    """
+    try:
+        codepoints = sorted((tt.getBestCmap() or {}).keys())
+    except Exception:
+        return []
+
+    ranges = []
+    for codepoint in codepoints:
+        if ranges and codepoint == ranges[-1][1] + 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return ranges
+
+
+def _parse_face(tt, font_path, face_index):
+    """
+    Read the name table and glyph coverage of one font face. The font is
+    opened lazily, so only the name and cmap tables are decompiled.
+
+    Returns:
+        dict: Face information in the same shape as ``fonts._get_font_info``
+    """
+    records = tt['name'].names
+
+    font_family = None
+    font_subfamily = None
+    full_name = None
+    chinese_name = None
+    full_names = []
+    families = []
+
+    for record in records:
+        text = _record_text(record)
+        if not text:
+            continue
+        if record.nameID == 1 and text not in families:
+            families.append(text)
+        elif record.nameID == 4 and text not in full_names:
+            full_names.append(text)
+
+        if record.platformID != 3:
+            continue
+        if record.langID == LANG_ENGLISH_US:
+            if record.nameID == 1:
+                font_family = text
+            elif record.nameID == 2:
+                font_subfamily = text
+            elif record.nameID == 4:
+                full_name = text
+        elif record.langID == LANG_CHINESE_SIMPLIFIED and record.nameID == 4 and not chinese_name:
+            chinese_name = text
+
+    # Fallback to any available names if English not found
+    if not font_family or not font_subfamily or not full_name:
+        for record in records:
+            if record.nameID == 1 and not font_family:
+                font_family = _record_text(record)
+            elif record.nameID == 2 and not font_subfamily:
+                font_subfamily = _record_text(record)
+            elif record.nameID == 4 and not full_name:
+                full_name = _record_text(record)
+
+    subfamily_lower = (font_subfamily or '').lower()
+    return {
+        'family': font_family,
+        'subfamily': font_subfamily,
+        'full_name': full_name,
+        'display_name': chinese_name or font_family or full_name,
+        'full_names': full_names,
+        'families': families,
+        'path': font_path,
+        'index': face_index,
+        'is_bold': 'bold' in subfamily_lower or 'heavy' in subfamily_lower,
+        'is_italic': 'italic' in subfamily_lower or 'oblique' in subfamily_lower,
+        'coverage': _coverage_ranges(tt)
+    }
+
+
+def read_font_faces(font_path):
+    """
+    Parse every face contained in a font file.
+
+    Args:
+        font_path (str): Path to a .ttf/.otf/.ttc file
+
+    Returns:
+        list: One face dict per face, empty if the file cannot be parsed
+    """
+    faces = []
+    try:
+        if font_path.lower().endswith(COLLECTION_EXTENSIONS):
+            collection = TTCollection(font_path, lazy=True)
+            try:
+                for face_index, tt in enumerate(collection.fonts):
+                    faces.append(_parse_face(tt, font_path, face_index))
+            finally:
+                collection.close()
+        else:
+            tt = TTFont(font_path, lazy=True)
+            try:
+                faces.append(_parse_face(tt, font_path, 0))
+            finally:
+                tt.close()
+    except Exception:
+        # Skip fonts that cause errors
+        return []
+    return faces
+
+
+def _file_signature(font_path):
+    """返回用于判断缓存是否失效的 (mtime, size)"""
+    stat = os.stat(font_path)
+    return stat.st_mtime, stat.st_size
+
+
+class FontIndex:
+    """
+    Name-table index of the installed fonts, persisted between runs.
+
+    Every lookup is a dictionary hit once :meth:`ensure_loaded` has run.
+    """
+
+    def __init__(self, index_file=None, font_files_provider=None):
+        self.index_file = index_file or DEFAULT_FONT_INDEX_FILE
+        self.font_files_provider = font_files_provider or find_font_files
+        self._lock = threading.RLock()  # 保护查找表的替换和按需解析
+        self._scan_lock = threading.RLock()  # 同一时间只扫描一次字体目录
+        self._loaded = False
+        self._entries = {}  # path -> {'mtime', 'size', 'faces'}
+        # 不在字体目录中、按需解析的字体文件：不进入查找表，也不写入索引文件
+        self._extra_entries = {}
+
+        # Derived lookup tables
+        self._by_name = {}
+        self._by_family_name = {}
+        self._by_family = {}
+        self._variants = {}  # family -> {style: face}
+        self._styles = {}  # (path, face index) -> (is_bold, is_italic)
+        self._fallback_faces = []  # 字符回退时的候选字体顺序
+        self._coverage = {}  # (path, face index) -> (starts, ends)
+        self._covering_faces = {}  # (codepoint, style) -> face
+        self._display_names = []
+
+    @property
+    def is_loaded(self):
+        """索引是否已经构建完成"""
+        return self._loaded
+
+    def ensure_loaded(self):
+        """
+        第一次使用时构建索引。正在后台扫描时等待扫描完成而不重复扫描；
+        主线程应先检查 :attr:`is_loaded`，避免被扫描阻塞
+        """
+        if not self._loaded:
+            with self._scan_lock:
+                if not self._loaded:
+                    self.refresh()
+
+    def refresh(self, progress_callback=None, cancel_event=None, batch_size=50):
+        """
+        Re-scan the font directories, re-parse only changed files and persist
+        the result if anything changed.
+
+        The scan runs without holding the index lock: lookups keep using the
+        previous tables until the finished ones are swapped in.
+
+        Args:
+            progress_callback (callable): Called with a list of newly found
+                display names every ``batch_size`` font files
+            cancel_event (threading.Event): Abort the scan when set
+            batch_size (int): Number of font files per progress callback
+
+        Returns:
+            bool: False if the scan was cancelled, True otherwise
+        """
+        with self._scan_lock:
+            cached = self._read_index_file()
+            entries = {}
+            dirty = False
+            reported = set()
+            pending = []
+
+            for count, font_path in enumerate(self.font_files_provider(), 1):
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+
+                try:
+                    mtime, size = _file_signature(font_path)
+                except OSError:
+                    continue
+
+                entry = cached.get(font_path)
+                if entry is None or entry.get('mtime') != mtime or entry.get('size') != size:
+                    entry = {'mtime': mtime, 'size': size, 'faces': read_font_faces(font_path)}
+                    dirty = True
+                entries[font_path] = entry
+
+                if progress_callback is not None:
+                    for face in entry['faces']:
+                        name = face['display_name']
+                        if name and name not in reported:
+                            reported.add(name)
+                            pending.append(name)
+                    if pending and count % batch_size == 0:
+                        progress_callback(pending)
+                        pending = []
+
+            if progress_callback is not None and pending:
+                progress_callback(pending)
+
+            if set(entries) != set(cached):
+                dirty = True
+
+            lookups = self._build_lookups(entries)
+            with self._lock:
+                self._entries = entries
+                for name, table in lookups.items():
+                    setattr(self, name, table)
+                self._loaded = True
+
+            if dirty:
+                self._write_index_file(entries)
+            return True
+
+    def _read_index_file(self):
+        """读取磁盘上的索引，格式不符时视为空"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != FONT_INDEX_VERSION:
+                return {}
+            return data.get('fonts', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _write_index_file(self, entries):
+        """原子地写入索引文件"""
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            tmp_file = self.index_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': FONT_INDEX_VERSION, 'fonts': entries}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            print(f"Error saving font index: {e}")
+
+    def _build_lookups(self, entries):
+        """根据条目构建各个查找表，返回 属性名 -> 查找表"""
+        by_name = {}
+        by_family_name = {}
+        by_family = {}
+        variants = {}
+        styles = {}
+        display_names = set()
+
+        for entry in entries.values():
+            for face in entry['faces']:
+                for name in face['full_names']:
+                    by_name.setdefault(name, face)
+                for name in face['families']:
+                    # 按家族名查找时优先返回常规字体
+                    current = by_family_name.get(name)
+                    if current is None or ((current['is_bold'] or current['is_italic'])
+                                           and not (face['is_bold'] or face['is_italic'])):
+                        by_family_name[name] = face
+                if face['family']:
+                    by_family.setdefault(face['family'], []).append(face)
+                    variants.setdefault(face['family'], {}).setdefault(
+                        style_key(face['is_bold'], face['is_italic']), face)
+                styles[(face['path'], face['index'])] = (face['is_bold'], face['is_italic'])
+                if face['display_name']:
+                    display_names.add(face['display_name'])
+
+        # 回退候选：常规字体优先，其次按家族名排序以保证结果稳定
+        all_faces = [face for entry in entries.values() for face in entry['faces']]
+        fallback_faces = sorted(
+            all_faces,
+            key=lambda face: (face['is_bold'] or face['is_italic'], face['family'] or '', face['path'], face['index'])
+        )
+        return {
+            '_by_name': by_name,
+            '_by_family_name': by_family_name,
+            '_by_family': by_family,
+            '_variants': variants,
+            '_styles': styles,
+            '_coverage': {},
+            '_covering_faces': {},
+            '_fallback_faces': fallback_faces,
+            '_display_names': sorted(display_names),
+        }
+
+    def font_names(self):
+        """返回去重排序后的字体显示名称"""
+        self.ensure_loaded()
+        return list(self._display_names)
+
+    def find_face(self, font_name):
+        """
+        Find the face whose full name (in any language) or, failing that,
+        family name equals ``font_name``.
+
+        Returns:
+            dict: Face information, or None if not found
+        """
+        self.ensure_loaded()
+        return self._by_name.get(font_name) or self._by_family_name.get(font_name)
+
+    def faces_for_family(self, family):
+        """返回属于指定字体家族的所有字体"""
+        self.ensure_loaded()
+        return self._by_family.get(family, [])
+
+    def style_variants(self, family):
+        """
+        Get the precomputed style variants of a family.
+
+        Returns:
+            dict: Maps 'regular'/'bold'/'italic'/'bold_italic' to faces
+        """
+        self.ensure_loaded()
+        return self._variants.get(family, {})
+
+    def resolve_style(self, font_name, bold=False, italic=False):
+        """
+        Resolve the face to use for a font name and requested style.
+
+        The exact variant is preferred; otherwise a variant that has at least
+        the requested styles, and finally the base face itself.
+
+        Returns:
+            dict: Face information, or None if the font is unknown
+        """
+        base = self.find_face(font_name)
+        if not base or not base['family']:
+            return base
+
+        variants = self._variants.get(base['family'], {})
+        for key in STYLE_FALLBACKS[style_key(bold, italic)]:
+            face = variants.get(key)
+            if face is not None:
+                return face
+        if not bold and not italic:
+            # 家族中没有常规字体时使用家族中的第一个字体
+            return self._by_family[base['family']][0]
+        return base
+
+    def style_flags(self, font_path, face_index=0):
+        """
+        Get the (is_bold, is_italic) flags of a font face.
+
+        Returns:
+            tuple: Style flags, or None if the face cannot be read
+        """
+        self.ensure_loaded()
+        flags = self._styles.get((font_path, face_index))
+        if flags is None:
+            face = self.face_info(font_path, face_index)
+            if face is None:
+                return None
+            flags = (face['is_bold'], face['is_italic'])
+        return flags
+
+    def _coverage_table(self, face):
+        """返回用于二分查找的覆盖范围表"""
+        key = (face['path'], face['index'])
+        table = self._coverage.get(key)
+        if table is None:
+            ranges = face.get('coverage') or []
+            table = ([r[0] for r in ranges], [r[1] for r in ranges])
+            self._coverage[key] = table
+        return table
+
+    def covers(self, face, codepoint):
+        """
+        Check whether a face has a glyph for a codepoint.
+
+        Returns:
+            bool: True if the codepoint is in the face's cmap
+        """
+        starts, ends = self._coverage_table(face)
+        i = bisect_right(starts, codepoint) - 1
+        return i >= 0 and codepoint <= ends[i]
+
+    def find_covering_face(self, codepoint, bold=False, italic=False):
+        """
+        Find a face that has a glyph for ``codepoint``, preferring faces with
+        the requested style. Results are cached per codepoint.
+
+        Returns:
+            dict: Face information, or None if no installed font covers it
+        """
+        self.ensure_loaded()
+        key = (codepoint, style_key(bold, italic))
+        if key in self._covering_faces:
+            return self._covering_faces[key]
+
+        result = None
+        for face in self._fallback_faces:
+            if self.covers(face, codepoint):
+                if face['is_bold'] == bool(bold) and face['is_italic'] == bool(italic):
+                    result = face
+                    break
+                if result is None:
+                    result = face
+        self._covering_faces[key] = result
+        return result
+
+    def face_info(self, font_path, face_index=0):
+        """
+        Get face information for a font file. Files outside the font
+        directories are parsed on demand and kept in a side cache, so the
+        index and its lookup tables only ever describe the installed fonts.
+        """
+        self.ensure_loaded()
+        entry = self._entries.get(font_path)
+        if entry is None:
+            entry = self._extra_face_entry(font_path)
+            if entry is None:
+                return None
+        for face in entry['faces']:
+            if face['index'] == face_index:
+                return face
+        return None
+
+    def _extra_face_entry(self, font_path):
+        """返回按需解析的字体条目（文件改变后重新解析）"""
+        try:
+            mtime, size = _file_signature(font_path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._extra_entries.get(font_path)
+            if entry is None or entry['mtime'] != mtime or entry['size'] != size:
+                entry = {'mtime': mtime, 'size': size, 'faces': read_font_faces(font_path)}
+                self._extra_entries[font_path] = entry
+            return entry
+
+
+_font_index = None
+_font_index_lock = threading.Lock()
+
+
+def get_font_index():
+    """返回进程内共享的字体索引"""
+    global _font_index
+    with _font_index_lock:
+        if _font_index is None:
+            _font_index = FontIndex()
+        return _font_index
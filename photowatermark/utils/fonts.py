@@ -1,9 +1,25 @@
 """
 Font utilities for the PhotoWatermark-AI4SE application.
+
+All lookups go through the persistent font index in
+:mod:`photowatermark.utils.font_index`, so they are dictionary hits once the
+index has been loaded.
 """
-import matplotlib.font_manager as fm
-from fontTools.ttLib import TTFont
-import os
+from photowatermark.utils.font_index import get_font_index
+
+
+# 字体索引尚未加载时使用的内置字体列表
+SAFE_FONTS = ["Arial", "Times New Roman", "Courier New", "Verdana", "Helvetica"]
+
+
+def get_safe_font_list():
+    """
+    Get a small built-in list of common fonts that needs no font scan.
+    
+    Returns:
+        list: Font names
+    """
+    return list(SAFE_FONTS)
 
 
 def get_system_fonts():
@@ -14,42 +30,41 @@ def get_system_fonts():
         list: Sorted list of unique font names (Chinese names prioritized)
     """
     try:
-        # Find all system font files
-        font_files = fm.findSystemFonts()
-        
-        # Extract font names
-        font_names = []
-        for font_path in font_files:
-            try:
-                # First try to get font name with fontTools for better Chinese name support
-                tt = TTFont(font_path)
-                chinese_name = None
-                
-                # Look for Chinese name (Simplified Chinese, Windows platform)
-                for record in tt['name'].names:
-                    if (record.nameID == 4 and  # Full font name
-                        record.platformID == 3 and  # Windows
-                        record.langID == 0x0804):   # Simplified Chinese
-                        chinese_name = record.toUnicode()
-                        break
-                
-                # If no Chinese name found, fall back to English name
-                if not chinese_name:
-                    font_prop = fm.FontProperties(fname=font_path)
-                    chinese_name = font_prop.get_name()
-                
-                font_names.append(chinese_name)
-            except Exception:
-                # Skip fonts that cause errors
-                continue
-        
-        # Remove duplicates and sort
-        unique_fonts = sorted(set(font_names))
-        return unique_fonts
+        return get_font_index().font_names()
     except Exception as e:
         print(f"Error getting system fonts: {e}")
         # Return some default fonts if we can't get system fonts
-        return ["Arial", "Times New Roman", "Courier New", "Verdana", "Helvetica"]
+        return get_safe_font_list()
+
+
+def load_system_fonts(on_fonts_found=None, cancel_event=None):
+    """
+    Build (or refresh) the system font index, reporting font names as they
+    are discovered. Intended to run in a worker thread.
+    
+    Args:
+        on_fonts_found (callable): Called with each batch of new font names
+        cancel_event (threading.Event): Stops the enumeration when set
+        
+    Returns:
+        bool: True if enumeration finished, False if it was cancelled
+    """
+    try:
+        return get_font_index().refresh(progress_callback=on_fonts_found, cancel_event=cancel_event)
+    except Exception as e:
+        print(f"Error loading system fonts: {e}")
+        return False
+
+
+def system_fonts_ready():
+    """
+    Check whether the system font index has been built, so callers on the
+    UI thread can avoid triggering a blocking font scan.
+    
+    Returns:
+        bool: True if font lookups will not scan the font directories
+    """
+    return get_font_index().is_loaded
 
 
 def _get_font_info(font_path):
@@ -63,41 +78,7 @@ def _get_font_info(font_path):
         dict: Font information including family, subfamily, and style flags
     """
     try:
-        tt = TTFont(font_path)
-        name_table = tt['name']
-        
-        # Get font information
-        font_family = None
-        font_subfamily = None
-        full_name = None
-        
-        # Prefer English (US) names
-        for record in name_table.names:
-            if record.nameID == 1 and record.platformID == 3 and record.langID == 0x0409:  # Font Family
-                font_family = record.toUnicode()
-            elif record.nameID == 2 and record.platformID == 3 and record.langID == 0x0409:  # Font Subfamily
-                font_subfamily = record.toUnicode()
-            elif record.nameID == 4 and record.platformID == 3 and record.langID == 0x0409:  # Full Font Name
-                full_name = record.toUnicode()
-                
-        # Fallback to any available names if English not found
-        if not font_family or not font_subfamily or not full_name:
-            for record in name_table.names:
-                if record.nameID == 1 and not font_family:
-                    font_family = record.toUnicode()
-                elif record.nameID == 2 and not font_subfamily:
-                    font_subfamily = record.toUnicode()
-                elif record.nameID == 4 and not full_name:
-                    full_name = record.toUnicode()
-        
-        return {
-            'family': font_family,
-            'subfamily': font_subfamily,
-            'full_name': full_name,
-            'path': font_path,
-            'is_bold': font_subfamily and ('bold' in font_subfamily.lower() or 'heavy' in font_subfamily.lower()),
-            'is_italic': font_subfamily and ('italic' in font_subfamily.lower() or 'oblique' in font_subfamily.lower())
-        }
+        return get_font_index().face_info(font_path)
     except Exception:
         return None
 
@@ -113,46 +94,34 @@ def get_font_path_by_name(font_name):
         str: Path to the font file, or None if not found
     """
     try:
-        # Find all system font files
-        font_files = fm.findSystemFonts()
-        
-        # Search for the font
-        for font_path in font_files:
-            try:
-                # Get font name with fontTools
-                tt = TTFont(font_path)
-                chinese_name = None
-                english_name = None
-                
-                # Look for Chinese name (Simplified Chinese, Windows platform)
-                for record in tt['name'].names:
-                    if record.nameID == 4 and record.platformID == 3 and record.langID == 0x0804:
-                        chinese_name = record.toUnicode()
-                    elif record.nameID == 4 and record.platformID == 3 and record.langID == 0x0409:
-                        english_name = record.toUnicode()
-                
-                # Check if this is the font we're looking for
-                if chinese_name == font_name or english_name == font_name:
-                    return font_path
-            except Exception:
-                # Skip fonts that cause errors
-                continue
-                
-        # If not found with fontTools, try with matplotlib
-        for font_path in font_files:
-            try:
-                font_prop = fm.FontProperties(fname=font_path)
-                if font_prop.get_name() == font_name:
-                    return font_path
-            except Exception:
-                continue
-                
-        return None
+        face = get_font_index().find_face(font_name)
+        return face['path'] if face else None
     except Exception as e:
         print(f"Error finding font path: {e}")
         return None
 
 
+def get_stylized_font_face(base_font_name, bold=False, italic=False):
+    """
+    Get the face information for a stylized version of a font (bold, italic,
+    or both) from the precomputed family style table.
+    
+    Args:
+        base_font_name (str): The base font name
+        bold (bool): Whether to find bold version
+        italic (bool): Whether to find italic version
+        
+    Returns:
+        dict: Face information (path, index, style flags), or None if the
+        font is unknown
+    """
+    try:
+        return get_font_index().resolve_style(base_font_name, bold=bold, italic=italic)
+    except Exception as e:
+        print(f"Error finding stylized font: {e}")
+        return None
+
+
 def get_stylized_font_path(base_font_name, bold=False, italic=False):
     """
     Get the file path for a stylized version of a font (bold, italic, or both)
@@ -166,48 +135,64 @@ def get_stylized_font_path(base_font_name, bold=False, italic=False):
     Returns:
         str: Path to the stylized font file, or base font if not found
     """
+    face = get_stylized_font_face(base_font_name, bold=bold, italic=italic)
+    return face['path'] if face else None
+
+
+def get_font_style_flags(font_path, face_index=0):
+    """
+    Get the actual style of a font file.
+    
+    Args:
+        font_path (str): Path to the font file
+        face_index (int): Face index inside a font collection
+        
+    Returns:
+        tuple: (is_bold, is_italic), or None if the font cannot be read
+    """
     try:
-        # Find all system font files
-        font_files = fm.findSystemFonts()
+        return get_font_index().style_flags(font_path, face_index)
+    except Exception:
+        return None
+
+
+def split_text_by_coverage(text, face, bold=False, italic=False):
+    """
+    Split text into runs that can each be rendered with one font, using the
+    glyph coverage index: characters missing from ``face`` are assigned to
+    the first installed font that covers them.
+    
+    Args:
+        text (str): Text to render
+        face (dict): Face information of the selected font
+        bold (bool): Preferred style of fallback fonts
+        italic (bool): Preferred style of fallback fonts
         
-        # First find the base font info
-        base_info = None
-        for font_path in font_files:
-            info = _get_font_info(font_path)
-            if info and (info['full_name'] == base_font_name):
-                base_info = info
-                break
-                
-        if not base_info or not base_info['family']:
-            # If we can't find base font info, return base font path
-            return get_font_path_by_name(base_font_name)
-            
-        # Now look for a matching font with the requested styles
-        best_match = None
-        for font_path in font_files:
-            info = _get_font_info(font_path)
-            if not info or info['family'] != base_info['family']:
-                continue
-                
-            # Check if this font matches the requested styles exactly
-            matches_bold = info['is_bold'] == bold
-            matches_italic = info['is_italic'] == italic
+    Returns:
+        list: (segment, face) tuples; a single run when the face covers the
+        whole text or no fallback font is available
+    """
+    if not text or not face:
+        return [(text, face)]
+    try:
+        index = get_font_index()
+        runs = []
+        for char in text:
+            if char.isspace() and runs:
+                # 空白字符沿用当前字体，避免拆出多余的片段
+                run_face = runs[-1][1]
+            elif index.covers(face, ord(char)):
+                run_face = face
+            else:
+                run_face = index.find_covering_face(ord(char), bold=bold, italic=italic) or face
             
-            if matches_bold and matches_italic:
-                return font_path
-                
-            # Keep track of any match for fallback
-            if best_match is None:
-                matches_bold_loose = (not bold) or info['is_bold']
-                matches_italic_loose = (not italic) or info['is_italic']
-                if matches_bold_loose and matches_italic_loose:
-                    best_match = font_path
-                
-        # If no exact match found, return best match or base font
-        return best_match if best_match else base_info['path']
-    except Exception as e:
-        print(f"Error finding stylized font path: {e}")
-        return get_font_path_by_name(base_font_name)
+            if runs and runs[-1][1] is run_face:
+                runs[-1][0].append(char)
+            else:
+                runs.append(([char], run_face))
+        return [(''.join(chars), run_face) for chars, run_face in runs]
+    except Exception:
+        return [(text, face)]
 
 
 def font_supports_style(font_name, bold=False, italic=False):
@@ -223,11 +208,12 @@ def font_supports_style(font_name, bold=False, italic=False):
         bool: True if font supports the requested styles, False otherwise
     """
     try:
-        stylized_path = get_stylized_font_path(font_name, bold=bold, italic=italic)
-        base_path = get_font_path_by_name(font_name)
+        index = get_font_index()
+        stylized = index.resolve_style(font_name, bold=bold, italic=italic)
+        base = index.find_face(font_name)
         
-        # If we got a different path than the base font, it supports the style
-        return stylized_path and base_path and stylized_path != base_path
+        # If we got a different face than the base font, it supports the style
+        return bool(stylized and base and stylized is not base)
     except Exception:
         return False
 
@@ -241,11 +227,6 @@ if __name__ == "__main__":
     print(f"Found {len(fonts)} system fonts")
     print("First 10 fonts:", fonts[:10])
     
-    # Get safe fonts
-    safe_fonts = get_safe_font_list()
-    print(f"Safe font list contains {len(safe_fonts)} fonts")
-    print("Sample safe fonts:", safe_fonts[:5])
-    
     # Test font path lookup
     if fonts:
         test_font = "Arial"
@@ -261,25 +242,3 @@ if __name__ == "__main__":
         
         stylized_path = get_stylized_font_path(test_font, bold=True, italic=True)
         print(f"Bold+Italic version path for '{test_font}': {stylized_path}")
-
-
-def font_supports_style(font_name, bold=False, italic=False):
-    """
-    Check if a font supports specific styles (bold, italic).
-    
-    Args:
-        font_name (str): The font name
-        bold (bool): Check for bold support
-        italic (bool): Check for italic support
-        
-    Returns:
-        bool: True if font supports the requested styles, False otherwise
-    """
-    try:
-        stylized_path = get_stylized_font_path(font_name, bold=bold, italic=italic)
-        base_path = get_font_path_by_name(font_name)
-        
-        # If we got a different path than the base font, it supports the style
-        return stylized_path and base_path and stylized_path != base_path
-    except Exception:
-        return False
\ No newline at end of file
@@ -6,6 +6,7 @@ from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 import os
 import json
+import threading
 from typing import List
 
 try:
@@ -16,6 +17,11 @@ except ImportError:
     print("警告: 未安装tkinterdnd2库，拖拽功能将不可用。请运行 'pip install tkinterdnd2' 来启用此功能。")
 
 from photowatermark.views.widgets.thumbnail_list import ThumbnailList
+from photowatermark.models.pipeline import ExportPipeline
+from photowatermark.models.watermark_settings import WatermarkSettings
+from photowatermark.models.invisible_watermark import (
+    invisible_watermark_available, scan_directory, MAX_PAYLOAD_BYTES, MIN_INVISIBLE_QUALITY
+)
 from photowatermark.utils.dialogs import show_error_message
 from photowatermark.utils.constants import *
 
@@ -35,6 +41,8 @@ class MainWindow:
         self.image_paths = []
         self.current_image_index = 0
         self.current_image = None
+        # 上一次在预览中提示过的水印设置错误（同一错误只提示一次）
+        self._preview_settings_error = None
         
         # Initialize UI components
         self.thumbnail_list = None
@@ -46,6 +54,9 @@ class MainWindow:
         self.naming_entry = None
         self.quality_var = None
         self.quality_value_label = None
+        self.invisible_watermark_enabled_var = None  # 导出时嵌入隐形水印
+        self.invisible_watermark_text_var = None  # 隐形水印内容（最多8个字节）
+        self.export_parallel_var = None  # 多线程并行导出
         self.format_var = None
         self.resize_var = None
         self.resize_entry = None
@@ -59,10 +70,31 @@ class MainWindow:
         self.watermark_transparency_label = None
         self.watermark_position_var = None
         self.watermark_font_size_var = None
+        self.watermark_size_mode_var = None  # 字号模式（固定像素或按图片短边比例）
+        self.watermark_relative_size_var = None  # 字号占图片短边的百分比
         self.watermark_font_var = None  # 字体选择变量
         self.watermark_bold_var = None  # 粗体变量
         self.watermark_italic_var = None  # 斜体变量
+        self.watermark_align_var = None  # 多行对齐方式
+        self.watermark_line_spacing_var = None  # 行距（像素）
+        self.watermark_max_width_var = None  # 最大宽度（图片宽度的百分比，0为不换行）
+        self.watermark_tile_spacing_var = None  # 平铺间距（像素）
+        self.watermark_tile_angle_var = None  # 平铺旋转角度（度）
+        self.watermark_tile_stagger_var = None  # 平铺行错位（水平周期的百分比）
+        self.watermark_type_var = None  # 水印类型（文本或Logo图片）
+        self.watermark_logo_path_var = None  # Logo图片路径
+        self.watermark_logo_scale_var = None  # Logo宽度（图片宽度的百分比）
+        self.watermark_effect_var = None  # 文字效果（阴影、描边或发光）
+        self.watermark_effect_size_var = None  # 效果大小（像素）
+        self.watermark_rotation_var = None  # 水印旋转角度（度，平铺时使用平铺角度）
+        self.watermark_color_mode_var = None  # 颜色模式（固定白色或按背景自动选择）
+        self.watermark_layers = []  # 模板中叠加在主水印下方的图层（从下到上）
         self.watermark_color = None  # RGB tuple for color
+        self.font_combo = None  # 字体下拉框
+        
+        # 后台字体枚举
+        self.font_names = []
+        self._font_enum_cancel = threading.Event()
         
         # Custom position variables for drag-and-drop
         self.custom_watermark_x = None
@@ -85,6 +117,9 @@ class MainWindow:
         
         self.setup_ui()
         
+        # 在后台线程中枚举系统字体，避免阻塞窗口显示
+        self.start_font_enumeration()
+        
         # 确保配置目录存在
         os.makedirs(self.configs_dir, exist_ok=True)
         
@@ -162,6 +197,20 @@ class MainWindow:
         self.quality_var.trace_add("write", self.update_quality_label)
         self.quality_value_label.pack(side=tk.LEFT)
         
+        # 隐形水印（嵌入在亮度的DCT系数中，经JPEG重新压缩后仍可检测）
+        invisible_frame = ttk.Frame(export_frame)
+        invisible_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.invisible_watermark_enabled_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            invisible_frame,
+            text="隐形水印:",
+            variable=self.invisible_watermark_enabled_var
+        ).pack(side=tk.LEFT)
+        self.invisible_watermark_text_var = tk.StringVar(value="")
+        ttk.Entry(invisible_frame, textvariable=self.invisible_watermark_text_var, width=12).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(invisible_frame, text="检测...", command=self.detect_invisible_watermarks).pack(side=tk.LEFT, padx=(5, 0))
+        
         # 输出格式设置
         format_frame = ttk.Frame(export_frame)
         format_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -193,6 +242,18 @@ class MainWindow:
         # 绑定尺寸选项改变事件
         resize_combo.bind('<<ComboboxSelected>>', self.on_resize_change)
         
+        # 并行导出（按估计的开销从大到小分配给线程）和导出计划
+        parallel_frame = ttk.Frame(export_frame)
+        parallel_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.export_parallel_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            parallel_frame,
+            text="并行导出（大图片先导出）",
+            variable=self.export_parallel_var
+        ).pack(side=tk.LEFT)
+        ttk.Button(parallel_frame, text="导出计划...", command=self.show_export_plan).pack(side=tk.LEFT, padx=(5, 0))
+        
         # 导出按钮框架
         export_btn_frame = ttk.Frame(export_frame)
         export_btn_frame.pack(pady=5)
@@ -213,7 +274,7 @@ class MainWindow:
         self.watermark_enabled_var = tk.BooleanVar(value=False)
         watermark_enabled_check = ttk.Checkbutton(
             watermark_frame, 
-            text="启用文本水印", 
+            text="启用水印", 
             variable=self.watermark_enabled_var,
             command=self.on_watermark_enabled_change
         )
@@ -230,6 +291,44 @@ class MainWindow:
         # 绑定文本变化事件以实时更新预览
         self.watermark_text_var.trace_add("write", self.update_preview_delayed)
         
+        # 水印类型设置（文本或Logo图片）
+        type_frame = ttk.Frame(watermark_frame)
+        type_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(type_frame, text="水印类型:").pack(side=tk.LEFT)
+        self.watermark_type_var = tk.StringVar(value=DEFAULT_WATERMARK_TYPE)
+        type_combo = ttk.Combobox(
+            type_frame,
+            textvariable=self.watermark_type_var,
+            values=WATERMARK_TYPES,
+            state="readonly",
+            width=8
+        )
+        type_combo.pack(side=tk.LEFT, padx=(5, 0))
+        type_combo.bind('<<ComboboxSelected>>', self.update_preview_delayed)
+        
+        # Logo图片设置（水印类型为 "image" 时生效）
+        logo_frame = ttk.Frame(watermark_frame)
+        logo_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(logo_frame, text="Logo图片:").pack(side=tk.LEFT)
+        self.watermark_logo_path_var = tk.StringVar(value="")
+        ttk.Entry(logo_frame, textvariable=self.watermark_logo_path_var).pack(
+            side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 5))
+        self.watermark_logo_path_var.trace_add("write", self.update_preview_delayed)
+        ttk.Button(logo_frame, text="选择...", command=self.choose_logo_file).pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Label(logo_frame, text="缩放(%):").pack(side=tk.LEFT)
+        self.watermark_logo_scale_var = tk.IntVar(value=DEFAULT_WATERMARK_LOGO_SCALE)
+        ttk.Spinbox(
+            logo_frame,
+            from_=1,
+            to=100,
+            textvariable=self.watermark_logo_scale_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        self.watermark_logo_scale_var.trace_add("write", self.update_preview_delayed)
+        
         # 水印透明度设置
         transparency_frame = ttk.Frame(watermark_frame)
         transparency_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -260,7 +359,9 @@ class MainWindow:
         position_options = [
             "top-left", "top-center", "top-right",
             "middle-left", "center", "middle-right",
-            "bottom-left", "bottom-center", "bottom-right"
+            "bottom-left", "bottom-center", "bottom-right",
+            WATERMARK_AUTO_POSITION,  # 每张图片自动选择最平坦的位置
+            WATERMARK_TILE_POSITION
         ]
         position_combo = ttk.Combobox(
             position_frame, 
@@ -293,32 +394,51 @@ class MainWindow:
         # 绑定字体大小变化事件以实时更新预览
         self.watermark_font_size_var.trace_add("write", self.update_preview_delayed)
         
+        # 按图片短边比例设置字号，混合分辨率的批量图片水印大小一致
+        relative_size_frame = ttk.Frame(watermark_frame)
+        relative_size_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.watermark_size_mode_var = tk.StringVar(value=DEFAULT_WATERMARK_SIZE_MODE)
+        ttk.Checkbutton(
+            relative_size_frame,
+            text="按图片短边比例(%):",
+            variable=self.watermark_size_mode_var,
+            onvalue=WATERMARK_SIZE_RELATIVE,
+            offvalue=WATERMARK_SIZE_ABSOLUTE,
+            command=self.update_preview_delayed
+        ).pack(side=tk.LEFT)
+        self.watermark_relative_size_var = tk.DoubleVar(value=DEFAULT_WATERMARK_RELATIVE_SIZE)
+        ttk.Spinbox(
+            relative_size_frame,
+            from_=0.5,
+            to=50,
+            increment=0.5,
+            textvariable=self.watermark_relative_size_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        self.watermark_relative_size_var.trace_add("write", self.update_preview_delayed)
+        
         # 水印字体选择设置
         font_selection_frame = ttk.Frame(watermark_frame)
         font_selection_frame.pack(fill=tk.X, padx=5, pady=5)
         
         ttk.Label(font_selection_frame, text="字体选择:").pack(side=tk.LEFT)
         self.watermark_font_var = tk.StringVar(value="Arial")  # 默认字体
-        # 获取系统字体列表
-        try:
-            from photowatermark.utils.fonts import get_system_fonts
-            font_list = get_system_fonts()
-        except:
-            # 如果获取失败，使用安全字体列表
-            from photowatermark.utils.fonts import get_safe_font_list
-            font_list = get_safe_font_list()
+        # 先使用内置字体列表，系统字体由后台线程逐步加入
+        from photowatermark.utils.fonts import get_safe_font_list
+        self.font_names = get_safe_font_list()
         
         # 创建字体选择下拉框
-        font_combo = ttk.Combobox(
+        self.font_combo = ttk.Combobox(
             font_selection_frame,
             textvariable=self.watermark_font_var,
-            values=font_list,
+            values=self.font_names,
             state="readonly",
             width=15
         )
-        font_combo.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        self.font_combo.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
         # 绑定字体变化事件以实时更新预览
-        font_combo.bind('<<ComboboxSelected>>', self.on_watermark_font_change)
+        self.font_combo.bind('<<ComboboxSelected>>', self.on_watermark_font_change)
         
         # 字体样式设置（粗体和斜体）
         font_style_frame = ttk.Frame(watermark_frame)
@@ -351,6 +471,133 @@ class MainWindow:
         # 初始化字体样式控件状态
         self.update_font_style_controls()
         
+        # 多行文本设置（水印文字中的 "\\n" 表示换行）
+        multiline_frame = ttk.Frame(watermark_frame)
+        multiline_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(multiline_frame, text="对齐:").pack(side=tk.LEFT)
+        self.watermark_align_var = tk.StringVar(value=DEFAULT_WATERMARK_ALIGN)
+        align_combo = ttk.Combobox(
+            multiline_frame,
+            textvariable=self.watermark_align_var,
+            values=WATERMARK_ALIGNMENTS,
+            state="readonly",
+            width=8
+        )
+        align_combo.pack(side=tk.LEFT, padx=(5, 10))
+        align_combo.bind('<<ComboboxSelected>>', self.update_preview_delayed)
+        
+        ttk.Label(multiline_frame, text="行距:").pack(side=tk.LEFT)
+        self.watermark_line_spacing_var = tk.IntVar(value=DEFAULT_WATERMARK_LINE_SPACING)
+        ttk.Spinbox(
+            multiline_frame,
+            from_=0,
+            to=100,
+            textvariable=self.watermark_line_spacing_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 10))
+        self.watermark_line_spacing_var.trace_add("write", self.update_preview_delayed)
+        
+        ttk.Label(multiline_frame, text="最大宽度(%):").pack(side=tk.LEFT)
+        self.watermark_max_width_var = tk.IntVar(value=DEFAULT_WATERMARK_MAX_WIDTH)
+        ttk.Spinbox(
+            multiline_frame,
+            from_=0,
+            to=100,
+            textvariable=self.watermark_max_width_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        self.watermark_max_width_var.trace_add("write", self.update_preview_delayed)
+        
+        # 自动颜色：按每张图片水印区域的亮度选择浅色或深色文字，背景杂乱时加描边
+        color_frame = ttk.Frame(watermark_frame)
+        color_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.watermark_color_mode_var = tk.StringVar(value=DEFAULT_WATERMARK_COLOR_MODE)
+        ttk.Checkbutton(
+            color_frame,
+            text="自动对比色（按背景亮度选择浅色或深色）",
+            variable=self.watermark_color_mode_var,
+            onvalue=WATERMARK_COLOR_AUTO,
+            offvalue=WATERMARK_COLOR_FIXED,
+            command=self.update_preview_delayed
+        ).pack(side=tk.LEFT)
+        
+        # 文字效果（阴影、描边、发光）和旋转，渲染进缓存的水印精灵图
+        effect_frame = ttk.Frame(watermark_frame)
+        effect_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(effect_frame, text="效果:").pack(side=tk.LEFT)
+        self.watermark_effect_var = tk.StringVar(value=DEFAULT_WATERMARK_EFFECT)
+        effect_combo = ttk.Combobox(
+            effect_frame,
+            textvariable=self.watermark_effect_var,
+            values=WATERMARK_EFFECTS,
+            state="readonly",
+            width=8
+        )
+        effect_combo.pack(side=tk.LEFT, padx=(5, 10))
+        effect_combo.bind('<<ComboboxSelected>>', self.update_preview_delayed)
+        
+        ttk.Label(effect_frame, text="效果大小:").pack(side=tk.LEFT)
+        self.watermark_effect_size_var = tk.IntVar(value=DEFAULT_WATERMARK_EFFECT_SIZE)
+        ttk.Spinbox(
+            effect_frame,
+            from_=0,
+            to=50,
+            textvariable=self.watermark_effect_size_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 10))
+        self.watermark_effect_size_var.trace_add("write", self.update_preview_delayed)
+        
+        ttk.Label(effect_frame, text="旋转:").pack(side=tk.LEFT)
+        self.watermark_rotation_var = tk.IntVar(value=DEFAULT_WATERMARK_ROTATION)
+        ttk.Spinbox(
+            effect_frame,
+            from_=-180,
+            to=180,
+            textvariable=self.watermark_rotation_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        self.watermark_rotation_var.trace_add("write", self.update_preview_delayed)
+        
+        # 平铺水印设置（水印位置选择 "tile" 时生效）
+        tile_frame = ttk.Frame(watermark_frame)
+        tile_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(tile_frame, text="平铺间距:").pack(side=tk.LEFT)
+        self.watermark_tile_spacing_var = tk.IntVar(value=DEFAULT_WATERMARK_TILE_SPACING)
+        ttk.Spinbox(
+            tile_frame,
+            from_=0,
+            to=1000,
+            textvariable=self.watermark_tile_spacing_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 10))
+        self.watermark_tile_spacing_var.trace_add("write", self.update_preview_delayed)
+        
+        ttk.Label(tile_frame, text="角度:").pack(side=tk.LEFT)
+        self.watermark_tile_angle_var = tk.IntVar(value=DEFAULT_WATERMARK_TILE_ANGLE)
+        ttk.Spinbox(
+            tile_frame,
+            from_=-180,
+            to=180,
+            textvariable=self.watermark_tile_angle_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 10))
+        self.watermark_tile_angle_var.trace_add("write", self.update_preview_delayed)
+        
+        ttk.Label(tile_frame, text="错位(%):").pack(side=tk.LEFT)
+        self.watermark_tile_stagger_var = tk.IntVar(value=DEFAULT_WATERMARK_TILE_STAGGER)
+        ttk.Spinbox(
+            tile_frame,
+            from_=0,
+            to=100,
+            textvariable=self.watermark_tile_stagger_var,
+            width=5
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        self.watermark_tile_stagger_var.trace_add("write", self.update_preview_delayed)
+        
         # 配置管理框架
         config_frame = ttk.LabelFrame(watermark_frame, text="配置管理", padding=(5, 5))
         config_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -386,6 +633,45 @@ class MainWindow:
         self.thumbnail_list.frame.drop_target_register(DND_FILES)
         self.thumbnail_list.frame.dnd_bind('<<Drop>>', self.on_drop)
 
+    def start_font_enumeration(self):
+        """启动后台线程枚举系统字体"""
+        self._font_enum_cancel.clear()
+        threading.Thread(target=self._enumerate_fonts_worker, daemon=True).start()
+    
+    def _enumerate_fonts_worker(self):
+        """后台线程：构建字体索引并分批把字体名称交给主线程"""
+        from photowatermark.utils.fonts import load_system_fonts
+        
+        completed = load_system_fonts(
+            on_fonts_found=lambda names: self._post_to_ui(self._add_font_names, list(names)),
+            cancel_event=self._font_enum_cancel
+        )
+        if completed:
+            self._post_to_ui(self._on_font_enumeration_complete)
+    
+    def _post_to_ui(self, callback, *args):
+        """在主线程中执行回调（窗口已关闭时忽略）"""
+        if self._font_enum_cancel.is_set():
+            return
+        try:
+            self.root.after(0, callback, *args)
+        except (RuntimeError, tk.TclError):
+            # 窗口已经销毁
+            pass
+    
+    def _add_font_names(self, names):
+        """把新发现的字体加入字体下拉框"""
+        new_names = set(names) - set(self.font_names)
+        if not new_names:
+            return
+        self.font_names = sorted(set(self.font_names) | new_names)
+        self.font_combo.config(values=self.font_names)
+    
+    def _on_font_enumeration_complete(self):
+        """字体枚举完成后，根据字体索引更新样式控件并用实际字体重新预览"""
+        self.update_font_style_controls()
+        self.display_preview()
+    
     def on_naming_change(self, event=None):
         """当命名规则改变时"""
         if self.naming_var.get() in ["添加前缀", "添加后缀"]:
@@ -435,7 +721,13 @@ class MainWindow:
     def update_font_style_controls(self):
         """根据当前字体支持的样式更新控件状态"""
         try:
-            from photowatermark.utils.fonts import font_supports_style
+            from photowatermark.utils.fonts import font_supports_style, system_fonts_ready
+            
+            # 字体索引尚未建立时不做检查，避免在主线程中扫描字体
+            if not system_fonts_ready():
+                self.bold_check.config(state='normal')
+                self.italic_check.config(state='normal')
+                return
             
             current_font = self.watermark_font_var.get() if self.watermark_font_var else "Arial"
             
@@ -456,22 +748,22 @@ class MainWindow:
             self.bold_check.config(state='normal')
             self.italic_check.config(state='normal')
     
-    def sync_font_style_with_actual_font(self, font_path):
+    def sync_font_style_with_actual_font(self, font_path, face_index=0):
         """根据实际加载的字体同步UI中的字体样式勾选状态"""
         try:
-            from photowatermark.utils.fonts import _get_font_info
+            from photowatermark.utils.fonts import get_font_style_flags, system_fonts_ready
             
-            if not font_path or not os.path.exists(font_path):
+            # 字体索引尚未建立时不查询，避免在主线程中等待字体扫描
+            if not font_path or not system_fonts_ready():
                 return
                 
-            # 获取实际字体的信息
-            font_info = _get_font_info(font_path)
-            if not font_info:
+            # 从字体样式表中获取实际字体的样式
+            style_flags = get_font_style_flags(font_path, face_index)
+            if not style_flags:
                 return
                 
             # 同步UI状态
-            actual_bold = font_info.get('is_bold', False)
-            actual_italic = font_info.get('is_italic', False)
+            actual_bold, actual_italic = style_flags
             
             # 只在实际字体样式与UI状态不匹配时更新
             if self.watermark_bold_var.get() != actual_bold:
@@ -484,6 +776,28 @@ class MainWindow:
             # 静默处理错误
             pass
     
+    def choose_logo_file(self):
+        """选择Logo水印图片"""
+        logo_path = filedialog.askopenfilename(
+            title="选择Logo图片",
+            filetypes=[("PNG图片", "*.png"), ("所有图片", "*.png *.jpg *.jpeg *.bmp *.tiff *.tif")]
+        )
+        if logo_path:
+            self.watermark_logo_path_var.set(logo_path)
+            self.watermark_type_var.set(WATERMARK_TYPE_IMAGE)
+            self.update_preview_delayed()
+    
+    def get_watermark_text(self):
+        """获取水印文字，把输入框中的 "\\n" 转换为换行"""
+        return self.watermark_text_var.get().replace('\\n', '\n')
+    
+    def _get_int_var(self, var, default):
+        """读取数值变量（IntVar/DoubleVar），输入框内容无效时返回默认值"""
+        try:
+            return var.get()
+        except (tk.TclError, ValueError):
+            return default
+    
     def update_preview_delayed(self, *args):
         """延迟更新预览以避免频繁更新"""
         # 取消之前的更新请求（如果有的话）
@@ -497,6 +811,9 @@ class MainWindow:
         """处理水印画布点击事件"""
         if not self.watermark_enabled_var.get():
             return
+        # 平铺水印覆盖整张图片，不能拖动
+        if self.watermark_position_var.get() == WATERMARK_TILE_POSITION:
+            return
         
         # Convert the click coordinates to image coordinates 
         canvas_width = self.preview_canvas.winfo_width()
@@ -681,44 +998,28 @@ class MainWindow:
             # 应用实时水印（如果启用）
             if self.watermark_enabled_var.get():
                 from photowatermark.models.image_processor import ImageProcessor
-                processor = ImageProcessor()
+                # 字体索引还在后台建立时不阻塞主线程，完成后会重新预览
+                processor = ImageProcessor(wait_for_fonts=False)
                 
-                # Check if we're using custom drag-and-drop position
-                current_position = self.watermark_position_var.get()
-                if current_position == "custom" and self.custom_watermark_x is not None and self.custom_watermark_y is not None:
-                    # For custom positioning, we'll pass the exact coordinates through a special method
-                    # Since the processor doesn't support exact coordinates yet, we'll need to enhance it
-                    watermark_settings = {
-                        'text': self.watermark_text_var.get(),
-                        'transparency': self.watermark_transparency_var.get(),
-                        'position': 'custom',  # Use custom position
-                        'custom_x': self.custom_watermark_x,
-                        'custom_y': self.custom_watermark_y,
-                        'font_size': self.watermark_font_size_var.get(),  # 动态字体大小
-                        'font_name': self.watermark_font_var.get(),  # 字体名称
-                        'bold': self.watermark_bold_var.get(),  # 粗体
-                        'italic': self.watermark_italic_var.get(),  # 斜体
-                        'color': (255, 255, 255)  # 默认白色
-                    }
-                else:
-                    # Use preset position
-                    watermark_settings = {
-                        'text': self.watermark_text_var.get(),
-                        'transparency': self.watermark_transparency_var.get(),
-                        'position': current_position,
-                        'font_size': self.watermark_font_size_var.get(),  # 动态字体大小
-                        'font_name': self.watermark_font_var.get(),  # 字体名称
-                        'bold': self.watermark_bold_var.get(),  # 粗体
-                        'italic': self.watermark_italic_var.get(),  # 斜体
-                        'color': (255, 255, 255)  # 默认白色
-                    }
+                # 预览和导出使用同一份水印设置（相同设置共用准备好的水印）
+                try:
+                    watermark_settings = self.get_watermark_settings()
+                except ValueError as e:
+                    # 设置无效不是图片的问题：提示具体原因，且输入过程中不重复弹窗
+                    if str(e) != self._preview_settings_error:
+                        self._preview_settings_error = str(e)
+                        show_error_message(self.root, "水印设置无效", str(e))
+                    return
+                self._preview_settings_error = None
                 
                 # 应用水印到图片（但不改变原始图片）
-                result = processor.add_watermark_to_image(image.copy(), watermark_settings)
+                # add_watermark_to_image 不会修改传入的图片
+                result = processor.add_watermark_to_image(image, watermark_settings)
                 if isinstance(result, tuple) and len(result) == 2:
                     image_with_watermark, actual_font_info = result
                     # 同步UI中的字体样式勾选框
-                    self.sync_font_style_with_actual_font(actual_font_info.get('path'))
+                    self.sync_font_style_with_actual_font(actual_font_info.get('path'),
+                                                          actual_font_info.get('index', 0))
                 else:
                     image_with_watermark = result
                     # 为了向后兼容，如果返回的不是元组
@@ -841,30 +1142,20 @@ class MainWindow:
             self.thumbnail_list.select_item(0)
             self.display_preview()
 
-    def export_images(self):
-        """导出图片"""
-        if not self.image_paths:
-            messagebox.showwarning("警告", "没有要导出的图片。")
-            return
+    def get_watermark_settings(self):
+        """
+        Get the watermark settings shown in the UI.
         
-        output_dir = filedialog.askdirectory(title="选择导出目录")
-        if not output_dir:
-            return  # 用户取消了操作
+        Returns:
+            WatermarkSettings: The settings, whether or not the watermark is enabled
         
-        # 确保输出目录不是输入图片的目录（完全禁止）
-        input_dir = os.path.dirname(self.image_paths[0]) if self.image_paths else ""
-        if input_dir:
-            try:
-                if os.path.samefile(output_dir, input_dir):
-                    messagebox.showerror("错误", "禁止导出到原文件夹，以防止覆盖原图！请选择其他目录。")
-                    return
-            except OSError:
-                # 如果路径在不同驱动器上，使用字符串比较
-                if os.path.normpath(output_dir) == os.path.normpath(input_dir):
-                    messagebox.showerror("错误", "禁止导出到原文件夹，以防止覆盖原图！请选择其他目录。")
-                    return
-        
-        # Prepare settings dict
+        Raises:
+            ValueError: If a setting is invalid
+        """
+        return WatermarkSettings.from_export(self.get_export_settings())
+    
+    def get_export_settings(self):
+        """收集当前界面上的导出设置（导出流水线使用的设置快照）"""
         settings = {
             'naming_rule': self.naming_var.get(),
             'naming_value': self.naming_entry.get().strip(),
@@ -872,16 +1163,35 @@ class MainWindow:
             'quality': self.quality_var.get(),
             'resize_option': self.resize_var.get(),
             'resize_value': self.resize_entry.get(),
+            'invisible_watermark_enabled': self.invisible_watermark_enabled_var.get(),
+            'invisible_watermark_text': self.invisible_watermark_text_var.get().strip(),
+            'export_workers': (os.cpu_count() or 1) if self.export_parallel_var.get() else DEFAULT_EXPORT_WORKERS,
             
             # Watermark settings
             'watermark_enabled': self.watermark_enabled_var.get(),
-            'watermark_text': self.watermark_text_var.get(),
+            'watermark_text': self.get_watermark_text(),
             'watermark_transparency': self.watermark_transparency_var.get(),
             'watermark_position': self.watermark_position_var.get(),
             'watermark_font_size': self.watermark_font_size_var.get(),
+            'watermark_size_mode': self.watermark_size_mode_var.get(),
+            'watermark_relative_size': self._get_int_var(self.watermark_relative_size_var, DEFAULT_WATERMARK_RELATIVE_SIZE),
             'watermark_font_name': self.watermark_font_var.get(),  # 字体名称
             'watermark_bold': self.watermark_bold_var.get(),  # 粗体
             'watermark_italic': self.watermark_italic_var.get(),  # 斜体
+            'watermark_align': self.watermark_align_var.get(),  # 多行对齐
+            'watermark_line_spacing': self._get_int_var(self.watermark_line_spacing_var, DEFAULT_WATERMARK_LINE_SPACING),
+            'watermark_max_width': self._get_int_var(self.watermark_max_width_var, DEFAULT_WATERMARK_MAX_WIDTH),
+            'watermark_tile_spacing': self._get_int_var(self.watermark_tile_spacing_var, DEFAULT_WATERMARK_TILE_SPACING),
+            'watermark_tile_angle': self._get_int_var(self.watermark_tile_angle_var, DEFAULT_WATERMARK_TILE_ANGLE),
+            'watermark_tile_stagger': self._get_int_var(self.watermark_tile_stagger_var, DEFAULT_WATERMARK_TILE_STAGGER),
+            'watermark_type': self.watermark_type_var.get(),
+            'watermark_logo_path': self.watermark_logo_path_var.get(),
+            'watermark_logo_scale': self._get_int_var(self.watermark_logo_scale_var, DEFAULT_WATERMARK_LOGO_SCALE),
+            'watermark_effect': self.watermark_effect_var.get(),  # 文字效果
+            'watermark_effect_size': self._get_int_var(self.watermark_effect_size_var, DEFAULT_WATERMARK_EFFECT_SIZE),
+            'watermark_rotation': self._get_int_var(self.watermark_rotation_var, DEFAULT_WATERMARK_ROTATION),
+            'watermark_color_mode': self.watermark_color_mode_var.get(),
+            'watermark_layers': list(self.watermark_layers),  # 叠加图层
             'watermark_color': (255, 255, 255)  # Default white color
         }
         
@@ -889,6 +1199,37 @@ class MainWindow:
         if self.watermark_position_var.get() == "custom" and self.custom_watermark_x is not None and self.custom_watermark_y is not None:
             settings['watermark_custom_x'] = self.custom_watermark_x
             settings['watermark_custom_y'] = self.custom_watermark_y
+        return settings
+    
+    def export_images(self):
+        """导出图片"""
+        if not self.image_paths:
+            messagebox.showwarning("警告", "没有要导出的图片。")
+            return
+        
+        output_dir = filedialog.askdirectory(title="选择导出目录")
+        if not output_dir:
+            return  # 用户取消了操作
+        
+        # 确保输出目录不是输入图片的目录（完全禁止）
+        input_dir = os.path.dirname(self.image_paths[0]) if self.image_paths else ""
+        if input_dir:
+            try:
+                if os.path.samefile(output_dir, input_dir):
+                    messagebox.showerror("错误", "禁止导出到原文件夹，以防止覆盖原图！请选择其他目录。")
+                    return
+            except OSError:
+                # 如果路径在不同驱动器上，使用字符串比较
+                if os.path.normpath(output_dir) == os.path.normpath(input_dir):
+                    messagebox.showerror("错误", "禁止导出到原文件夹，以防止覆盖原图！请选择其他目录。")
+                    return
+        
+        # 隐形水印内容过长时无法嵌入
+        if not self._check_invisible_watermark():
+            return
+        
+        # Snapshot the export settings once for the whole batch
+        settings = self.get_export_settings()
         
         # If controller is available, use it; otherwise use direct approach
         if self.controller:
@@ -901,116 +1242,77 @@ class MainWindow:
     
     def _export_process(self, output_dir, settings=None):
         """在后台线程中执行导出操作"""
-        if settings is None:
-            # Fallback to current UI values if settings not provided
-            settings = {
-                'naming_rule': self.naming_var.get(),
-                'naming_value': self.naming_entry.get().strip(),
-                'format_rule': self.format_var.get(),
-                'quality': self.quality_var.get(),
-                'resize_option': self.resize_var.get(),
-                'resize_value': self.resize_entry.get(),
-                
-                # Watermark settings
-                'watermark_enabled': self.watermark_enabled_var.get(),
-                'watermark_text': self.watermark_text_var.get(),
-                'watermark_transparency': self.watermark_transparency_var.get(),
-                'watermark_position': self.watermark_position_var.get(),
-                'watermark_font_size': self.watermark_font_size_var.get(),
-                'watermark_color': (255, 255, 255)  # Default white color
-            }
-        
         try:
-            success_count = 0
-            for i, img_path in enumerate(self.image_paths):
-                try:
-                    # 生成输出文件名
-                    from photowatermark.models.image_processor import ImageProcessor
-                    processor = ImageProcessor()
-                    output_path = processor.generate_output_filename(
-                        img_path, 
-                        output_dir,
-                        settings.get('naming_rule'),
-                        settings.get('naming_value'),
-                        settings.get('format_rule')
-                    )
-                    
-                    # 打开图片
-                    image = Image.open(img_path)
-                    
-                    # 根据设置调整图片尺寸
-                    image = processor.resize_image(
-                        image, 
-                        settings.get('resize_option'), 
-                        settings.get('resize_value'),
-                        image.size[0],  # original width
-                        image.size[1]   # original height
-                    )
-                    
-                    # Apply watermark if enabled
-                    if settings.get('watermark_enabled', False):
-                        # Prepare watermark settings
-                        watermark_settings = {
-                            'text': settings.get('watermark_text', 'Sample Text'),
-                            'transparency': settings.get('watermark_transparency', 50),
-                            'position': settings.get('watermark_position', 'bottom-right'),
-                            'font_size': settings.get('watermark_font_size', 30),
-                            'font_name': settings.get('watermark_font_name', 'Arial'),  # 字体名称
-                            'bold': settings.get('watermark_bold', False),  # 粗体
-                            'italic': settings.get('watermark_italic', False),  # 斜体
-                            'color': settings.get('watermark_color', (255, 255, 255))
-                        }
-                        
-                        # Add custom coordinates if in custom position mode
-                        if (settings.get('watermark_position') == "custom" and 
-                            'watermark_custom_x' in settings and 
-                            'watermark_custom_y' in settings):
-                            watermark_settings['custom_x'] = settings['watermark_custom_x']
-                            watermark_settings['custom_y'] = settings['watermark_custom_y']
-                        
-                        # Apply watermark to the image
-                        image = processor.add_watermark_to_image(image, watermark_settings)
-                    
-                    # 处理图片以准备导出
-                    image = processor.process_image_for_export(
-                        image, 
-                        os.path.splitext(output_path)[1], 
-                        settings.get('quality', 95)
-                    )
-                    
-                    # 处理图片格式转换
-                    _, ext = os.path.splitext(output_path)
-                    ext = ext.lower()
-                    
-                    # 保存图片
-                    if ext in ['.jpg', '.jpeg']:
-                        # JPEG不支持透明通道，转换为RGB
-                        if image.mode in ('RGBA', 'LA', 'P'):
-                            if image.mode == 'P':
-                                image = image.convert("RGBA")
-                            image_to_save = image.convert("RGB")
-                        else:
-                            image_to_save = image
-                        # 对于JPEG格式，使用用户设置的质量
-                        image_to_save.save(output_path, "JPEG", quality=settings.get('quality', 95), exif=image.info.get('exif', b''))
-                    elif ext == '.png':
-                        # 对于PNG格式，保存时保留透明通道
-                        image.save(output_path, "PNG", exif=image.info.get('exif', b''))
-                    else:
-                        # 对于其他格式，按原样保存
-                        image.save(output_path, exif=image.info.get('exif', b''))
-                    
-                    success_count += 1
-                except Exception as e:
-                    print(f"导出文件失败 {img_path}: {str(e)}")
+            if settings is None:
+                settings = self.get_export_settings()
+            success_count = ExportPipeline(settings).run(self.image_paths, output_dir)
             
             # 在主线程中显示完成消息
             self.root.after(0, lambda: messagebox.showinfo("完成", f"导出完毕！成功导出 {success_count} 个文件。"))
-
         except Exception as e:
             error_msg = f"导出过程中发生错误: {str(e)}"
             self.root.after(0, lambda: show_error_message(self.root, "错误", error_msg))
     
+    def show_export_plan(self):
+        """显示导出计划：按尺寸、模式和方向分组的图片和估计的开销（只读取文件头）"""
+        if not self.image_paths:
+            messagebox.showwarning("警告", "没有要导出的图片。")
+            return
+        try:
+            plan = ExportPipeline(self.get_export_settings()).plan(self.image_paths)
+            messagebox.showinfo("导出计划", plan.describe())
+        except Exception as e:
+            error_msg = f"生成导出计划时发生错误: {str(e)}"
+            show_error_message(self.root, "错误", error_msg)
+    
+    def _check_invisible_watermark(self):
+        """检查隐形水印设置，无法嵌入时提示用户并返回False"""
+        if not self.invisible_watermark_enabled_var.get():
+            return True
+        text = self.invisible_watermark_text_var.get().strip()
+        if not text:
+            messagebox.showerror("错误", "请输入隐形水印内容。")
+            return False
+        if len(text.encode('utf-8')) > MAX_PAYLOAD_BYTES:
+            messagebox.showerror("错误", f"隐形水印内容最多 {MAX_PAYLOAD_BYTES} 个字节（英文字母或数字）。")
+            return False
+        if not invisible_watermark_available():
+            messagebox.showerror("错误", "隐形水印需要安装 numpy。")
+            return False
+        # 质量太低的JPEG中无法可靠地读出隐形水印
+        if self.format_var.get() != 'PNG' and self.quality_var.get() < MIN_INVISIBLE_QUALITY:
+            messagebox.showerror("错误", f"JPEG质量低于 {MIN_INVISIBLE_QUALITY} 时隐形水印无法检测，"
+                                       f"请提高JPEG质量或取消隐形水印。")
+            return False
+        return True
+    
+    def detect_invisible_watermarks(self):
+        """选择文件夹，在后台线程中检测其中图片的隐形水印"""
+        if not invisible_watermark_available():
+            messagebox.showerror("错误", "隐形水印需要安装 numpy。")
+            return
+        directory = filedialog.askdirectory(title="选择要检测隐形水印的文件夹")
+        if not directory:
+            return  # 用户取消了操作
+        threading.Thread(target=self._detect_process, args=(directory,), daemon=True).start()
+    
+    def _detect_process(self, directory):
+        """在后台线程中并行检测文件夹中的图片"""
+        try:
+            results = scan_directory(directory)
+            found = [(path, payload, confidence) for path, payload, confidence in results if payload is not None]
+            message = f"检测了 {len(results)} 个文件，其中 {len(found)} 个带有隐形水印。"
+            if found:
+                lines = [f"{os.path.basename(path)}: {payload}（置信度 {confidence:.0%}）"
+                         for path, payload, confidence in found[:20]]
+                if len(found) > 20:
+                    lines.append("...")
+                message += "\n\n" + "\n".join(lines)
+            self.root.after(0, lambda: messagebox.showinfo("隐形水印检测", message))
+        except Exception as e:
+            error_msg = f"检测隐形水印时发生错误: {str(e)}"
+            self.root.after(0, lambda: show_error_message(self.root, "错误", error_msg))
+    
     def _on_export_complete(self, success_count):
         """Callback when export is completed"""
         messagebox.showinfo("完成", f"导出完毕！成功导出 {success_count} 个文件。")
@@ -1044,82 +1346,6 @@ class MainWindow:
             else:
                 messagebox.showinfo("提示", "拖拽的文件中没有找到支持的图片格式。")
     
-    def _process_and_save_image(self, input_path, output_path, settings):
-        """处理单张图片：应用水印、调整尺寸、保存"""
-        from photowatermark.models.image_processor import ImageProcessor
-        processor = ImageProcessor()
-        
-        # 打开图片
-        image = Image.open(input_path)
-        
-        # 如果启用水印，应用水印
-        if settings.get('watermark_enabled', False):
-            # 准备水印设置
-            watermark_settings = {
-                'text': settings.get('watermark_text', 'Sample Text'),
-                'transparency': settings.get('watermark_transparency', DEFAULT_WATERMARK_TRANSPARENCY),
-                'position': settings.get('watermark_position', DEFAULT_WATERMARK_POSITION),
-                'font_size': settings.get('watermark_font_size', DEFAULT_WATERMARK_SIZE),
-                'font_name': settings.get('watermark_font_name', 'Arial'),  # 字体名称
-                'bold': settings.get('watermark_bold', False),  # 粗体
-                'italic': settings.get('watermark_italic', False),  # 斜体
-                'color': settings.get('watermark_color', DEFAULT_WATERMARK_COLOR)
-            }
-            
-            # 如果是自定义位置，添加坐标
-            if (settings.get('watermark_position') == "custom" and 
-                'watermark_custom_x' in settings and 
-                'watermark_custom_y' in settings):
-                watermark_settings['custom_x'] = settings['watermark_custom_x']
-                watermark_settings['custom_y'] = settings['watermark_custom_y']
-            
-            # 应用水印到图片
-            result = processor.add_watermark_to_image(image, watermark_settings)
-            # Handle the case where add_watermark_to_image returns a tuple
-            if isinstance(result, tuple):
-                image = result[0]  # First element is the watermarked image
-            else:
-                image = result
-        
-        # 根据设置调整图片尺寸（在水印添加后）
-        original_image = Image.open(input_path)  # Reopen to get original size
-        original_width, original_height = original_image.size
-        image = processor.resize_image(
-            image, 
-            settings.get('resize_option'), 
-            settings.get('resize_value'),
-            original_width,
-            original_height
-        )
-        
-        # 处理图片以准备导出
-        image = processor.process_image_for_export(
-            image, 
-            os.path.splitext(output_path)[1], 
-            settings.get('quality', 95)
-        )
-        
-        # 处理图片格式转换并保存
-        _, ext = os.path.splitext(output_path)
-        ext = ext.lower()
-        
-        if ext in ['.jpg', '.jpeg']:
-            # JPEG不支持透明通道，转换为RGB
-            if image.mode in ('RGBA', 'LA', 'P'):
-                if image.mode == 'P':
-                    image = image.convert("RGBA")
-                image_to_save = image.convert("RGB")
-            else:
-                image_to_save = image
-            # 对于JPEG格式，使用用户设置的质量
-            image_to_save.save(output_path, "JPEG", quality=settings.get('quality', 95), exif=image.info.get('exif', b''))
-        elif ext == '.png':
-            # 对于PNG格式，保存时保留透明通道
-            image.save(output_path, "PNG", exif=image.info.get('exif', b''))
-        else:
-            # 对于其他格式，按原样保存
-            image.save(output_path, exif=image.info.get('exif', b''))
-    
     def save_config(self):
         """保存当前水印配置"""
         try:
@@ -1139,9 +1365,25 @@ class MainWindow:
                 'watermark_transparency': self.watermark_transparency_var.get(),
                 'watermark_position': self.watermark_position_var.get(),
                 'watermark_font_size': self.watermark_font_size_var.get(),
+                'watermark_size_mode': self.watermark_size_mode_var.get(),
+                'watermark_relative_size': self._get_int_var(self.watermark_relative_size_var, DEFAULT_WATERMARK_RELATIVE_SIZE),
                 'watermark_font_name': self.watermark_font_var.get(),  # 字体名称
                 'watermark_bold': self.watermark_bold_var.get(),  # 粗体
                 'watermark_italic': self.watermark_italic_var.get(),  # 斜体
+                'watermark_align': self.watermark_align_var.get(),  # 多行对齐
+                'watermark_line_spacing': self._get_int_var(self.watermark_line_spacing_var, DEFAULT_WATERMARK_LINE_SPACING),
+                'watermark_max_width': self._get_int_var(self.watermark_max_width_var, DEFAULT_WATERMARK_MAX_WIDTH),
+                'watermark_tile_spacing': self._get_int_var(self.watermark_tile_spacing_var, DEFAULT_WATERMARK_TILE_SPACING),
+                'watermark_tile_angle': self._get_int_var(self.watermark_tile_angle_var, DEFAULT_WATERMARK_TILE_ANGLE),
+                'watermark_tile_stagger': self._get_int_var(self.watermark_tile_stagger_var, DEFAULT_WATERMARK_TILE_STAGGER),
+                'watermark_type': self.watermark_type_var.get(),
+                'watermark_logo_path': self.watermark_logo_path_var.get(),
+                'watermark_logo_scale': self._get_int_var(self.watermark_logo_scale_var, DEFAULT_WATERMARK_LOGO_SCALE),
+                'watermark_effect': self.watermark_effect_var.get(),  # 文字效果
+                'watermark_effect_size': self._get_int_var(self.watermark_effect_size_var, DEFAULT_WATERMARK_EFFECT_SIZE),
+                'watermark_rotation': self._get_int_var(self.watermark_rotation_var, DEFAULT_WATERMARK_ROTATION),
+                'watermark_color_mode': self.watermark_color_mode_var.get(),
+                'watermark_layers': list(self.watermark_layers),  # 模板可以描述多个水印图层
                 'watermark_color': (255, 255, 255),  # 目前颜色是固定的，后续可以扩展
                 'custom_watermark_x': self.custom_watermark_x,
                 'custom_watermark_y': self.custom_watermark_y
@@ -1180,6 +1422,9 @@ class MainWindow:
             with open(config_file, 'r', encoding='utf-8') as f:
                 config_data = json.load(f)
             
+            # 先检查模板中的水印设置，无效的模板不改变当前设置
+            WatermarkSettings.from_export(config_data)
+            
             # 应用配置
             if 'watermark_enabled' in config_data:
                 self.watermark_enabled_var.set(config_data['watermark_enabled'])
@@ -1195,6 +1440,10 @@ class MainWindow:
                 
             if 'watermark_font_size' in config_data:
                 self.watermark_font_size_var.set(config_data['watermark_font_size'])
+            if 'watermark_size_mode' in config_data:
+                self.watermark_size_mode_var.set(config_data['watermark_size_mode'])
+            if 'watermark_relative_size' in config_data:
+                self.watermark_relative_size_var.set(config_data['watermark_relative_size'])
                 
             if 'watermark_font_name' in config_data:
                 self.watermark_font_var.set(config_data['watermark_font_name'])
@@ -1205,6 +1454,37 @@ class MainWindow:
             if 'watermark_italic' in config_data:
                 self.watermark_italic_var.set(config_data['watermark_italic'])
                 
+            if 'watermark_align' in config_data:
+                self.watermark_align_var.set(config_data['watermark_align'])
+                
+            if 'watermark_line_spacing' in config_data:
+                self.watermark_line_spacing_var.set(config_data['watermark_line_spacing'])
+                
+            if 'watermark_max_width' in config_data:
+                self.watermark_max_width_var.set(config_data['watermark_max_width'])
+            if 'watermark_tile_spacing' in config_data:
+                self.watermark_tile_spacing_var.set(config_data['watermark_tile_spacing'])
+            if 'watermark_tile_angle' in config_data:
+                self.watermark_tile_angle_var.set(config_data['watermark_tile_angle'])
+            if 'watermark_tile_stagger' in config_data:
+                self.watermark_tile_stagger_var.set(config_data['watermark_tile_stagger'])
+            if 'watermark_type' in config_data:
+                self.watermark_type_var.set(config_data['watermark_type'])
+            if 'watermark_logo_path' in config_data:
+                self.watermark_logo_path_var.set(config_data['watermark_logo_path'])
+            if 'watermark_logo_scale' in config_data:
+                self.watermark_logo_scale_var.set(config_data['watermark_logo_scale'])
+            if 'watermark_effect' in config_data:
+                self.watermark_effect_var.set(config_data['watermark_effect'])
+            if 'watermark_effect_size' in config_data:
+                self.watermark_effect_size_var.set(config_data['watermark_effect_size'])
+            if 'watermark_rotation' in config_data:
+                self.watermark_rotation_var.set(config_data['watermark_rotation'])
+            if 'watermark_color_mode' in config_data:
+                self.watermark_color_mode_var.set(config_data['watermark_color_mode'])
+            # 模板的叠加图层替换当前图层（没有图层的模板清空图层）
+            self.watermark_layers = list(config_data.get('watermark_layers') or [])
+                
             # 应用自定义坐标
             if 'custom_watermark_x' in config_data:
                 self.custom_watermark_x = config_data['custom_watermark_x']
@@ -1282,9 +1562,25 @@ class MainWindow:
                 'watermark_transparency': self.watermark_transparency_var.get() if self.watermark_transparency_var else 50,
                 'watermark_position': self.watermark_position_var.get() if self.watermark_position_var else 'bottom-right',
                 'watermark_font_size': self.watermark_font_size_var.get() if self.watermark_font_size_var else 30,
+                'watermark_size_mode': self.watermark_size_mode_var.get() if self.watermark_size_mode_var else DEFAULT_WATERMARK_SIZE_MODE,
+                'watermark_relative_size': self._get_int_var(self.watermark_relative_size_var, DEFAULT_WATERMARK_RELATIVE_SIZE) if self.watermark_relative_size_var else DEFAULT_WATERMARK_RELATIVE_SIZE,
                 'watermark_font_name': self.watermark_font_var.get() if self.watermark_font_var else 'Arial',  # 字体名称
                 'watermark_bold': self.watermark_bold_var.get() if self.watermark_bold_var else False,  # 粗体
                 'watermark_italic': self.watermark_italic_var.get() if self.watermark_italic_var else False,  # 斜体
+                'watermark_align': self.watermark_align_var.get() if self.watermark_align_var else DEFAULT_WATERMARK_ALIGN,
+                'watermark_line_spacing': self._get_int_var(self.watermark_line_spacing_var, DEFAULT_WATERMARK_LINE_SPACING) if self.watermark_line_spacing_var else DEFAULT_WATERMARK_LINE_SPACING,
+                'watermark_max_width': self._get_int_var(self.watermark_max_width_var, DEFAULT_WATERMARK_MAX_WIDTH) if self.watermark_max_width_var else DEFAULT_WATERMARK_MAX_WIDTH,
+                'watermark_tile_spacing': self._get_int_var(self.watermark_tile_spacing_var, DEFAULT_WATERMARK_TILE_SPACING) if self.watermark_tile_spacing_var else DEFAULT_WATERMARK_TILE_SPACING,
+                'watermark_tile_angle': self._get_int_var(self.watermark_tile_angle_var, DEFAULT_WATERMARK_TILE_ANGLE) if self.watermark_tile_angle_var else DEFAULT_WATERMARK_TILE_ANGLE,
+                'watermark_tile_stagger': self._get_int_var(self.watermark_tile_stagger_var, DEFAULT_WATERMARK_TILE_STAGGER) if self.watermark_tile_stagger_var else DEFAULT_WATERMARK_TILE_STAGGER,
+                'watermark_type': self.watermark_type_var.get() if self.watermark_type_var else DEFAULT_WATERMARK_TYPE,
+                'watermark_logo_path': self.watermark_logo_path_var.get() if self.watermark_logo_path_var else '',
+                'watermark_logo_scale': self._get_int_var(self.watermark_logo_scale_var, DEFAULT_WATERMARK_LOGO_SCALE) if self.watermark_logo_scale_var else DEFAULT_WATERMARK_LOGO_SCALE,
+                'watermark_effect': self.watermark_effect_var.get() if self.watermark_effect_var else DEFAULT_WATERMARK_EFFECT,
+                'watermark_effect_size': self._get_int_var(self.watermark_effect_size_var, DEFAULT_WATERMARK_EFFECT_SIZE) if self.watermark_effect_size_var else DEFAULT_WATERMARK_EFFECT_SIZE,
+                'watermark_rotation': self._get_int_var(self.watermark_rotation_var, DEFAULT_WATERMARK_ROTATION) if self.watermark_rotation_var else DEFAULT_WATERMARK_ROTATION,
+                'watermark_color_mode': self.watermark_color_mode_var.get() if self.watermark_color_mode_var else DEFAULT_WATERMARK_COLOR_MODE,
+                'watermark_layers': list(self.watermark_layers),
                 'custom_watermark_x': self.custom_watermark_x,
                 'custom_watermark_y': self.custom_watermark_y,
                 'naming_rule': self.naming_var.get() if self.naming_var else '保留原名',
@@ -1292,7 +1588,10 @@ class MainWindow:
                 'format_rule': self.format_var.get() if self.format_var else '原格式',
                 'quality': self.quality_var.get() if self.quality_var else 95,
                 'resize_option': self.resize_var.get() if self.resize_var else '原图尺寸',
-                'resize_value': self.resize_entry.get() if self.resize_entry else ''
+                'resize_value': self.resize_entry.get() if self.resize_entry else '',
+                'invisible_watermark_enabled': self.invisible_watermark_enabled_var.get() if self.invisible_watermark_enabled_var else False,
+                'invisible_watermark_text': self.invisible_watermark_text_var.get() if self.invisible_watermark_text_var else '',
+                'export_parallel': self.export_parallel_var.get() if self.export_parallel_var else False
             }
             
             # 保存状态到文件
@@ -1312,6 +1611,14 @@ class MainWindow:
             with open(self.app_state_file, 'r', encoding='utf-8') as f:
                 app_state = json.load(f)
             
+            # 水印设置无效时（例如手动修改过文件）保留默认的水印设置
+            try:
+                WatermarkSettings.from_export(app_state)
+            except ValueError as e:
+                print(f"应用程序状态中的水印设置无效，已忽略: {str(e)}")
+                app_state = {key: value for key, value in app_state.items()
+                             if not key.startswith(('watermark_', 'custom_watermark_'))}
+            
             # 应用窗口状态
             if 'window_width' in app_state and 'window_height' in app_state:
                 width = app_state['window_width']
@@ -1345,6 +1652,10 @@ class MainWindow:
                 
             if 'watermark_font_size' in app_state:
                 self.watermark_font_size_var.set(app_state['watermark_font_size'])
+            if 'watermark_size_mode' in app_state:
+                self.watermark_size_mode_var.set(app_state['watermark_size_mode'])
+            if 'watermark_relative_size' in app_state:
+                self.watermark_relative_size_var.set(app_state['watermark_relative_size'])
                 
             if 'watermark_font_name' in app_state:
                 self.watermark_font_var.set(app_state['watermark_font_name'])
@@ -1355,6 +1666,37 @@ class MainWindow:
             if 'watermark_italic' in app_state:
                 self.watermark_italic_var.set(app_state['watermark_italic'])
                 
+            if 'watermark_align' in app_state:
+                self.watermark_align_var.set(app_state['watermark_align'])
+                
+            if 'watermark_line_spacing' in app_state:
+                self.watermark_line_spacing_var.set(app_state['watermark_line_spacing'])
+                
+            if 'watermark_max_width' in app_state:
+                self.watermark_max_width_var.set(app_state['watermark_max_width'])
+            if 'watermark_tile_spacing' in app_state:
+                self.watermark_tile_spacing_var.set(app_state['watermark_tile_spacing'])
+            if 'watermark_tile_angle' in app_state:
+                self.watermark_tile_angle_var.set(app_state['watermark_tile_angle'])
+            if 'watermark_tile_stagger' in app_state:
+                self.watermark_tile_stagger_var.set(app_state['watermark_tile_stagger'])
+            if 'watermark_type' in app_state:
+                self.watermark_type_var.set(app_state['watermark_type'])
+            if 'watermark_logo_path' in app_state:
+                self.watermark_logo_path_var.set(app_state['watermark_logo_path'])
+            if 'watermark_logo_scale' in app_state:
+                self.watermark_logo_scale_var.set(app_state['watermark_logo_scale'])
+            if 'watermark_effect' in app_state:
+                self.watermark_effect_var.set(app_state['watermark_effect'])
+            if 'watermark_effect_size' in app_state:
+                self.watermark_effect_size_var.set(app_state['watermark_effect_size'])
+            if 'watermark_rotation' in app_state:
+                self.watermark_rotation_var.set(app_state['watermark_rotation'])
+            if 'watermark_color_mode' in app_state:
+                self.watermark_color_mode_var.set(app_state['watermark_color_mode'])
+            if 'watermark_layers' in app_state:
+                self.watermark_layers = list(app_state['watermark_layers'] or [])
+                
             # 应用自定义坐标
             if 'custom_watermark_x' in app_state:
                 self.custom_watermark_x = app_state['custom_watermark_x']
@@ -1374,6 +1716,13 @@ class MainWindow:
                 
             if 'quality' in app_state:
                 self.quality_var.set(app_state['quality'])
+            
+            if 'invisible_watermark_enabled' in app_state:
+                self.invisible_watermark_enabled_var.set(app_state['invisible_watermark_enabled'])
+            if 'invisible_watermark_text' in app_state:
+                self.invisible_watermark_text_var.set(app_state['invisible_watermark_text'])
+            if 'export_parallel' in app_state:
+                self.export_parallel_var.set(app_state['export_parallel'])
                 
             if 'resize_option' in app_state:
                 self.resize_var.set(app_state['resize_option'])
@@ -1416,53 +1765,17 @@ class MainWindow:
                     messagebox.showerror("错误", "禁止导出到原文件夹，以防止覆盖原图！请选择其他目录。")
                     return
         
-        # 准备设置字典
-        settings = {
-            'naming_rule': self.naming_var.get(),
-            'naming_value': self.naming_entry.get().strip(),
-            'format_rule': self.format_var.get(),
-            'quality': self.quality_var.get(),
-            'resize_option': self.resize_var.get(),
-            'resize_value': self.resize_entry.get(),
-            
-            # Watermark settings
-            'watermark_enabled': self.watermark_enabled_var.get(),
-            'watermark_text': self.watermark_text_var.get(),
-            'watermark_transparency': self.watermark_transparency_var.get(),
-            'watermark_position': self.watermark_position_var.get(),
-            'watermark_font_size': self.watermark_font_size_var.get(),
-            'watermark_font_name': self.watermark_font_var.get(),  # 字体名称
-            'watermark_bold': self.watermark_bold_var.get(),  # 粗体
-            'watermark_italic': self.watermark_italic_var.get(),  # 斜体
-            'watermark_color': (255, 255, 255)  # Default white color
-        }
-        
-        # 如果使用自定义位置，则添加自定义坐标
-        if (self.watermark_position_var.get() == "custom" and 
-            self.custom_watermark_x is not None and 
-            self.custom_watermark_y is not None):
-            settings['watermark_custom_x'] = self.custom_watermark_x
-            settings['watermark_custom_y'] = self.custom_watermark_y
+        # 隐形水印内容过长时无法嵌入
+        if not self._check_invisible_watermark():
+            return
         
         # 只导出当前选中的图片
         current_image_path = self.image_paths[self.current_image_index]
         
         try:
-            # 使用通用的导出函数来导出单张图片
-            from photowatermark.models.image_processor import ImageProcessor
-            processor = ImageProcessor()
-            
-            # 生成输出文件名
-            output_path = processor.generate_output_filename(
-                current_image_path, 
-                output_dir,
-                settings.get('naming_rule'),
-                settings.get('naming_value'),
-                settings.get('format_rule')
-            )
-            
-            # 使用通用的导出处理函数
-            self._process_and_save_image(current_image_path, output_path, settings)
+            pipeline = ExportPipeline(self.get_export_settings())
+            output_path = pipeline.output_path(current_image_path, output_dir)
+            pipeline.process(current_image_path, output_path)
             
             messagebox.showinfo("成功", f"当前图片已导出到:\n{output_path}")
             
@@ -1472,65 +1785,10 @@ class MainWindow:
     
     def on_closing(self):
         """窗口关闭时的处理"""
+        # 取消后台字体枚举
+        self._font_enum_cancel.set()
         # 保存当前应用程序状态
         self.save_app_state()
         # 销毁窗口
         self.root.destroy()
 
-    def _export_process(self, output_dir):
-        """在后台线程中执行导出操作"""
-        try:
-            success_count = 0
-            for i, img_path in enumerate(self.image_paths):
-                try:
-                    # 构建设置字典，用于调用通用处理函数
-                    current_settings = {
-                        'naming_rule': self.naming_var.get(),
-                        'naming_value': self.naming_entry.get().strip(),
-                        'format_rule': self.format_var.get(),
-                        'quality': self.quality_var.get(),
-                        'resize_option': self.resize_var.get(),
-                        'resize_value': self.resize_entry.get(),
-                        
-                        # Watermark settings
-                        'watermark_enabled': self.watermark_enabled_var.get(),
-                        'watermark_text': self.watermark_text_var.get(),
-                        'watermark_transparency': self.watermark_transparency_var.get(),
-                        'watermark_position': self.watermark_position_var.get(),
-                        'watermark_font_size': self.watermark_font_size_var.get(),
-                        'watermark_font_name': self.watermark_font_var.get(),  # 字体名称
-                        'watermark_bold': self.watermark_bold_var.get(),  # 粗体
-                        'watermark_italic': self.watermark_italic_var.get(),  # 斜体
-                        'watermark_color': DEFAULT_WATERMARK_COLOR  # Default white color
-                    }
-                    
-                    # 如果使用自定义位置，则添加自定义坐标
-                    if (self.watermark_position_var.get() == "custom" and 
-                        self.custom_watermark_x is not None and 
-                        self.custom_watermark_y is not None):
-                        current_settings['watermark_custom_x'] = self.custom_watermark_x
-                        current_settings['watermark_custom_y'] = self.custom_watermark_y
-                    
-                    # 生成输出文件名
-                    from photowatermark.models.image_processor import ImageProcessor
-                    processor = ImageProcessor()
-                    output_path = processor.generate_output_filename(
-                        img_path, 
-                        output_dir,
-                        current_settings.get('naming_rule'),
-                        current_settings.get('naming_value'),
-                        current_settings.get('format_rule')
-                    )
-                    
-                    # 使用通用的处理函数
-                    self._process_and_save_image(img_path, output_path, current_settings)
-                    
-                    success_count += 1
-                except Exception as e:
-                    print(f"导出文件失败 {img_path}: {str(e)}")
-            
-            # 在主线程中显示完成消息
-            self.root.after(0, lambda: messagebox.showinfo("完成", f"导出完毕！成功导出 {success_count} 个文件。"))
-        except Exception as e:
-            error_msg = f"导出过程中发生错误: {str(e)}"
-            self.root.after(0, lambda: show_error_message(self.root, "错误", error_msg))
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Round trips of the invisible watermark through JPEG encoding at the lowest
+supported quality.
+"""
+import io
+
+import pytest
+from PIL import Image
+
+np = pytest.importorskip("numpy")
+
+from photowatermark.models.invisible_watermark import (
+    InvisibleWatermark, MIN_INVISIBLE_QUALITY, strength_for_quality
+)
+
+PAYLOAD = "ID-0042"
+
+
+def _round_trip(image, quality):
+    """嵌入、按给定质量保存为JPEG，再用默认设置检测"""
+    marked = InvisibleWatermark(strength=strength_for_quality(quality)).embed(image, PAYLOAD)
+    buffer = io.BytesIO()
+    marked.save(buffer, "JPEG", quality=quality)
+    buffer.seek(0)
+    with Image.open(buffer) as encoded:
+        return InvisibleWatermark().detect(encoded)
+
+
+@pytest.mark.parametrize("color", [(128, 128, 128), (250, 250, 250), (255, 255, 255)],
+                         ids=["mid-grey", "near-white", "white"])
+def test_lowest_supported_quality(color):
+    payload, confidence = _round_trip(Image.new("RGB", (640, 480), color), MIN_INVISIBLE_QUALITY)
+    assert payload == PAYLOAD
+    assert confidence > 0.5
+
+
+def test_near_white_greyscale():
+    payload, _ = _round_trip(Image.new("L", (640, 480), 250), MIN_INVISIBLE_QUALITY)
+    assert payload == PAYLOAD
+
+
+def test_below_lowest_supported_quality_is_refused():
+    assert strength_for_quality(MIN_INVISIBLE_QUALITY - 1) is None
+
+
+def test_unmarked_image_has_no_payload():
+    payload, confidence = InvisibleWatermark().detect(Image.new("RGB", (640, 480), (128, 128, 128)))
+    assert payload is None
+    assert confidence < 0.2